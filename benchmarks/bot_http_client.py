@@ -0,0 +1,85 @@
+"""Per-update latency of a fresh aiohttp session vs the shared ``ApiClient``.
+
+Starts a local stub of ``/subscription/<id>`` and replays the request the
+``start`` handler makes on every update:
+
+    python -m benchmarks.bot_http_client --updates 2000 --concurrency 50
+"""
+import argparse
+import asyncio
+import random
+
+import aiohttp
+from aiohttp import web
+
+from benchmarks.common import ameasure, print_table, summarize
+from vpnbot.api_client import ApiClient
+
+PAYLOAD = {
+    "userId": "1000001", "username": "vpnuser_1000001", "userStatus": "active",
+    "daysLeft": 12, "trafficUsed": 3.5, "trafficLimit": 100,
+}
+
+
+async def _subscription(request: web.Request) -> web.Response:
+    return web.json_response(PAYLOAD)
+
+
+async def start_stub(port: int) -> web.AppRunner:
+    app = web.Application()
+    app.router.add_get("/api/subscription/{user_id}", _subscription)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner
+
+
+async def run(args) -> dict:
+    runner = await start_stub(args.port)
+    base_url = f"http://127.0.0.1:{args.port}/api"
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def session_per_update():
+        user_id = random.randint(1, 10**6)
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=5)) as session:
+            async with session.get(f"{base_url}/subscription/{user_id}", params={"user_id": user_id}) as resp:
+                await resp.json()
+
+    api = ApiClient(base_url)
+    await api.start()
+
+    async def shared_client():
+        user_id = random.randint(1, 10**6)
+        (await api.get(f"/subscription/{user_id}", params={"user_id": user_id})).json()
+
+    async def one(fn):
+        async with semaphore:
+            return await ameasure(fn, 1)
+
+    async def batch(fn):
+        # Latency of each update while `concurrency` of them are in flight.
+        samples = await asyncio.gather(*(one(fn) for _ in range(args.updates)))
+        return [sample for chunk in samples for sample in chunk]
+
+    rows = {}
+    try:
+        for label, fn in (("session per update", session_per_update), ("shared ApiClient", shared_client)):
+            await batch(fn)  # warm up
+            rows[label] = summarize(await batch(fn))
+    finally:
+        await api.close()
+        await runner.cleanup()
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    print_table(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
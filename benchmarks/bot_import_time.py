@@ -0,0 +1,93 @@
+"""Bot cold-start cost: importing the bot and the first Django setup.
+
+Each measurement runs in a fresh interpreter, so nothing is cached between
+runs except the OS page cache:
+
+* ``import`` -- ``import vpnbot.bot``, which no longer sets Django up;
+* ``first DB access`` -- ``vpnbot.utils.ensure_django()`` on top of it, with
+  the slim ``myproject.settings_bot`` and with the full web settings.
+
+The slowest modules of the import are listed from ``-X importtime``.
+
+    python -m benchmarks.bot_import_time --runs 10
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Tuple
+
+from benchmarks.common import ROOT, print_table
+
+SCENARIOS = {
+    "import": ("import vpnbot.bot", "myproject.settings_bot"),
+    "first DB access (bot settings)": (
+        "import vpnbot.bot, vpnbot.utils; vpnbot.utils.ensure_django()",
+        "myproject.settings_bot",
+    ),
+    "first DB access (web settings)": (
+        "import vpnbot.bot, vpnbot.utils; vpnbot.utils.ensure_django()",
+        "myproject.settings",
+    ),
+}
+
+
+def _env(settings_module: str) -> Dict[str, str]:
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings_module)
+    env.setdefault("SECRET_KEY", "benchmark")
+    env["PYTHONPATH"] = ROOT + os.pathsep + env.get("PYTHONPATH", "")
+    return env
+
+
+def wall_time(code: str, settings_module: str) -> float:
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=_env(settings_module), check=True)
+    return time.perf_counter() - started
+
+
+def slowest_imports(code: str, settings_module: str, top: int) -> List[Tuple[int, str]]:
+    """``(cumulative_us, module)`` of the slowest top-level imports."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT, env=_env(settings_module), check=True, capture_output=True, text=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        # "import time:  self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, module = line[len("import time:"):].split("|")
+        if not module.startswith("  "):  # top-level imports only
+            rows.append((int(cumulative), module.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    rows = {}
+    for label, (code, settings_module) in SCENARIOS.items():
+        samples = [wall_time(code, settings_module) for _ in range(args.runs)]
+        rows[label] = {
+            "runs": len(samples),
+            "mean_ms": statistics.fmean(samples) * 1e3,
+            "min_ms": min(samples) * 1e3,
+        }
+    baseline = [wall_time("pass", "myproject.settings_bot") for _ in range(args.runs)]
+    rows["bare interpreter"] = {"runs": len(baseline), "mean_ms": statistics.fmean(baseline) * 1e3,
+                                "min_ms": min(baseline) * 1e3}
+    print_table(rows)
+
+    print("\nslowest top-level imports of 'import vpnbot.bot':")
+    for cumulative, module in slowest_imports(*SCENARIOS["import"], top=args.top):
+        print(f"  {cumulative / 1e3:8.1f} ms  {module}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
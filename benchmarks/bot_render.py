@@ -0,0 +1,119 @@
+"""CPU time per update spent in the ``/start`` and "lk" handlers.
+
+Drives ``vpnbot.handlers.start`` with in-memory updates and a fake API
+client (no network, no Telegram) and reports process CPU time per update
+for a cold render (new subscription version each time), a warm render
+(unchanged version), a payload without ``version`` (rendered every time)
+and a repeated "lk" press on an unchanged message, where the edit is
+skipped.
+
+    python -m benchmarks.bot_render --updates 20000
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from types import SimpleNamespace
+
+from benchmarks.common import print_table, setup_django, summarize
+
+PAYLOAD = {
+    "userId": "1000001",
+    "username": "vpnuser_1000001",
+    "userStatus": "active",
+    "expiresAt": "01.01.2030",
+    "daysLeft": 42,
+    "trafficUsed": 12.5,
+    "trafficLimit": 100,
+    "trafficPercent": 12.5,
+    "configUrl": "/download-config/vpnuser_1000001/",
+}
+
+
+class FakeApi:
+    def __init__(self, bodies):
+        self._bodies = bodies
+        self._i = 0
+
+    async def get(self, path, params=None):
+        from vpnbot.api_client import ApiResponse
+
+        body = self._bodies[self._i % len(self._bodies)]
+        self._i += 1
+        return ApiResponse(200, body)
+
+
+class FakeQuery:
+    def __init__(self):
+        self.message = SimpleNamespace(message_id=1)
+        self.inline_message_id = None
+        self.edits = 0
+
+    async def edit_message_text(self, **kwargs):
+        self.edits += 1
+
+    async def answer(self, *args, **kwargs):
+        pass
+
+
+async def _reply_text(*args, **kwargs):
+    pass
+
+
+async def run_scenario(bodies, updates: int, callback: bool) -> dict:
+    from vpnbot.handlers import start
+    from vpnbot.singleflight import SingleFlight
+
+    user = SimpleNamespace(id=1000001, full_name="Bench User")
+    context = SimpleNamespace(
+        bot_data={"api": FakeApi(bodies), "profiles": SingleFlight(ttl=0)},
+        user_data={},
+    )
+    query = FakeQuery() if callback else None
+    update = SimpleNamespace(
+        effective_user=user,
+        callback_query=query,
+        message=None if callback else SimpleNamespace(reply_text=_reply_text),
+    )
+
+    samples = []
+    clock = time.process_time
+    for _ in range(updates):
+        started = clock()
+        await start(update, context)
+        samples.append(clock() - started)
+    row = summarize(samples)
+    if query is not None:
+        row["edits_sent"] = query.edits
+    return row
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--updates", type=int, default=20000)
+    args = parser.parse_args()
+
+    setup_django(migrate=False)
+
+    def body(version):
+        payload = dict(PAYLOAD, version=version) if version is not None else PAYLOAD
+        return json.dumps(payload).encode()
+
+    cold = [body(f"v{i}") for i in range(args.updates)]
+    warm = [body("v0")]
+    unversioned = [body(None)]
+
+    rows = {
+        "/start cold": asyncio.run(run_scenario(cold, args.updates, callback=False)),
+        "/start warm": asyncio.run(run_scenario(warm, args.updates, callback=False)),
+        "/start no version": asyncio.run(run_scenario(unversioned, args.updates, callback=False)),
+        "lk changed": asyncio.run(run_scenario(cold, args.updates, callback=True)),
+        "lk unchanged": asyncio.run(run_scenario(warm, args.updates, callback=True)),
+    }
+    print_table(rows)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
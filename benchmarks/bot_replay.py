@@ -0,0 +1,169 @@
+"""Replay Telegram updates through the bot against a local fake Bot API.
+
+    python -m benchmarks.bot_replay --users 200 --updates-per-user 5
+    python -m benchmarks.bot_replay --updates recorded.jsonl
+
+``--updates`` takes recorded updates, one Bot API ``Update`` JSON object per
+line; without it ``/start`` messages and "lk" callbacks are synthesized.
+The fake API (Telegram methods and the Django ``/subscription`` endpoint)
+answers after ``--latency`` seconds, so handler concurrency is what limits
+throughput.  Each run reports updates/s and enqueue-to-done latency for
+sequential processing and for ``PerUserUpdateProcessor``.
+
+Every run builds its own Application and goes through ``post_init``,
+``post_stop`` and ``post_shutdown`` in ``run_polling``'s order, so the
+second run also checks that the bot starts again (``resume_pending`` and
+friends on the shared ``db_executor``) after one has been shut down in the
+same process.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from typing import List
+
+from aiohttp import web
+
+from benchmarks.common import percentile, print_table, setup_django
+
+TOKEN = "123456:BENCHMARK"
+
+
+def synthesize(users: int, per_user: int) -> List[dict]:
+    now = int(time.time())
+    updates = []
+    for n in range(per_user):
+        for uid in range(1, users + 1):
+            update_id = len(updates) + 1
+            sender = {"id": uid, "is_bot": False, "first_name": f"user{uid}"}
+            chat = {"id": uid, "type": "private"}
+            if n % 2 == 0:
+                updates.append({"update_id": update_id, "message": {
+                    "message_id": update_id, "date": now, "chat": chat, "from": sender,
+                    "text": "/start", "entities": [{"type": "bot_command", "offset": 0, "length": 6}],
+                }})
+            else:
+                updates.append({"update_id": update_id, "callback_query": {
+                    "id": str(update_id), "from": sender, "chat_instance": str(uid), "data": "lk",
+                    "message": {"message_id": 1, "date": now, "chat": chat, "text": "menu"},
+                }})
+    return updates
+
+
+def fake_api(latency: float) -> web.Application:
+    message_ids = iter(range(10**9))
+
+    async def bot_method(request: web.Request) -> web.Response:
+        await asyncio.sleep(latency)
+        method = request.match_info["method"]
+        data = await request.post()
+        if method == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+        elif method in ("sendMessage", "editMessageText"):
+            result = {
+                "message_id": next(message_ids), "date": int(time.time()),
+                "chat": {"id": int(data.get("chat_id", 1)), "type": "private"},
+                "text": data.get("text", ""),
+            }
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+    async def subscription(request: web.Request) -> web.Response:
+        await asyncio.sleep(latency)
+        return web.json_response({
+            "userId": request.match_info["user_id"], "username": "vpnuser", "userStatus": "active",
+            "daysLeft": 10, "trafficUsed": 1.5, "trafficLimit": 100,
+        })
+
+    app = web.Application()
+    app.router.add_post("/bot{token}/{method}", bot_method)
+    app.router.add_get("/api/subscription/{user_id}", subscription)
+    return app
+
+
+async def replay(updates: List[dict], base: str, concurrent_updates: int) -> dict:
+    from telegram import Update
+    from telegram.ext import TypeHandler
+
+    from vpnbot.bot import build_application
+
+    application = build_application(
+        token=TOKEN, webhook=True, base_url=f"{base}/bot", concurrent_updates=concurrent_updates
+    )
+    enqueued, latencies = {}, []
+    done = asyncio.Event()
+
+    async def record(update, context):
+        latencies.append(time.perf_counter() - enqueued[update.update_id])
+        if len(latencies) == len(updates):
+            done.set()
+
+    application.add_handler(TypeHandler(Update, record), group=100)
+    await application.initialize()
+    await application.post_init(application)
+    await application.start()
+
+    started = time.perf_counter()
+    for data in updates:
+        enqueued[data["update_id"]] = time.perf_counter()
+        await application.update_queue.put(Update.de_json(data, application.bot))
+    await done.wait()
+    elapsed = time.perf_counter() - started
+
+    await application.stop()
+    await application.post_stop(application)
+    await application.shutdown()
+    await application.post_shutdown(application)
+    return {
+        "n": len(latencies),
+        "updates_per_s": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1e3,
+        "p99_ms": percentile(latencies, 99) * 1e3,
+    }
+
+
+async def run(args) -> dict:
+    runner = web.AppRunner(fake_api(args.latency), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", args.port).start()
+    base = f"http://127.0.0.1:{args.port}"
+    os.environ["VPN_API_URL"] = f"{base}/api"
+
+    if args.updates:
+        with open(args.updates) as f:
+            updates = [json.loads(line) for line in f if line.strip()]
+    else:
+        updates = synthesize(args.users, args.updates_per_user)
+
+    rows = {}
+    try:
+        for label, concurrency in (("sequential", 1), (f"per-user x{args.concurrency}", args.concurrency)):
+            rows[label] = await replay(updates, base, concurrency)
+    finally:
+        await runner.cleanup()
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--updates", help="JSON lines file of recorded updates")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--updates-per-user", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+
+    # Provisioning runs on FakeNodeBackend, which get_backend only allows
+    # with DEBUG on.
+    settings.DEBUG = True
+    print_table(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
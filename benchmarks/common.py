@@ -0,0 +1,129 @@
+"""Shared helpers for the scripts in ``benchmarks/``.
+
+Every script is run from the project root as ``python -m benchmarks.<name>``
+and works against a scratch SQLite database, never ``db.sqlite3``, unless a
+``database_url`` (e.g. a throwaway PostgreSQL database) is passed.
+"""
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def setup_django(database: Optional[str] = None, migrate: bool = True,
+                 options: Optional[dict] = None, database_url: Optional[str] = None) -> str:
+    """Point Django at a scratch database, call ``django.setup()`` and migrate."""
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "myproject.settings")
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+
+    import django
+    from django.conf import settings
+
+    if database_url:
+        from myproject.database import database_from_url
+
+        settings.DATABASES["default"] = database_from_url(database_url, None)
+        database = settings.DATABASES["default"]["NAME"]
+    else:
+        if database is None:
+            fd, database = tempfile.mkstemp(prefix="vpnshop-bench-", suffix=".sqlite3")
+            os.close(fd)
+        settings.DATABASES["default"]["NAME"] = database
+    if options:
+        settings.DATABASES["default"].setdefault("OPTIONS", {}).update(options)
+    settings.DEBUG = False  # keep connection.queries from growing unbounded
+    django.setup()
+
+    if migrate:
+        from django.core.management import call_command
+
+        call_command("migrate", verbosity=0)
+    return database
+
+
+def seed_subscriptions(count: int, batch_size: int = 5000) -> List[str]:
+    """Insert ``count`` users with one active subscription each; return vpn usernames."""
+    from django.utils import timezone
+    from main.models import Subscription, VPNUser
+
+    now = timezone.now()
+    names = []
+    for start in range(0, count, batch_size):
+        stop = min(start + batch_size, count)
+        users = VPNUser.objects.bulk_create(
+            VPNUser(user_id=str(1_000_000 + i), username=f"user{i}") for i in range(start, stop)
+        )
+        subscriptions = [
+            Subscription(
+                user=user,
+                vpn_username=f"vpnuser_{user.user_id}",
+                vpn_config=f"<VPN config for vpnuser_{user.user_id}>",
+                status=Subscription.STATUS_ACTIVE if i % 4 else Subscription.STATUS_EXPIRED,
+                tariff=Subscription.TARIFF_1MONTH,
+                expires_at=now + timedelta(days=(i % 60) - 15),
+                traffic_used=i % 100,
+            )
+            for i, user in zip(range(start, stop), users)
+        ]
+        Subscription.objects.bulk_create(subscriptions)
+        names.extend(s.vpn_username for s in subscriptions)
+    return names
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def measure(fn: Callable[[], object], iterations: int) -> List[float]:
+    """Call ``fn`` ``iterations`` times and return per-call latencies in seconds."""
+    samples = []
+    clock = time.perf_counter
+    for _ in range(iterations):
+        started = clock()
+        fn()
+        samples.append(clock() - started)
+    return samples
+
+
+async def ameasure(fn: Callable[[], Awaitable[object]], iterations: int) -> List[float]:
+    """Await ``fn()`` ``iterations`` times and return per-call latencies in seconds."""
+    samples = []
+    clock = time.perf_counter
+    for _ in range(iterations):
+        started = clock()
+        await fn()
+        samples.append(clock() - started)
+    return samples
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    return {
+        "n": len(samples),
+        "mean_us": statistics.fmean(samples) * 1e6,
+        "p50_us": percentile(samples, 50) * 1e6,
+        "p99_us": percentile(samples, 99) * 1e6,
+    }
+
+
+def print_table(rows: Dict[str, Dict[str, float]]) -> None:
+    """Print ``{label: {column: value}}`` as an aligned table."""
+    columns: List[str] = []
+    for row in rows.values():
+        columns.extend(key for key in row if key not in columns)
+    width = max(len(label) for label in rows) + 2
+    print("".ljust(width) + "".join(col.rjust(14) for col in columns))
+    for label, row in rows.items():
+        cells = []
+        for col in columns:
+            value = row.get(col, "")
+            cells.append((f"{value:.1f}" if isinstance(value, float) else str(value)).rjust(14))
+        print(label.ljust(width) + "".join(cells))
@@ -0,0 +1,124 @@
+"""Simultaneous payment writes and status reads against one database.
+
+Writer threads record distinct payments through ``process_payment`` (as the
+bot does) while reader threads loop over ``check_subscription_status`` and
+the web view's snapshot query.  Reports write throughput, read latency and
+the number of operations that failed, e.g. with "database is locked".
+
+    python -m benchmarks.db_concurrency                       # SQLite, WAL
+    python -m benchmarks.db_concurrency --sqlite-legacy       # SQLite, rollback journal
+    python -m benchmarks.db_concurrency --database-url postgres://bench@localhost/bench_vpnshop
+
+The PostgreSQL database is flushed and reused; never point this at real data.
+"""
+import argparse
+import itertools
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import print_table, seed_subscriptions, setup_django, summarize
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--database-url")
+    parser.add_argument("--sqlite-legacy", action="store_true",
+                        help="default journal mode and deferred transactions, as before")
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--readers", type=int, default=16)
+    parser.add_argument("--payments", type=int, default=200, help="payments per writer")
+    args = parser.parse_args()
+
+    setup_django(database_url=args.database_url, migrate=False)
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.db import connection
+
+    if args.sqlite_legacy:
+        # Before the first connection: journal_mode=WAL sticks to the file.
+        settings.DATABASES["default"]["OPTIONS"] = {"timeout": 5}
+    call_command("migrate", verbosity=0)
+    if args.database_url:
+        call_command("flush", interactive=False, verbosity=0)
+
+    from main.cache import SNAPSHOT_FIELDS
+    from main.models import Subscription
+    from vpnbot.utils import check_subscription_status, process_payment
+
+    names = seed_subscriptions(args.rows)
+    telegram_ids = [int(name.rsplit("_", 1)[1]) for name in names]
+    charges = itertools.count()
+    writers_done = threading.Event()
+    errors = {"write": 0, "read": 0}
+    lock = threading.Lock()
+
+    def write(worker):
+        samples = []
+        try:
+            for i in range(args.payments):
+                user_id = telegram_ids[(worker * args.payments + i) % len(telegram_ids)]
+                started = time.perf_counter()
+                try:
+                    process_payment(
+                        user_id=user_id, amount=178, currency="RUB", tariff_id="1month",
+                        provider_payment_id=f"charge-{next(charges)}",
+                    )
+                    samples.append(time.perf_counter() - started)
+                except Exception:
+                    with lock:
+                        errors["write"] += 1
+        finally:
+            connection.close()
+        return samples
+
+    def read(worker):
+        samples = []
+        try:
+            for i in itertools.count(worker):
+                if writers_done.is_set():
+                    break
+                started = time.perf_counter()
+                try:
+                    if i % 2:
+                        check_subscription_status(telegram_ids[i % len(telegram_ids)])
+                    else:
+                        Subscription.objects.values(*SNAPSHOT_FIELDS).get(
+                            vpn_username=names[i % len(names)]
+                        )
+                    samples.append(time.perf_counter() - started)
+                except Exception:
+                    with lock:
+                        errors["read"] += 1
+        finally:
+            connection.close()
+        return samples
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.writers + args.readers) as pool:
+        readers = [pool.submit(read, n) for n in range(args.readers)]
+        writers = [pool.submit(write, n) for n in range(args.writers)]
+        write_samples = [s for f in writers for s in f.result()]
+        elapsed = time.perf_counter() - started
+        writers_done.set()
+        read_samples = [s for f in readers for s in f.result()]
+
+    vendor = connection.vendor
+    if vendor == "sqlite":
+        vendor += " (legacy)" if args.sqlite_legacy else " (WAL)"
+    print(f"{vendor}: {args.writers} writers x {args.payments} payments, {args.readers} readers")
+    rows = {}
+    if write_samples:
+        rows["payment write"] = dict(summarize(write_samples), per_s=len(write_samples) / elapsed,
+                                     errors=errors["write"])
+    if read_samples:
+        rows["status read"] = dict(summarize(read_samples), per_s=len(read_samples) / elapsed,
+                                   errors=errors["read"])
+    print_table(rows)
+    return 1 if errors["write"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
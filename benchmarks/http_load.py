@@ -0,0 +1,123 @@
+"""Closed-loop HTTP load generator for comparing WSGI and ASGI deployments.
+
+Start both servers against the same database, e.g.::
+
+    gunicorn myproject.wsgi:application -b 127.0.0.1:8101 -w 1 --threads 32
+    uvicorn myproject.asgi:application --port 8102 --workers 1 --no-access-log
+
+then drive the same path through each of them::
+
+    python -m benchmarks.http_load --path /api/subscription/vpnuser_1000001 \\
+        --target wsgi=http://127.0.0.1:8101 --target asgi=http://127.0.0.1:8102 \\
+        --concurrency 1000 --duration 30
+
+Each virtual client holds one keep-alive connection and issues requests
+back to back, so the numbers reflect server throughput and tail latency,
+not connection setup.  Only the standard library is used.
+"""
+import argparse
+import asyncio
+import time
+from typing import Dict, List, Tuple
+from urllib.parse import urlsplit
+
+from benchmarks.common import percentile, print_table
+
+
+async def _read_response(reader: asyncio.StreamReader) -> int:
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    status = int(lines[0].split(" ", 2)[1])
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+
+    if "content-length" in headers:
+        await reader.readexactly(int(headers["content-length"]))
+    elif headers.get("transfer-encoding") == "chunked":
+        while True:
+            size = int((await reader.readline()).strip(), 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    return status
+
+
+async def _client(host: str, port: int, request: bytes, deadline: float,
+                  latencies: List[float], errors: List[int]) -> None:
+    reader = writer = None
+    clock = time.perf_counter
+    while clock() < deadline:
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            started = clock()
+            writer.write(request)
+            status = await _read_response(reader)
+            latencies.append(clock() - started)
+            if status >= 400:
+                errors.append(status)
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            errors.append(0)
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+            await asyncio.sleep(0.05)
+    if writer is not None:
+        writer.close()
+
+
+async def run_target(url: str, path: str, concurrency: int, duration: float) -> Dict[str, float]:
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+    request = (
+        f"GET {path} HTTP/1.1\r\nHost: {parts.netloc}\r\n"
+        f"User-Agent: vpnshop-http-load\r\nConnection: keep-alive\r\n\r\n"
+    ).encode()
+
+    latencies: List[float] = []
+    errors: List[int] = []
+    started = time.perf_counter()
+    deadline = started + duration
+    await asyncio.gather(*(
+        _client(host, port, request, deadline, latencies, errors) for _ in range(concurrency)
+    ))
+    elapsed = time.perf_counter() - started
+
+    if not latencies:
+        return {"n": 0, "errors": len(errors)}
+    return {
+        "n": len(latencies),
+        "rps": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1e3,
+        "p99_ms": percentile(latencies, 99) * 1e3,
+        "p999_ms": percentile(latencies, 99.9) * 1e3,
+        "errors": len(errors),
+    }
+
+
+def _parse_target(value: str) -> Tuple[str, str]:
+    label, _, url = value.partition("=")
+    if not url:
+        raise argparse.ArgumentTypeError("expected LABEL=URL")
+    return label, url
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", type=_parse_target, action="append", required=True)
+    parser.add_argument("--path", default="/api/subscription/vpnuser_1000001")
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=15.0)
+    args = parser.parse_args()
+
+    rows = {}
+    for label, url in args.target:
+        rows[label] = asyncio.run(run_target(url, args.path, args.concurrency, args.duration))
+    print_table(rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Per-request logging cost on the calling thread, before and after
+``myproject.log``.
+
+Each simulated request logs what a config download and a status lookup do:
+one hot-path INFO line, one DEBUG line below the configured level and one
+regular INFO line with a few fields.
+
+* before: f-strings and a ``StreamHandler`` formatting and writing inline
+  (the old ``logging.basicConfig`` setup);
+* after: %-style arguments, the hot-path line marked ``SAMPLED`` and the
+  ``QueueingHandler`` writing JSON on its listener thread.
+
+Output goes to a temporary file; ``--write-delay-us`` adds a sleep to every
+write to stand in for a slow disk or a full stderr pipe.  ``cpu_us`` is
+the calling thread's own CPU time, the work actually taken off a request
+or the event loop; the wall-clock columns also include waiting for the
+GIL held by the listener thread.
+
+    python -m benchmarks.logging_cost --requests 100000 --write-delay-us 50
+"""
+import argparse
+import logging
+import sys
+import tempfile
+import time
+
+from benchmarks.common import measure, print_table, summarize
+from myproject.log import PLAIN_FORMAT, SAMPLED, SamplingFilter, queueing_handler
+
+SNAPSHOT = {
+    "vpn_username": "vpnuser_1000001",
+    "status": "active",
+    "expires_at": "2030-01-01T00:00:00+00:00",
+    "traffic_used": 12.5,
+    "traffic_limit": 100,
+}
+
+
+def before(logger):
+    def request():
+        username = SNAPSHOT["vpn_username"]
+        logger.info(f"VPN config request for {username}")
+        logger.debug(f"Snapshot loaded: {SNAPSHOT}")
+        logger.info(f"Payment saved: {42} for user {1000001}")
+    return request
+
+
+def after(logger):
+    def request():
+        username = SNAPSHOT["vpn_username"]
+        logger.info("VPN config request for %s", username, extra=SAMPLED)
+        logger.debug("Snapshot loaded: %s", SNAPSHOT)
+        logger.info("Payment saved: %s for user %s", 42, 1000001)
+    return request
+
+
+class SlowStream:
+    def __init__(self, stream, delay: float):
+        self.stream = stream
+        self.delay = delay
+
+    def write(self, text):
+        if self.delay:
+            time.sleep(self.delay)
+        return self.stream.write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+
+def run(handler, make_request, requests: int) -> dict:
+    logger = logging.getLogger("benchmarks.logging_cost")
+    logger.handlers[:] = [handler]
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    request = make_request(logger)
+    measure(request, min(requests, 1000))  # warm up
+    started = time.perf_counter()
+    cpu_started = time.thread_time()
+    row = summarize(measure(request, requests))
+    row["cpu_us"] = (time.thread_time() - cpu_started) / requests * 1e6
+    handler.close()  # QueueingHandler drains its queue here
+    row["drain_ms"] = (time.perf_counter() - started) * 1e3
+    return row
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=100000)
+    parser.add_argument("--sample-rate", type=float, default=0.1)
+    parser.add_argument("--write-delay-us", type=float, default=0)
+    args = parser.parse_args()
+
+    rows = {}
+    with tempfile.TemporaryFile("w") as file:
+        out = SlowStream(file, args.write_delay_us / 1e6)
+        handler = logging.StreamHandler(out)
+        handler.setFormatter(logging.Formatter(PLAIN_FORMAT))
+        rows["before: inline plain"] = run(handler, before, args.requests)
+
+        for label, rate in (("after: queue json", 1.0), (f"after: sampled {args.sample_rate}", args.sample_rate)):
+            handler = queueing_handler(json_format=True, stream=out)
+            handler.addFilter(SamplingFilter(rate))
+            rows[label] = run(handler, after, args.requests)
+    print_table(rows)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,51 @@
+"""Per-event cost of recording into ``main.metrics``.
+
+Per-call latency includes the timer itself; compare against the "no-op"
+row.  Also reports the time to render the exposition for a registry with
+many label sets.
+
+    python -m benchmarks.metrics_overhead --events 500000
+"""
+import argparse
+import itertools
+import random
+import sys
+import time
+
+from benchmarks.common import measure, print_table, summarize
+from main.metrics import Registry
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--events", type=int, default=500000)
+    parser.add_argument("--views", type=int, default=20, help="distinct label sets")
+    args = parser.parse_args()
+
+    registry = Registry()
+    counter = registry.counter("bench_total", "bench", ("view",))
+    histogram = registry.histogram("bench_seconds", "bench", ("view", "method", "status"))
+    child = histogram.labels("home", "GET", 200)
+    views = [f"view_{i}" for i in range(args.views)]
+    values = [random.expovariate(50) for _ in range(4096)]
+
+    next_value = itertools.cycle(values).__next__
+    next_view = itertools.cycle(views).__next__
+    rows = {}
+    for label, fn in (
+        ("no-op", lambda: next_value()),
+        ("Counter.inc (cached child)", lambda: counter.labels("home").inc(next_value())),
+        ("Histogram.observe (child)", lambda: child.observe(next_value())),
+        ("Histogram labels+observe", lambda: histogram.labels(next_view(), "GET", 200).observe(next_value())),
+    ):
+        rows[label] = summarize(measure(fn, args.events))
+    print_table(rows)
+
+    started = time.perf_counter()
+    text = registry.exposition()
+    print(f"\nexposition: {len(text.splitlines())} lines in {(time.perf_counter() - started) * 1e3:.2f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,53 @@
+"""Per-request overhead of ClientTypeMiddleware.
+
+    python -m benchmarks.middleware_overhead --requests 200000
+"""
+import argparse
+import random
+
+from benchmarks.common import measure, print_table, setup_django, summarize
+
+USER_AGENTS = [
+    "Mozilla/5.0 (Linux; Android 14) AppleWebKit/537.36 Chrome/126.0 Mobile Safari/537.36",
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_5 like Mac OS X) AppleWebKit/605.1.15 Version/17.5 Mobile/15E148",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/126.0 Safari/537.36",
+    "v2rayNG/1.8.19",
+    "WireGuard/1.0.20220627 (Android 13)",
+    "ClashforWindows/0.20.39",
+    "Shadowrocket/2070 CFNetwork/1494.0.7 Darwin/23.4.0",
+    "Hiddify/2.0.5 (android)",
+]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=200000)
+    parser.add_argument("--distinct-agents", type=int, default=2000,
+                        help="extra unique User-Agents, to exercise LRU misses")
+    args = parser.parse_args()
+
+    setup_django(migrate=False)
+    from django.test import RequestFactory
+
+    from main.middleware import ClientTypeMiddleware
+
+    factory = RequestFactory()
+    agents = USER_AGENTS + [f"{random.choice(USER_AGENTS)} build/{i}" for i in range(args.distinct_agents)]
+    requests = [
+        factory.get("/vpnuser_1", HTTP_USER_AGENT=random.choice(agents), HTTP_ACCEPT="*/*")
+        for _ in range(5000)
+    ]
+
+    rows = {}
+    for label, middleware in (
+        ("no-op", lambda request: None),
+        ("ClientTypeMiddleware", ClientTypeMiddleware(lambda request: None)),
+    ):
+        it = iter(random.choices(requests, k=args.requests * 2))
+        measure(lambda: middleware(next(it)), args.requests)  # warm up the UA cache
+        rows[label] = summarize(measure(lambda: middleware(next(it)), args.requests))
+    print_table(rows)
+
+
+if __name__ == "__main__":
+    main()
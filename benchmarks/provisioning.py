@@ -0,0 +1,87 @@
+"""Payment latency with queued provisioning, and worker throughput per batch size.
+
+Records ``--payments`` payments through ``process_payment`` (which now only
+queues a ``ProvisioningJob``) and reports the per-payment latency.  The
+queue is then drained by ``ProvisioningWorker`` against a
+``FakeNodeBackend`` that takes ``--node-delay`` seconds per call, once per
+batch size, to show what batching many peers per node call buys.  Telegram
+is replaced by a bot that accepts every document.
+
+    python -m benchmarks.provisioning --payments 500 --node-delay 0.2
+"""
+import argparse
+import asyncio
+import itertools
+import sys
+import tempfile
+import time
+
+from benchmarks.common import measure, print_table, setup_django, summarize
+
+_charges = itertools.count()
+
+
+class FakeBot:
+    def __init__(self):
+        self.documents = 0
+
+    async def send_document(self, **kwargs):
+        self.documents += 1
+
+
+async def drain(backend, batch_size: int) -> dict:
+    from vpnbot.provisioning import ProvisioningWorker
+    from vpnbot.ratelimit import TelegramRateLimiter
+
+    bot = FakeBot()
+    worker = ProvisioningWorker(bot, TelegramRateLimiter(global_rate=1e9, per_chat_rate=1e9))
+    worker.backend = backend
+    worker.batch_size = batch_size
+    started = time.perf_counter()
+    jobs = 0
+    while True:
+        claimed = await worker.run_once()
+        if not claimed:
+            break
+        jobs += claimed
+    elapsed = time.perf_counter() - started
+    return {"jobs": jobs, "node_calls": backend.calls, "delivered": bot.documents,
+            "seconds": elapsed, "jobs_per_s": jobs / elapsed if elapsed else 0.0}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--payments", type=int, default=500)
+    parser.add_argument("--node-delay", type=float, default=0.2)
+    parser.add_argument("--batch-sizes", default="1,10,100")
+    args = parser.parse_args()
+
+    setup_django()
+    from main.artifacts import config_store
+    from main.models import ProvisioningJob
+    from main.nodes import FakeNodeBackend
+    from vpnbot.utils import process_payment
+
+    config_store.root = tempfile.mkdtemp(prefix="vpnshop-configs-")
+
+    def pay():
+        charge = next(_charges)
+        process_payment(user_id=700000 + charge, amount=178, currency="RUB", tariff_id="1month",
+                        provider_payment_id=f"charge-provisioning-{charge}")
+
+    print_table({"process_payment (enqueue)": summarize(measure(pay, args.payments))})
+    print()
+
+    rows = {}
+    for batch_size in (int(size) for size in args.batch_sizes.split(",")):
+        ProvisioningJob.objects.update(status=ProvisioningJob.STATUS_PENDING, attempts=0)
+        backend = FakeNodeBackend(delay=args.node_delay, max_batch=batch_size)
+        rows[f"batch {batch_size}"] = asyncio.run(drain(backend, batch_size))
+    print_table(rows)
+    pending = ProvisioningJob.objects.exclude(status=ProvisioningJob.STATUS_DONE).count()
+    print("ok" if pending == 0 else f"FAIL: {pending} jobs not done")
+    return 0 if pending == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,51 @@
+"""Compare ``get_subscription`` latency with and without the snapshot cache.
+
+    python -m benchmarks.subscription_cache --subscriptions 20000 --requests 20000
+"""
+import argparse
+import asyncio
+import random
+
+from benchmarks.common import ameasure, print_table, seed_subscriptions, setup_django, summarize
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--subscriptions", type=int, default=20000)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--hot-set", type=int, default=500,
+                        help="number of distinct subscriptions being polled")
+    args = parser.parse_args()
+
+    setup_django()
+    from django.test import RequestFactory
+
+    from main import views
+    from main.cache import SubscriptionCache
+
+    names = seed_subscriptions(args.subscriptions)
+    hot = random.sample(names, min(args.hot_set, len(names)))
+    factory = RequestFactory()
+
+    async def call():
+        name = random.choice(hot)
+        response = await views.get_subscription(factory.get(f"/api/subscription/{name}"), name)
+        assert response.status_code == 200
+
+    async def run():
+        rows = {}
+        for label, cache in (
+            ("uncached", SubscriptionCache(maxsize=0)),
+            ("cached", SubscriptionCache(maxsize=10000, ttl=60)),
+        ):
+            views.subscription_cache = cache
+            await ameasure(call, min(1000, args.requests))  # warm up
+            rows[label] = summarize(await ameasure(call, args.requests))
+            rows[label]["hit_pct"] = cache.stats()["hit_rate"] * 100
+        return rows
+
+    print_table(asyncio.run(run()))
+
+
+if __name__ == "__main__":
+    main()
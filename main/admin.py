@@ -1 +1,159 @@
-# Register your models here.
+from django.contrib import admin
+from django.db.models import Count, Q
+from django.utils import timezone
+from django.utils.html import format_html
+
+from .artifacts import config_download_path
+from .models import Payment, ProvisioningJob, Subscription, VPNUser
+from .paginators import EstimatedCountPaginator
+
+
+@admin.register(VPNUser)
+class VPNUserAdmin(admin.ModelAdmin):
+    list_display = ("user_id", "username", "first_name", "subscriptions_count")
+    search_fields = ("user_id", "username", "first_name", "last_name")
+    readonly_fields = ("created_at", "updated_at")
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        # One annotated query instead of a COUNT per row.
+        return super().get_queryset(request).annotate(
+            _subscriptions_count=Count("subscriptions")
+        )
+
+    @admin.display(description="Subscriptions", ordering="_subscriptions_count")
+    def subscriptions_count(self, obj):
+        return obj._subscriptions_count
+
+
+@admin.register(Subscription)
+class SubscriptionAdmin(admin.ModelAdmin):
+    list_display = (
+        "vpn_username",
+        "user_info",
+        "status_colored",
+        "tariff",
+        "expires_at",
+        "days_left_display",
+        "traffic_usage",
+        "created_at",
+    )
+    list_filter = ("status", "tariff", "created_at")
+    list_select_related = ("user",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    search_fields = ("vpn_username", "user__user_id", "user__username")
+    readonly_fields = (
+        "days_left",
+        "traffic_percentage",
+        "config_link",
+        "created_at",
+        "updated_at",
+    )
+    date_hierarchy = "expires_at"
+
+    fieldsets = (
+        (None, {"fields": ("user", "vpn_username", "vpn_config", "config_link", "status", "tariff")}),
+        (
+            "Traffic",
+            {"fields": ("traffic_used", "traffic_limit", "traffic_percentage")},
+        ),
+        ("Dates", {"fields": ("expires_at", "created_at", "updated_at")}),
+    )
+
+    @admin.display(description="Config download")
+    def config_link(self, obj):
+        if not obj.pk:
+            return "-"
+        path = config_download_path(obj.vpn_username)
+        return format_html('<a href="{}">{}</a>', path, path)
+
+    @admin.display(description="User")
+    def user_info(self, obj):
+        return f"{obj.user.user_id} ({obj.user.username or obj.user.first_name})"
+
+    @admin.display(description="Status")
+    def status_colored(self, obj):
+        colors = {
+            Subscription.STATUS_ACTIVE: "green",
+            Subscription.STATUS_EXPIRED: "red",
+            Subscription.STATUS_PENDING: "orange",
+        }
+        return format_html(
+            '<span style="color: {};">{}</span>',
+            colors.get(obj.status, "black"),
+            obj.get_status_display(),
+        )
+
+    @admin.display(description="Days Left")
+    def days_left_display(self, obj):
+        days = obj.days_left
+        if days <= 3:
+            color = "red"
+        elif days <= 7:
+            color = "orange"
+        else:
+            color = "green"
+        return format_html('<span style="color: {};">{}</span>', color, days)
+
+    @admin.display(description="Traffic Usage")
+    def traffic_usage(self, obj):
+        percentage = obj.traffic_percentage
+        if percentage > 90:
+            color = "red"
+        elif percentage > 70:
+            color = "orange"
+        else:
+            color = "green"
+        return format_html(
+            '{} GB / {} GB (<span style="color: {};">{}%</span>)',
+            obj.traffic_used,
+            obj.traffic_limit,
+            color,
+            percentage,
+        )
+
+
+@admin.register(Payment)
+class PaymentAdmin(admin.ModelAdmin):
+    list_display = ("id", "subscription", "amount", "currency", "created_at")
+    list_filter = ("currency", "created_at")
+    # Payment.__str__ -> Subscription.__str__ -> user.user_id
+    list_select_related = ("subscription__user",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    search_fields = (
+        "subscription__vpn_username",
+        "subscription__user__user_id",
+        "provider_payment_id",
+    )
+    readonly_fields = ("created_at",)
+
+
+@admin.register(ProvisioningJob)
+class ProvisioningJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "subscription", "status", "attempts", "available_at", "updated_at")
+    list_filter = ("status",)
+    list_select_related = ("subscription__user",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    search_fields = ("subscription__vpn_username",)
+    readonly_fields = ("created_at", "updated_at", "lease_expires_at", "last_error")
+    actions = ("retry",)
+
+    @admin.action(description="Retry selected jobs now")
+    def retry(self, request, queryset):
+        now = timezone.now()
+        # A running job with a live lease is still owned by a worker;
+        # requeueing it would provision the peer twice.
+        updated = queryset.exclude(
+            Q(status=ProvisioningJob.STATUS_DONE)
+            | Q(status=ProvisioningJob.STATUS_RUNNING, lease_expires_at__gt=now)
+        ).update(
+            status=ProvisioningJob.STATUS_PENDING,
+            attempts=0,
+            available_at=now,
+            lease_expires_at=None,
+        )
+        self.message_user(request, f"{updated} jobs queued again.")
@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class MainConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "main"
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from . import signals  # noqa: F401
+        from .middleware import install_query_timer
+
+        connection_created.connect(install_query_timer, dispatch_uid="main.query_timer")
@@ -0,0 +1,141 @@
+"""Content-addressed store of rendered VPN configs.
+
+Each config is written once under ``VPN_CONFIG_ROOT/<aa>/<sha256>`` together
+with precompressed ``.gz`` (and ``.br`` when the optional ``brotli`` package
+is installed) siblings.  The digest doubles as a strong ETag, so clients
+re-downloading an unchanged config get a 304 without the file being read.
+Configs hold private keys, so the download URL carries ``config_token``, an
+HMAC of the subscription name under ``SECRET_KEY``; see
+``config_download_path``.
+Other reads go through an LRU of file contents; a miss reads the file in a
+worker thread so the event loop never waits on the disk.
+"""
+import gzip
+import hashlib
+import os
+import tempfile
+from typing import Optional, Tuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core import signing
+from django.http import HttpResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.crypto import constant_time_compare
+
+from .lru import LRUCache
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+ENCODING_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+CONFIG_TOKEN_SALT = "main.artifacts.config"
+
+
+def config_token(vpn_username: str) -> str:
+    return signing.Signer(salt=CONFIG_TOKEN_SALT).signature(vpn_username)
+
+
+def check_config_token(vpn_username: str, token: str) -> bool:
+    return constant_time_compare(token, config_token(vpn_username))
+
+
+def config_download_path(vpn_username: str) -> str:
+    """Path of the signed config download for ``vpn_username``."""
+    return reverse("download_config", args=(vpn_username, config_token(vpn_username)))
+
+
+class ConfigArtifactStore:
+    def __init__(self, root: str, cache_size: int = 1024):
+        self.root = root
+        self._bytes = LRUCache(maxsize=cache_size, ttl=float("inf"))
+
+    @classmethod
+    def from_settings(cls) -> "ConfigArtifactStore":
+        return cls(settings.VPN_CONFIG_ROOT)
+
+    @property
+    def encodings(self) -> Tuple[str, ...]:
+        return ("br", "gzip") if brotli is not None else ("gzip",)
+
+    def path(self, digest: str, encoding: Optional[str] = None) -> str:
+        return os.path.join(self.root, digest[:2], digest + ENCODING_SUFFIXES.get(encoding, ""))
+
+    def _write(self, path: str, data: bytes) -> None:
+        # Write-then-rename, so readers never see a partial artifact.
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def put(self, content: str) -> str:
+        """Store ``content`` (idempotently) and return its sha256 digest."""
+        raw = content.encode("utf-8")
+        digest = hashlib.sha256(raw).hexdigest()
+        path = self.path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        compressors = {"gzip": lambda data: gzip.compress(data, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            compressors["br"] = lambda data: brotli.compress(data, quality=11)
+        for encoding, compress in compressors.items():
+            # Also backfills .br for artifacts stored before brotli was installed.
+            if not os.path.exists(self.path(digest, encoding)):
+                self._write(self.path(digest, encoding), compress(raw))
+        if not os.path.exists(path):
+            self._write(path, raw)
+        return digest
+
+    def read(self, digest: str, encoding: Optional[str] = None) -> Optional[bytes]:
+        """Return the artifact's bytes, or None if its file is missing."""
+        key = f"{digest}:{encoding}"
+        data = self._bytes.get(key)
+        if data is None:
+            try:
+                with open(self.path(digest, encoding), "rb") as f:
+                    data = f.read()
+            except FileNotFoundError:
+                return None
+            self._bytes.set(key, data)
+        return data
+
+    def negotiate(self, accept_encoding: str) -> Optional[str]:
+        accepted = {
+            part.split(";", 1)[0].strip().lower()
+            for part in accept_encoding.split(",")
+            if not part.replace(" ", "").endswith(";q=0")
+        }
+        for encoding in self.encodings:
+            if encoding in accepted:
+                return encoding
+        return None
+
+    async def aresponse(self, request, digest: str) -> Optional[HttpResponse]:
+        """Serve an artifact with ETag / If-None-Match handling.
+
+        Returns None if the artifact file is missing (e.g. ``VPN_CONFIG_ROOT``
+        was wiped), so the caller can ``put`` the config again.
+        """
+        encoding = self.negotiate(request.headers.get("Accept-Encoding", ""))
+        # Each encoded representation gets its own strong validator.
+        etag = f'"{digest}-{encoding}"' if encoding else f'"{digest}"'
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            data = self._bytes.get(f"{digest}:{encoding}")
+            if data is None:
+                data = await sync_to_async(self.read, thread_sensitive=False)(digest, encoding)
+                if data is None:
+                    return None
+            response = HttpResponse(data, content_type="text/plain; charset=utf-8")
+            if encoding:
+                response["Content-Encoding"] = encoding
+        response["ETag"] = etag
+        response["Cache-Control"] = "private, no-cache"
+        patch_vary_headers(response, ("Accept-Encoding",))
+        return response
+
+
+config_store = ConfigArtifactStore.from_settings()
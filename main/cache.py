@@ -0,0 +1,128 @@
+"""Read-through cache of subscription snapshots keyed by ``vpn_username``.
+
+Lookups go to a small in-process LRU first, then to an optional shared
+Django cache backend (``SUBSCRIPTION_CACHE["SHARED_BACKEND"]``) and only
+then to the database.  Entries are dropped by the signal handlers in
+``main.signals`` whenever a subscription, its user or its payments change;
+that clears the shared backend but only this process's LRU, so the local
+TTL bounds how stale other processes can be.
+"""
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .lru import LRUCache
+from .metrics import REGISTRY
+from .models import Subscription
+
+_MISSING = object()
+
+SNAPSHOT_FIELDS = (
+    "vpn_username",
+    "user__user_id",
+    "status",
+    "expires_at",
+    "traffic_used",
+    "traffic_limit",
+    "config_digest",
+)
+
+
+class SubscriptionCache:
+    """Two-level read-through cache of subscription snapshots."""
+
+    key_prefix = "subscription:"
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 30.0,
+                 shared_backend: Optional[str] = None, shared_ttl: float = 300.0):
+        self.local = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.shared_backend = shared_backend
+        self.shared_ttl = shared_ttl
+        self.shared_hits = 0
+        self.loads = 0
+
+    @classmethod
+    def from_settings(cls) -> "SubscriptionCache":
+        config = getattr(settings, "SUBSCRIPTION_CACHE", {})
+        return cls(
+            maxsize=config.get("MAXSIZE", 10000),
+            ttl=config.get("TTL", 30.0),
+            shared_backend=config.get("SHARED_BACKEND"),
+            shared_ttl=config.get("SHARED_TTL", 300.0),
+        )
+
+    @property
+    def shared(self):
+        return caches[self.shared_backend] if self.shared_backend else None
+
+    async def aget_or_load(self, vpn_username: str,
+                           loader: Callable[[str], Awaitable[Optional[Dict[str, Any]]]]) -> Optional[Dict[str, Any]]:
+        """Return the cached snapshot, awaiting ``loader`` on a miss.
+
+        ``None`` results are not cached, so a subscription created in
+        another process becomes visible on the next lookup.
+        """
+        snapshot = self.local.get(vpn_username, _MISSING)
+        if snapshot is not _MISSING:
+            return snapshot
+
+        shared = self.shared
+        if shared is not None:
+            snapshot = await shared.aget(self.key_prefix + vpn_username, _MISSING)
+            if snapshot is not _MISSING:
+                self.shared_hits += 1
+                self.local.set(vpn_username, snapshot)
+                return snapshot
+
+        self.loads += 1
+        snapshot = await loader(vpn_username)
+        if snapshot is not None:
+            self.local.set(vpn_username, snapshot)
+            if shared is not None:
+                await shared.aset(self.key_prefix + vpn_username, snapshot, self.shared_ttl)
+        return snapshot
+
+    def invalidate(self, *vpn_usernames: str) -> None:
+        for vpn_username in vpn_usernames:
+            self.local.delete(vpn_username)
+        shared = self.shared
+        if shared is not None and vpn_usernames:
+            shared.delete_many([self.key_prefix + name for name in vpn_usernames])
+
+    async def ainvalidate(self, *vpn_usernames: str) -> None:
+        """Async variant of :meth:`invalidate` for async views."""
+        for vpn_username in vpn_usernames:
+            self.local.delete(vpn_username)
+        shared = self.shared
+        if shared is not None and vpn_usernames:
+            await shared.adelete_many([self.key_prefix + name for name in vpn_usernames])
+
+    def clear(self) -> None:
+        self.local.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.local.hits + self.local.misses
+        return {
+            "size": len(self.local),
+            "maxsize": self.local.maxsize,
+            "hits": self.local.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.loads,
+            "evictions": self.local.evictions,
+            "hit_rate": round((lookups - self.loads) / lookups, 4) if lookups else 0.0,
+        }
+
+
+async def aload_subscription_snapshot(vpn_username: str) -> Optional[Dict[str, Any]]:
+    """Fetch the fields the status API needs in a single joined query."""
+    try:
+        row = await Subscription.objects.values(*SNAPSHOT_FIELDS).aget(vpn_username=vpn_username)
+    except Subscription.DoesNotExist:
+        return None
+    row["user_id"] = row.pop("user__user_id")
+    return row
+
+
+subscription_cache = SubscriptionCache.from_settings()
+REGISTRY.stats("vpnshop_subscription_cache", "Subscription snapshot cache", subscription_cache.stats)
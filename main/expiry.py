@@ -0,0 +1,67 @@
+"""Move subscriptions past ``expires_at`` from ``active`` to ``expired``."""
+import logging
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import subscription_cache
+from .models import Subscription
+from .scheduler import PeriodicJob
+
+logger = logging.getLogger("main")
+
+
+class ExpiryResult(NamedTuple):
+    expired: int
+    batches: int
+
+
+def expire_due_subscriptions(now: Optional[datetime] = None,
+                             batch_size: int = 1000) -> ExpiryResult:
+    """Expire due subscriptions in batches of ``batch_size`` rows.
+
+    Each batch is picked by a range scan on the (status, expires_at) index
+    and flipped with a single ``UPDATE ... WHERE id IN (...)``, so a run with
+    nothing to do is one indexed probe.  ``update()`` skips signals, so the
+    touched snapshots are dropped from the cache here.
+    """
+    now = now or timezone.now()
+    expired = batches = 0
+    while True:
+        batch = list(
+            Subscription.objects.filter(
+                status=Subscription.STATUS_ACTIVE, expires_at__lte=now
+            )
+            .order_by("expires_at")
+            .values_list("pk", "vpn_username")[:batch_size]
+        )
+        if not batch:
+            break
+
+        with transaction.atomic():
+            expired += Subscription.objects.filter(
+                pk__in=[pk for pk, _ in batch], status=Subscription.STATUS_ACTIVE
+            ).update(status=Subscription.STATUS_EXPIRED, updated_at=now)
+        subscription_cache.invalidate(*{name for _, name in batch})
+        batches += 1
+        if len(batch) < batch_size:
+            break
+
+    if expired:
+        logger.info("Expired %s subscriptions in %s batches", expired, batches)
+    return ExpiryResult(expired, batches)
+
+
+def expiry_job() -> Optional[PeriodicJob]:
+    """Sweeper thread for ``SUBSCRIPTION_EXPIRY_INTERVAL``, or None when it is 0.
+
+    Only the ASGI lifespan (``myproject/asgi.py``) starts it, so ``migrate``,
+    ``shell`` and the bot, which load the same app, never sweep.
+    """
+    interval = getattr(settings, "SUBSCRIPTION_EXPIRY_INTERVAL", 0)
+    if not interval:
+        return None
+    return PeriodicJob("expire-subscriptions", interval, expire_due_subscriptions)
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from main.expiry import expire_due_subscriptions
+
+
+class Command(BaseCommand):
+    help = "Mark active subscriptions past their expiration date as expired."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=1000,
+            help="Rows updated per UPDATE statement (default: 1000).",
+        )
+        parser.add_argument(
+            "--every", type=float, default=0,
+            help="Keep running and sweep every N seconds instead of once.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            result = expire_due_subscriptions(batch_size=options["batch_size"])
+            self.stdout.write(
+                f"Expired {result.expired} subscriptions in {result.batches} batches "
+                f"({time.perf_counter() - started:.3f}s)"
+            )
+            if not options["every"]:
+                break
+            time.sleep(options["every"])
@@ -0,0 +1,52 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main.traffic import TrafficAggregator, TrafficFormatError, iter_binary, iter_json_lines
+
+
+class Command(BaseCommand):
+    help = (
+        "Read streamed per-user traffic deltas (JSON lines or binary records) "
+        "from a file or stdin and apply them in batched updates."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "source", nargs="?", default="-",
+            help="File to read, or '-' for stdin (default).",
+        )
+        parser.add_argument(
+            "--format", choices=("jsonl", "binary"), default="jsonl",
+        )
+        parser.add_argument(
+            "--flush-interval", type=float, default=None,
+            help="Seconds between flushes (default: TRAFFIC_INGEST['FLUSH_INTERVAL']).",
+        )
+
+    def handle(self, *args, **options):
+        aggregator = TrafficAggregator.from_settings()
+        interval = options["flush_interval"] or aggregator.flush_interval
+        parse = iter_binary if options["format"] == "binary" else iter_json_lines
+
+        stream = sys.stdin.buffer if options["source"] == "-" else open(options["source"], "rb")
+        updated = 0
+        next_flush = time.monotonic() + interval
+        try:
+            for record in parse(stream):
+                aggregator.add_many((record,))
+                if time.monotonic() >= next_flush:
+                    updated += aggregator.flush()
+                    next_flush = time.monotonic() + interval
+        except TrafficFormatError as e:
+            raise CommandError(f"Malformed traffic report: {e}")
+        finally:
+            updated += aggregator.flush()
+            if stream is not sys.stdin.buffer:
+                stream.close()
+
+        self.stdout.write(
+            f"Applied {aggregator.records} reports to {updated} subscriptions "
+            f"in {aggregator.flushes} flushes"
+        )
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from main.usage import prune_usage, rollup_usage
+
+
+class Command(BaseCommand):
+    help = "Fold new usage samples into hourly/daily rollups and prune old history."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=10000,
+            help="Samples rolled up per transaction (default: 10000).",
+        )
+        parser.add_argument(
+            "--no-prune", action="store_true",
+            help="Skip deleting samples and rollups past USAGE_RETENTION.",
+        )
+        parser.add_argument(
+            "--every", type=float, default=0,
+            help="Keep running and roll up every N seconds instead of once.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            result = rollup_usage(batch_size=options["batch_size"])
+            self.stdout.write(
+                f"Rolled up {result.samples} samples into {result.buckets} buckets in "
+                f"{result.batches} batches ({time.perf_counter() - started:.3f}s)"
+            )
+            if not options["no_prune"]:
+                deleted = prune_usage()
+                self.stdout.write(
+                    "Pruned " + ", ".join(f"{count} {kind}" for kind, count in deleted.items())
+                )
+            if not options["every"]:
+                break
+            time.sleep(options["every"])
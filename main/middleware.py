@@ -1,10 +1,187 @@
+import re
+from contextvars import ContextVar
+from functools import lru_cache
+from time import perf_counter
+from typing import Optional
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .metrics import COUNT_BUCKETS, REGISTRY
+
+DEFAULT_CLIENT_DETECTION = {
+    # Regex fragments matched case-insensitively anywhere in User-Agent.
+    "USER_AGENTS": [
+        r"wireguard", r"openvpn", r"v2ray(?:ng|n)?", r"xray", r"clash",
+        r"shadowrocket", r"sing-box", r"hiddify", r"streisand", r"foxray",
+        r"nekobox", r"v2box", r"happ/",
+    ],
+    # Substrings of the Accept header that only VPN clients send.
+    "ACCEPT": [
+        "application/x-wireguard-profile",
+        "application/x-openvpn-profile",
+    ],
+    # Query parameters forcing the config response, e.g. ?config or ?vpn=1;
+    # ?vpn=0 (or false/no/off) does not.
+    "QUERY_FLAGS": ["config", "vpn"],
+    "CACHE_SIZE": 4096,
+}
+
+FALSE_FLAG_VALUES = frozenset(("0", "false", "no", "off"))
+
+
+class ClientMatcher:
+    """Classify requests as "vpn" or "web" from precompiled rules."""
+
+    def __init__(self, rules=None):
+        rules = {**DEFAULT_CLIENT_DETECTION, **(rules or {})}
+        user_agents = "|".join(f"(?:{pattern})" for pattern in rules["USER_AGENTS"])
+        accept = "|".join(re.escape(value) for value in rules["ACCEPT"])
+        # One alternation each, so a request costs at most one regex search
+        # per header regardless of how many rules are configured.
+        self._user_agent_re = re.compile(user_agents, re.IGNORECASE) if user_agents else None
+        self._accept_re = re.compile(accept, re.IGNORECASE) if accept else None
+        self.query_flags = tuple(rules["QUERY_FLAGS"])
+        self.is_vpn_user_agent = lru_cache(maxsize=rules["CACHE_SIZE"])(self._match_user_agent)
+
+    def _match_user_agent(self, user_agent: str) -> bool:
+        return bool(self._user_agent_re and self._user_agent_re.search(user_agent))
+
+    def classify(self, request) -> str:
+        meta = request.META
+        if self.is_vpn_user_agent(meta.get("HTTP_USER_AGENT", "")):
+            return "vpn"
+        if self._accept_re and self._accept_re.search(meta.get("HTTP_ACCEPT", "")):
+            return "vpn"
+        if meta.get("QUERY_STRING"):
+            query = request.GET
+            if any(
+                query[flag].lower() not in FALSE_FLAG_VALUES
+                for flag in self.query_flags if flag in query
+            ):
+                return "vpn"
+        return "web"
+
+
 class ClientTypeMiddleware:
+    # Sync and async capable, so the async views are reached under ASGI
+    # without a sync_to_async hop through this middleware.
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        self.matcher = ClientMatcher(getattr(settings, "CLIENT_DETECTION", None))
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
 
     def __call__(self, request):
-        # Detect VPN clients
-        # TO DO: Detect VPN clients
-
-        request.client_type = "vpn" if False else "web"
+        if self.async_mode:
+            return self.__acall__(request)
+        self.process_request(request)
         return self.get_response(request)
+
+    async def __acall__(self, request):
+        self.process_request(request)
+        return await self.get_response(request)
+
+    def process_request(self, request):
+        request.client_type = self.matcher.classify(request)
+
+
+# Per-request database totals, shared with the sync_to_async threads the
+# ORM runs in (they inherit the request's context).
+_query_totals: ContextVar[Optional[list]] = ContextVar("query_totals", default=None)
+
+REQUEST_LATENCY = REGISTRY.histogram(
+    "vpnshop_http_request_duration_seconds", "Time to produce a response", ("view", "method", "status")
+)
+REQUEST_QUERIES = REGISTRY.histogram(
+    "vpnshop_http_request_db_queries", "Database queries per request", ("view",), COUNT_BUCKETS
+)
+REQUEST_DB_TIME = REGISTRY.histogram(
+    "vpnshop_http_request_db_duration_seconds", "Database time per request", ("view",)
+)
+# Methods kept as label values; any other token a client sends is "other".
+HTTP_METHODS = frozenset(("GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"))
+DB_QUERIES = REGISTRY.counter("vpnshop_db_queries_total", "Database queries executed", ("alias",))
+DB_TIME = REGISTRY.counter("vpnshop_db_query_seconds_total", "Time spent executing queries", ("alias",))
+
+
+class QueryTimer:
+    """``execute_wrapper`` installed on every connection (see ``MainConfig.ready``)."""
+
+    def __init__(self, alias: str):
+        self.queries = DB_QUERIES.labels(alias)
+        self.time = DB_TIME.labels(alias)
+
+    def __call__(self, execute, sql, params, many, context):
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = perf_counter() - started
+            self.queries.inc()
+            self.time.inc(elapsed)
+            totals = _query_totals.get()
+            if totals is not None:
+                totals[0] += 1
+                totals[1] += elapsed
+
+
+def install_query_timer(sender, connection, **kwargs):
+    """``connection_created`` receiver; wraps each new connection once."""
+    if not any(isinstance(wrapper, QueryTimer) for wrapper in connection.execute_wrappers):
+        connection.execute_wrappers.append(QueryTimer(connection.alias))
+
+
+class MetricsMiddleware:
+    """Latency and query totals per view, exported on ``/metrics``.
+
+    Placed first in ``MIDDLEWARE`` so the timing covers the whole stack.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        totals = [0, 0.0]
+        token = _query_totals.set(totals)
+        started = perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _query_totals.reset(token)
+        self.record(request, response, perf_counter() - started, totals)
+        return response
+
+    async def __acall__(self, request):
+        totals = [0, 0.0]
+        token = _query_totals.set(totals)
+        started = perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _query_totals.reset(token)
+        self.record(request, response, perf_counter() - started, totals)
+        return response
+
+    @staticmethod
+    def record(request, response, elapsed, totals):
+        match = request.resolver_match
+        # The route name, never the raw path: usernames would make the label
+        # set unbounded.
+        view = (match.url_name or match.view_name) if match else "unmatched"
+        method = request.method if request.method in HTTP_METHODS else "other"
+        REQUEST_LATENCY.labels(view, method, response.status_code).observe(elapsed)
+        REQUEST_QUERIES.labels(view).observe(totals[0])
+        REQUEST_DB_TIME.labels(view).observe(totals[1])
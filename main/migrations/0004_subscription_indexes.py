@@ -0,0 +1,25 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("main", "0003_alter_vpnuser_options_remove_vpnuser_expires_at_and_more"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="subscription",
+            name="vpn_username",
+            field=models.CharField(
+                db_index=True, max_length=100, verbose_name="VPN Username"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="subscription",
+            index=models.Index(
+                fields=["user", "status", "-expires_at"],
+                name="subscription_user_status_exp",
+            ),
+        ),
+    ]
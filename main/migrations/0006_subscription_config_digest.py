@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("main", "0005_subscription_status_exp"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="subscription",
+            name="config_digest",
+            field=models.CharField(
+                blank=True,
+                default="",
+                max_length=64,
+                verbose_name="Config artifact digest",
+            ),
+        ),
+    ]
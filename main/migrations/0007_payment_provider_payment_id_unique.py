@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("main", "0006_subscription_config_digest"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="payment",
+            name="provider_payment_id",
+            field=models.CharField(blank=True, max_length=100, null=True, unique=True),
+        ),
+    ]
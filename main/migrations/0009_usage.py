@@ -0,0 +1,107 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("main", "0008_broadcast"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UsageSample",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("recorded_at", models.DateTimeField()),
+                ("bytes", models.BigIntegerField()),
+                (
+                    "subscription",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="main.subscription",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Usage Sample",
+                "verbose_name_plural": "Usage Samples",
+                "indexes": [
+                    models.Index(fields=["recorded_at"], name="usage_sample_recorded_at"),
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="UsageRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "resolution",
+                    models.CharField(
+                        choices=[("hour", "Hourly"), ("day", "Daily")], max_length=4
+                    ),
+                ),
+                ("bucket_start", models.DateTimeField()),
+                ("bytes", models.BigIntegerField(default=0)),
+                (
+                    "subscription",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="usage",
+                        to="main.subscription",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Usage Rollup",
+                "verbose_name_plural": "Usage Rollups",
+                "indexes": [
+                    models.Index(
+                        fields=["resolution", "bucket_start"], name="usage_rollup_res_bucket"
+                    ),
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("subscription", "resolution", "bucket_start"),
+                        name="usage_rollup_bucket",
+                    ),
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="UsageRollupState",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=50, unique=True)),
+                ("last_sample_pk", models.BigIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
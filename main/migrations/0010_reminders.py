@@ -0,0 +1,77 @@
+import django.db.models.deletion
+import django.db.models.expressions
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("main", "0009_usage"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="subscription",
+            index=models.Index(
+                django.db.models.expressions.CombinedExpression(
+                    models.F("traffic_used"),
+                    "/",
+                    django.db.models.functions.comparison.NullIf(
+                        models.F("traffic_limit"),
+                        django.db.models.expressions.RawSQL(
+                            "0.0", (), output_field=models.FloatField()
+                        ),
+                    ),
+                ),
+                condition=models.Q(("status", "active")),
+                name="subscription_traffic_ratio",
+            ),
+        ),
+        migrations.CreateModel(
+            name="NotificationLedger",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("expires_3d", "Expires in 3 days"),
+                            ("expires_1d", "Expires in 1 day"),
+                            ("traffic_80", "80% of traffic used"),
+                            ("traffic_100", "Traffic limit reached"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("sent_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "subscription",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="notifications",
+                        to="main.subscription",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Notification",
+                "verbose_name_plural": "Notifications",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("subscription", "kind"),
+                        name="notification_ledger_unique",
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def rename_duplicates(apps, schema_editor):
+    # Two purchases on the same day used to get the same name; the oldest
+    # subscription keeps it and the others get their id appended.
+    Subscription = apps.get_model("main", "Subscription")
+    duplicated = (
+        Subscription.objects.values("vpn_username")
+        .annotate(n=Count("pk"))
+        .filter(n__gt=1)
+        .values_list("vpn_username", flat=True)
+    )
+    for name in list(duplicated):
+        for subscription in Subscription.objects.filter(vpn_username=name).order_by("pk")[1:]:
+            subscription.vpn_username = f"{name}_{subscription.pk}"
+            subscription.save(update_fields=["vpn_username"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("main", "0011_provisioningjob"),
+    ]
+
+    operations = [
+        migrations.RunPython(rename_duplicates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="subscription",
+            name="vpn_username",
+            field=models.CharField(max_length=100, unique=True, verbose_name="VPN Username"),
+        ),
+    ]
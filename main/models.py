@@ -1,8 +1,20 @@
 # models.py
-from django.contrib import admin
 from django.db import models
+from django.db.models import F, FloatField, Q
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import NullIf
 from django.utils import timezone
-from django.utils.html import format_html
+
+from .tariffs import DEFAULT_TARIFFS
+
+# Share of the traffic limit used; NULL for unlimited (0) subscriptions.
+# Queries must use this exact expression to hit subscription_traffic_ratio.
+# The zero is a float SQL literal: a FloatField operand avoids Django's
+# mixed-types error, and unlike Value(0.0) it is not sent as a bound
+# parameter, which would keep SQLite from matching the index expression.
+TRAFFIC_RATIO = F("traffic_used") / NullIf(
+    F("traffic_limit"), RawSQL("0.0", (), output_field=FloatField())
+)
 
 
 class VPNUser(models.Model):
@@ -44,18 +56,18 @@ class Subscription(models.Model):
     TARIFF_3MONTHS = "3months"
     TARIFF_6MONTHS = "6months"
     TARIFF_12MONTHS = "12months"
-    TARIFF_CHOICES = [
-        (TARIFF_1MONTH, "1 Month - 178 RUB"),
-        (TARIFF_3MONTHS, "3 Months - 450 RUB"),
-        (TARIFF_6MONTHS, "6 Months - 690 RUB"),
-        (TARIFF_12MONTHS, "12 Months - 840 RUB"),
-    ]
+    TARIFF_CHOICES = [(tariff.id, tariff.label) for tariff in DEFAULT_TARIFFS]
 
     user = models.ForeignKey(
         VPNUser, on_delete=models.CASCADE, related_name="subscriptions"
     )
-    vpn_username = models.CharField(max_length=100, verbose_name="VPN Username")
+    vpn_username = models.CharField(
+        max_length=100, verbose_name="VPN Username", unique=True
+    )
     vpn_config = models.TextField(verbose_name="VPN Configuration")
+    config_digest = models.CharField(
+        max_length=64, blank=True, default="", verbose_name="Config artifact digest"
+    )
     status = models.CharField(
         max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING
     )
@@ -74,6 +86,25 @@ class Subscription(models.Model):
         verbose_name = "Subscription"
         verbose_name_plural = "Subscriptions"
         ordering = ["-expires_at"]
+        indexes = [
+            # check_subscription_status: filter (user, status, expires_at > now)
+            # ordered by -expires_at, answered straight from the index.
+            models.Index(
+                fields=["user", "status", "-expires_at"],
+                name="subscription_user_status_exp",
+            ),
+            # expire_subscriptions: range scan of active rows by expires_at.
+            models.Index(
+                fields=["status", "expires_at"],
+                name="subscription_status_exp",
+            ),
+            # Traffic reminders: range scan of active rows by usage ratio.
+            models.Index(
+                TRAFFIC_RATIO,
+                name="subscription_traffic_ratio",
+                condition=Q(status="active"),
+            ),
+        ]
 
     @property
     def days_left(self):
@@ -98,113 +129,188 @@ class Payment(models.Model):
     )
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     currency = models.CharField(max_length=3, default="RUB")
-    provider_payment_id = models.CharField(max_length=100, blank=True, null=True)
+    provider_payment_id = models.CharField(
+        max_length=100, blank=True, null=True, unique=True
+    )
     payload = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         verbose_name = "Payment"
         verbose_name_plural = "Payments"
+        indexes = [
+            # StatsSnapshot: revenue folded by created_at ranges.
+            models.Index(fields=["created_at"], name="payment_created_at"),
+        ]
 
     def __str__(self):
         return f"Payment #{self.id} for {self.subscription}"
 
 
-@admin.register(VPNUser)
-class VPNUserAdmin(admin.ModelAdmin):
-    list_display = ("user_id", "username", "first_name", "subscriptions_count")
-    search_fields = ("user_id", "username", "first_name", "last_name")
-    readonly_fields = ("created_at", "updated_at")
-
-    def subscriptions_count(self, obj):
-        return obj.subscriptions.count()
-    subscriptions_count.short_description = "Subscriptions"
-
-
-@admin.register(Subscription)
-class SubscriptionAdmin(admin.ModelAdmin):
-    list_display = (
-        "vpn_username",
-        "user_info",
-        "status_colored",
-        "tariff",
-        "expires_at",
-        "days_left_display",
-        "traffic_usage",
-        "created_at",
-    )
-    list_filter = ("status", "tariff", "created_at")
-    search_fields = ("vpn_username", "user__user_id", "user__username")
-    readonly_fields = (
-        "days_left",
-        "traffic_percentage",
-        "created_at",
-        "updated_at",
-    )
-    date_hierarchy = "expires_at"
-
-    fieldsets = (
-        (None, {"fields": ("user", "vpn_username", "vpn_config", "status", "tariff")}),
-        (
-            "Traffic",
-            {"fields": ("traffic_used", "traffic_limit", "traffic_percentage")},
-        ),
-        ("Dates", {"fields": ("expires_at", "created_at", "updated_at")}),
-    )
-
-    @admin.display(description="User")
-    def user_info(self, obj):
-        return f"{obj.user.user_id} ({obj.user.username or obj.user.first_name})"
-
-    @admin.display(description="Status")
-    def status_colored(self, obj):
-        colors = {
-            Subscription.STATUS_ACTIVE: "green",
-            Subscription.STATUS_EXPIRED: "red",
-            Subscription.STATUS_PENDING: "orange",
-        }
-        return format_html(
-            '<span style="color: {};">{}</span>',
-            colors.get(obj.status, "black"),
-            obj.get_status_display(),
-        )
-
-    @admin.display(description="Days Left")
-    def days_left_display(self, obj):
-        days = obj.days_left
-        if days <= 3:
-            color = "red"
-        elif days <= 7:
-            color = "orange"
-        else:
-            color = "green"
-        return format_html('<span style="color: {};">{}</span>', color, days)
-
-    @admin.display(description="Traffic Usage")
-    def traffic_usage(self, obj):
-        percentage = obj.traffic_percentage
-        if percentage > 90:
-            color = "red"
-        elif percentage > 70:
-            color = "orange"
-        else:
-            color = "green"
-        return format_html(
-            '{} GB / {} GB (<span style="color: {};">{}%</span>)',
-            obj.traffic_used,
-            obj.traffic_limit,
-            color,
-            percentage,
-        )
-
-
-@admin.register(Payment)
-class PaymentAdmin(admin.ModelAdmin):
-    list_display = ("id", "subscription", "amount", "currency", "created_at")
-    list_filter = ("currency", "created_at")
-    search_fields = (
-        "subscription__vpn_username",
-        "subscription__user__user_id",
-        "provider_payment_id",
-    )
-    readonly_fields = ("created_at",)
+class Broadcast(models.Model):
+    """Announcement sent to every VPNUser, with a resumable checkpoint"""
+    STATUS_PENDING = "pending"
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "Pending"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_DONE, "Done"),
+    ]
+
+    text = models.TextField()
+    status = models.CharField(
+        max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING
+    )
+    last_user_pk = models.BigIntegerField(
+        default=0, verbose_name="Last processed VPNUser id"
+    )
+    sent = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Broadcast"
+        verbose_name_plural = "Broadcasts"
+
+    def __str__(self):
+        return f"Broadcast #{self.id} ({self.status})"
+
+
+class UsageSample(models.Model):
+    """Raw traffic delta of one subscription, appended on every traffic flush"""
+    # No index on the FK: rows are only read in id order by rollup_usage and
+    # deleted by age, and appends stay cheap.
+    subscription = models.ForeignKey(
+        Subscription, on_delete=models.CASCADE, related_name="+", db_index=False
+    )
+    recorded_at = models.DateTimeField()
+    bytes = models.BigIntegerField()
+
+    class Meta:
+        verbose_name = "Usage Sample"
+        verbose_name_plural = "Usage Samples"
+        indexes = [
+            # Retention pruning.
+            models.Index(fields=["recorded_at"], name="usage_sample_recorded_at"),
+        ]
+
+
+class UsageRollup(models.Model):
+    """Traffic of one subscription summed per hour or per day"""
+    RESOLUTION_HOUR = "hour"
+    RESOLUTION_DAY = "day"
+    RESOLUTION_CHOICES = [
+        (RESOLUTION_HOUR, "Hourly"),
+        (RESOLUTION_DAY, "Daily"),
+    ]
+
+    subscription = models.ForeignKey(
+        Subscription, on_delete=models.CASCADE, related_name="usage", db_index=False
+    )
+    resolution = models.CharField(max_length=4, choices=RESOLUTION_CHOICES)
+    bucket_start = models.DateTimeField()
+    bytes = models.BigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Usage Rollup"
+        verbose_name_plural = "Usage Rollups"
+        constraints = [
+            # Also the index serving /api/usage range reads: (subscription,
+            # resolution) equality plus a bucket_start range.
+            models.UniqueConstraint(
+                fields=["subscription", "resolution", "bucket_start"],
+                name="usage_rollup_bucket",
+            ),
+        ]
+        indexes = [
+            # Retention pruning per resolution.
+            models.Index(fields=["resolution", "bucket_start"], name="usage_rollup_res_bucket"),
+        ]
+
+
+class UsageRollupState(models.Model):
+    """Cursor of the incremental rollup: samples up to this id are rolled up"""
+    name = models.CharField(max_length=50, unique=True)
+    last_sample_pk = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.last_sample_pk}"
+
+
+class NotificationLedger(models.Model):
+    """Reminders already sent, at most one per subscription and kind"""
+    KIND_EXPIRES_3D = "expires_3d"
+    KIND_EXPIRES_1D = "expires_1d"
+    KIND_TRAFFIC_80 = "traffic_80"
+    KIND_TRAFFIC_100 = "traffic_100"
+    KIND_CHOICES = [
+        (KIND_EXPIRES_3D, "Expires in 3 days"),
+        (KIND_EXPIRES_1D, "Expires in 1 day"),
+        (KIND_TRAFFIC_80, "80% of traffic used"),
+        (KIND_TRAFFIC_100, "Traffic limit reached"),
+    ]
+
+    subscription = models.ForeignKey(
+        Subscription, on_delete=models.CASCADE, related_name="notifications", db_index=False
+    )
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    sent_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Notification"
+        verbose_name_plural = "Notifications"
+        constraints = [
+            # Deduplication, and the index behind the scheduler's NOT EXISTS.
+            models.UniqueConstraint(
+                fields=["subscription", "kind"], name="notification_ledger_unique"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} for {self.subscription_id}"
+
+
+class ProvisioningJob(models.Model):
+    """Pending VPN config for a subscription, provisioned by the bot's worker"""
+    STATUS_PENDING = "pending"
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "Pending"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_DONE, "Done"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    subscription = models.ForeignKey(
+        Subscription, on_delete=models.CASCADE, related_name="provisioning_jobs"
+    )
+    status = models.CharField(
+        max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    # Set while running; a worker that died mid-batch leaves it to expire
+    # and the job is claimed again.
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Provisioning job"
+        verbose_name_plural = "Provisioning jobs"
+        indexes = [
+            # claim_jobs: due pending jobs, oldest first.
+            models.Index(
+                fields=["status", "available_at"],
+                name="provisioning_job_due",
+            ),
+        ]
+
+    def __str__(self):
+        return f"Provisioning #{self.id} for {self.subscription_id} ({self.status})"
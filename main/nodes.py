@@ -0,0 +1,107 @@
+"""VPN node backends used by the provisioning worker.
+
+A backend registers a batch of peers on a node in one call and returns the
+client config of each; ``settings.PROVISIONING["BACKEND"]`` names the class
+(see ``main.provisioning.get_backend``).  Registration must be idempotent
+per subscription: a job whose worker died mid-batch is registered again.
+
+``FakeNodeBackend`` keeps its peers in memory and draws a new server key
+per process, so its configs connect nowhere; it is the default with
+``DEBUG`` only, and ``get_backend`` refuses it otherwise.
+"""
+import asyncio
+import base64
+import ipaddress
+import os
+from datetime import datetime
+from typing import Dict, NamedTuple, Sequence
+
+
+class Peer(NamedTuple):
+    subscription_id: int
+    vpn_username: str
+    expires_at: datetime
+    traffic_limit: float
+
+
+class NodeError(Exception):
+    """The node rejected or could not process a registration batch."""
+
+
+class NodeBackend:
+    # Largest batch the node accepts in one registration call.
+    max_batch = 100
+    # Set by backends whose configs do not work on a real node.
+    development_only = False
+
+    async def register(self, peers: Sequence[Peer]) -> Dict[int, str]:
+        """Register ``peers``; returns the config per subscription id.
+
+        Peers missing from the result are retried later; raise ``NodeError``
+        to fail (and retry) the whole batch.
+        """
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+def _key() -> str:
+    return base64.b64encode(os.urandom(32)).decode()
+
+
+class FakeNodeBackend(NodeBackend):
+    """In-memory node that issues WireGuard-style configs.
+
+    ``delay`` is added to every call, to stand in for a real node's latency.
+    """
+
+    development_only = True
+
+    def __init__(self, endpoint: str = "fake-node.local:51820", network: str = "10.8.0.0/16",
+                 delay: float = 0.0, max_batch: int = 100):
+        self.endpoint = endpoint
+        self.network = ipaddress.ip_network(network)
+        self.delay = delay
+        self.max_batch = max_batch
+        self.public_key = _key()
+        self.calls = 0
+        self._peers: Dict[int, tuple] = {}  # subscription id: (address, private key)
+
+    def _allocate(self, subscription_id: int) -> tuple:
+        peer = self._peers.get(subscription_id)
+        if peer is None:
+            address = self.network.network_address + len(self._peers) + 2  # .1 is the node
+            if address not in self.network:
+                raise NodeError(f"address pool {self.network} exhausted")
+            peer = self._peers[subscription_id] = (address, _key())
+        return peer
+
+    def render(self, peer: Peer, address, private_key: str) -> str:
+        return (
+            f"[Interface]\n"
+            f"# {peer.vpn_username}, expires {peer.expires_at.date()}, "
+            f"traffic limit {peer.traffic_limit:g} GB\n"
+            f"PrivateKey = {private_key}\n"
+            f"Address = {address}/32\n"
+            f"DNS = 1.1.1.1\n"
+            f"\n"
+            f"[Peer]\n"
+            f"PublicKey = {self.public_key}\n"
+            f"Endpoint = {self.endpoint}\n"
+            f"AllowedIPs = 0.0.0.0/0, ::/0\n"
+        )
+
+    async def register(self, peers: Sequence[Peer]) -> Dict[int, str]:
+        if len(peers) > self.max_batch:
+            raise NodeError(f"batch of {len(peers)} exceeds {self.max_batch}")
+        self.calls += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return {
+            peer.subscription_id: self.render(peer, *self._allocate(peer.subscription_id))
+            for peer in peers
+        }
+
+    def stats(self) -> Dict[str, int]:
+        return {"peers": len(self._peers), "calls": self.calls}
@@ -0,0 +1,32 @@
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that trusts the planner's row estimate for large tables.
+
+    An exact ``COUNT(*)`` over millions of rows dominates a changelist page
+    on PostgreSQL.  For unfiltered querysets the estimate from ``pg_class``
+    is used once it exceeds ``estimate_threshold``; filtered querysets,
+    small tables and other backends get the exact count.
+    """
+
+    estimate_threshold = 100_000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        query = getattr(queryset, "query", None)
+        if query is not None and not query.where:
+            connection = connections[queryset.db]
+            if connection.vendor == "postgresql":
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        "SELECT reltuples::bigint FROM pg_class WHERE relname = %s",
+                        [queryset.model._meta.db_table],
+                    )
+                    row = cursor.fetchone()
+                if row and row[0] > self.estimate_threshold:
+                    return row[0]
+        return super().count
@@ -0,0 +1,163 @@
+"""Durable queue of VPN config provisioning jobs.
+
+``process_payment`` only calls ``enqueue`` inside its transaction, so a paid
+subscription always has a job and the payment reply never waits on a node.
+The bot's ``ProvisioningWorker`` (``vpnbot.provisioning``) then loops over:
+
+* ``claim_jobs``: lease a batch of due jobs (running jobs whose lease ran
+  out are claimed again);
+* the node backend's ``register`` for the whole batch;
+* ``complete_jobs``: store the configs as artifacts, attach them to the
+  subscriptions and mark the jobs done, or ``fail_jobs`` to retry them with
+  backoff up to ``MAX_ATTEMPTS``.
+"""
+from datetime import datetime, timedelta
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .artifacts import config_store
+from .cache import subscription_cache
+from .models import ProvisioningJob, Subscription
+from .nodes import NodeBackend, Peer
+
+DEFAULT_PROVISIONING = {
+    "BACKEND": "main.nodes.FakeNodeBackend",
+    "OPTIONS": {},
+    "BATCH_SIZE": 100,
+    "MAX_ATTEMPTS": 8,
+    "LEASE": 300,  # seconds a claimed batch may take before it is retried
+    "RETRY_DELAY": 5,  # seconds, doubled per attempt
+}
+
+
+class ClaimedJob(NamedTuple):
+    job_id: int
+    attempts: int
+    chat_id: str
+    peer: Peer
+
+
+class Delivery(NamedTuple):
+    chat_id: str
+    vpn_username: str
+    config: str
+
+
+def provisioning_settings() -> dict:
+    return {**DEFAULT_PROVISIONING, **getattr(settings, "PROVISIONING", {})}
+
+
+def get_backend() -> NodeBackend:
+    options = provisioning_settings()
+    if not options["BACKEND"]:
+        raise ImproperlyConfigured("PROVISIONING_BACKEND must be set when DEBUG is off")
+    backend_class = import_string(options["BACKEND"])
+    if backend_class.development_only and not settings.DEBUG:
+        # Paying users would silently get configs that connect nowhere.
+        raise ImproperlyConfigured(
+            f"{options['BACKEND']} is for development only; set PROVISIONING_BACKEND "
+            f"to a real node backend or turn DEBUG on"
+        )
+    return backend_class(**options["OPTIONS"])
+
+
+def enqueue(subscription: Subscription) -> ProvisioningJob:
+    """Queue ``subscription`` unless it already has a job that has not failed.
+
+    ``process_payment`` queues the job and ``activate_subscription`` may run
+    for the same payment later; a second job would register the peer and
+    send the config again.
+    """
+    job = (
+        ProvisioningJob.objects.filter(subscription=subscription)
+        .exclude(status=ProvisioningJob.STATUS_FAILED)
+        .order_by("pk")
+        .first()
+    )
+    return job or ProvisioningJob.objects.create(subscription=subscription)
+
+
+def claim_jobs(limit: int, lease: float, now: Optional[datetime] = None) -> List[ClaimedJob]:
+    """Lease up to ``limit`` due jobs, oldest first."""
+    now = now or timezone.now()
+    with transaction.atomic():
+        rows = list(
+            ProvisioningJob.objects.filter(
+                Q(status=ProvisioningJob.STATUS_PENDING, available_at__lte=now)
+                | Q(status=ProvisioningJob.STATUS_RUNNING, lease_expires_at__lte=now)
+            )
+            .select_for_update(skip_locked=True, of=("self",))
+            .order_by("available_at", "pk")
+            .values_list(
+                "pk", "attempts", "subscription__user__user_id", "subscription_id",
+                "subscription__vpn_username", "subscription__expires_at",
+                "subscription__traffic_limit",
+            )[:limit]
+        )
+        if not rows:
+            return []
+        ProvisioningJob.objects.filter(pk__in=[row[0] for row in rows]).update(
+            status=ProvisioningJob.STATUS_RUNNING,
+            lease_expires_at=now + timedelta(seconds=lease),
+            attempts=F("attempts") + 1,
+        )
+    return [
+        ClaimedJob(job_id, attempts + 1, chat_id, Peer(*peer))
+        for job_id, attempts, chat_id, *peer in rows
+    ]
+
+
+def complete_jobs(jobs: Sequence[ClaimedJob], configs: Dict[int, str]) -> List[Delivery]:
+    """Attach the configs of ``jobs`` (keyed by subscription id) and finish them."""
+    now = timezone.now()
+    done = [job for job in jobs if job.peer.subscription_id in configs]
+    if not done:
+        return []
+    # Artifacts are content-addressed, so writing them before the
+    # transaction is safe even if it rolls back.
+    digests = {job.peer.subscription_id: config_store.put(configs[job.peer.subscription_id]) for job in done}
+    with transaction.atomic():
+        Subscription.objects.bulk_update(
+            [
+                Subscription(
+                    pk=subscription_id, vpn_config=configs[subscription_id],
+                    config_digest=digest, updated_at=now,
+                )
+                for subscription_id, digest in digests.items()
+            ],
+            ["vpn_config", "config_digest", "updated_at"],
+        )
+        ProvisioningJob.objects.filter(pk__in=[job.job_id for job in done]).update(
+            status=ProvisioningJob.STATUS_DONE, lease_expires_at=None, last_error="",
+        )
+        # bulk_update sends no post_save, so main.signals does not see it.
+        names = [job.peer.vpn_username for job in done]
+        transaction.on_commit(lambda: subscription_cache.invalidate(*names))
+    return [Delivery(job.chat_id, job.peer.vpn_username, configs[job.peer.subscription_id]) for job in done]
+
+
+def fail_jobs(jobs: Sequence[ClaimedJob], error: str) -> List[ClaimedJob]:
+    """Schedule a retry of ``jobs``; returns those that ran out of attempts."""
+    options = provisioning_settings()
+    now = timezone.now()
+    exhausted = []
+    for job in jobs:
+        if job.attempts >= options["MAX_ATTEMPTS"]:
+            exhausted.append(job)
+            changes = {"status": ProvisioningJob.STATUS_FAILED}
+        else:
+            delay = min(3600, options["RETRY_DELAY"] * 2 ** (job.attempts - 1))
+            changes = {
+                "status": ProvisioningJob.STATUS_PENDING,
+                "available_at": now + timedelta(seconds=delay),
+            }
+        ProvisioningJob.objects.filter(pk=job.job_id).update(
+            lease_expires_at=None, last_error=error[:1000], **changes
+        )
+    return exhausted
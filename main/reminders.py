@@ -0,0 +1,88 @@
+"""Find subscriptions due for an expiry or traffic reminder.
+
+Every reminder kind is a range over an index of active subscriptions:
+``expires_at`` on (status, expires_at) and the usage ratio on the partial
+``subscription_traffic_ratio`` expression index.  Rows already in the
+``NotificationLedger`` are skipped through its unique (subscription, kind)
+index, and candidates are read in keyset chunks ordered by (range key, id),
+so a run over hundreds of thousands of subscriptions holds one chunk in
+memory at a time.
+"""
+from datetime import datetime, timedelta
+from typing import Any, List, NamedTuple, Optional, Tuple
+
+from django.db.models import Exists, OuterRef, Q
+
+from .models import TRAFFIC_RATIO, NotificationLedger, Subscription
+
+# kind: (lower, upper) bounds of expires_at - now; (lower, upper] is due.
+EXPIRY_WINDOWS = {
+    NotificationLedger.KIND_EXPIRES_3D: (timedelta(days=1), timedelta(days=3)),
+    NotificationLedger.KIND_EXPIRES_1D: (timedelta(0), timedelta(days=1)),
+}
+# kind: [lower, upper) bounds of traffic_used / traffic_limit.
+TRAFFIC_WINDOWS = {
+    NotificationLedger.KIND_TRAFFIC_80: (0.8, 1.0),
+    NotificationLedger.KIND_TRAFFIC_100: (1.0, None),
+}
+KINDS = tuple(EXPIRY_WINDOWS) + tuple(TRAFFIC_WINDOWS)
+
+
+class Reminder(NamedTuple):
+    subscription_id: int
+    chat_id: str
+    vpn_username: str
+    expires_at: datetime
+    traffic_used: float
+    traffic_limit: float
+
+
+Cursor = Tuple[Any, int]
+
+
+def _candidates(kind: str, now: datetime):
+    """Active subscriptions in the window of ``kind`` and their range key."""
+    active = Subscription.objects.filter(status=Subscription.STATUS_ACTIVE)
+    if kind in EXPIRY_WINDOWS:
+        lower, upper = EXPIRY_WINDOWS[kind]
+        return active.filter(expires_at__gt=now + lower, expires_at__lte=now + upper), "expires_at"
+    lower, upper = TRAFFIC_WINDOWS[kind]
+    queryset = active.annotate(ratio=TRAFFIC_RATIO).filter(ratio__gte=lower)
+    if upper is not None:
+        queryset = queryset.filter(ratio__lt=upper)
+    return queryset, "ratio"
+
+
+def due_reminders(kind: str, now: datetime, after: Optional[Cursor] = None,
+                  limit: int = 500) -> Tuple[List[Reminder], Optional[Cursor]]:
+    """Next chunk of un-notified subscriptions for ``kind`` after ``after``.
+
+    Returns the reminders and the cursor to pass for the following chunk
+    (``None`` once the window is exhausted).
+    """
+    queryset, key = _candidates(kind, now)
+    if after is not None:
+        last_key, last_pk = after
+        queryset = queryset.filter(
+            Q(**{f"{key}__gt": last_key}) | Q(**{key: last_key, "pk__gt": last_pk})
+        )
+    notified = NotificationLedger.objects.filter(subscription=OuterRef("pk"), kind=kind)
+    rows = list(
+        queryset.filter(~Exists(notified))
+        .order_by(key, "pk")
+        .values_list(
+            key, "pk", "user__user_id", "vpn_username", "expires_at",
+            "traffic_used", "traffic_limit",
+        )[:limit]
+    )
+    reminders = [Reminder(*row[1:]) for row in rows]
+    cursor = (rows[-1][0], rows[-1][1]) if len(rows) == limit else None
+    return reminders, cursor
+
+
+def record_sent(kind: str, subscription_ids: List[int]) -> None:
+    """Add ledger rows; already recorded subscriptions are ignored."""
+    NotificationLedger.objects.bulk_create(
+        [NotificationLedger(subscription_id=pk, kind=kind) for pk in subscription_ids],
+        ignore_conflicts=True,
+    )
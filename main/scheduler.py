@@ -0,0 +1,30 @@
+"""Minimal in-process periodic jobs for maintenance tasks."""
+import logging
+import threading
+from typing import Callable
+
+from django.db import close_old_connections
+
+logger = logging.getLogger("main")
+
+
+class PeriodicJob(threading.Thread):
+    """Daemon thread that calls ``func`` every ``interval`` seconds."""
+
+    def __init__(self, name: str, interval: float, func: Callable[[], object]):
+        super().__init__(name=name, daemon=True)
+        self.interval = interval
+        self.func = func
+        self._stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            try:
+                self.func()
+            except Exception as e:
+                logger.error("Periodic job %s failed: %s", self.name, e, exc_info=True)
+            finally:
+                close_old_connections()
+
+    def stop(self) -> None:
+        self._stopped.set()
@@ -0,0 +1,37 @@
+"""Drop cached subscription snapshots when the underlying rows change."""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import subscription_cache
+from .models import Payment, Subscription, VPNUser
+
+
+def _invalidate_on_commit(vpn_usernames) -> None:
+    # Deferred until commit so a concurrent reader cannot re-cache the old row
+    # between our write and the end of the transaction.
+    vpn_usernames = [name for name in vpn_usernames if name]
+    if vpn_usernames:
+        transaction.on_commit(lambda: subscription_cache.invalidate(*vpn_usernames))
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def invalidate_subscription(sender, instance, **kwargs):
+    _invalidate_on_commit([instance.vpn_username])
+
+
+@receiver(post_save, sender=VPNUser)
+@receiver(post_delete, sender=VPNUser)
+def invalidate_user_subscriptions(sender, instance, **kwargs):
+    _invalidate_on_commit(
+        Subscription.objects.filter(user_id=instance.pk).values_list("vpn_username", flat=True)
+    )
+
+
+@receiver(post_save, sender=Payment)
+@receiver(post_delete, sender=Payment)
+def invalidate_payment_subscription(sender, instance, **kwargs):
+    _invalidate_on_commit(
+        Subscription.objects.filter(pk=instance.subscription_id).values_list("vpn_username", flat=True)
+    )
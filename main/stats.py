@@ -0,0 +1,102 @@
+"""Service statistics and exports for the admin commands."""
+import csv
+import io
+import threading
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Any, BinaryIO, Dict, Optional, Tuple
+
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from .models import Payment, Subscription, VPNUser
+
+
+class StatsSnapshot:
+    """In-memory snapshot of service statistics, refreshed incrementally.
+
+    Subscription counts and traffic totals come from one aggregate query per
+    refresh.  Revenue relies on payments being append-only: payments created
+    more than ``settle`` seconds ago are folded into running totals once,
+    keyed on ``created_at`` rather than pk because concurrent transactions
+    commit out of pk order; younger ones are summed again on every refresh,
+    so a payment is only missed if it commits ``settle`` seconds late.
+    """
+
+    def __init__(self, max_age: float = 60.0, settle: float = 300.0):
+        self.max_age = max_age
+        self.settle = settle
+        self.refreshed_at = 0.0
+        self._folded_until: Optional[datetime] = None
+        self._revenue: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._data: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def refresh(self) -> Dict[str, Any]:
+        with self._lock:
+            totals = Subscription.objects.aggregate(
+                active=Count("pk", filter=Q(status=Subscription.STATUS_ACTIVE)),
+                expired=Count("pk", filter=Q(status=Subscription.STATUS_EXPIRED)),
+                pending=Count("pk", filter=Q(status=Subscription.STATUS_PENDING)),
+                traffic_used=Sum("traffic_used"),
+                traffic_limit=Sum("traffic_limit"),
+            )
+            horizon = timezone.now() - timedelta(seconds=self.settle)
+            settled = Payment.objects.filter(created_at__lt=horizon)
+            if self._folded_until is not None:
+                settled = settled.filter(created_at__gte=self._folded_until)
+            self._add(self._revenue, settled)
+            self._folded_until = horizon
+
+            revenue = {key: dict(value) for key, value in self._revenue.items()}
+            self._add(revenue, Payment.objects.filter(created_at__gte=horizon))
+            self._data = {
+                "users": VPNUser.objects.count(),
+                **{key: value or 0 for key, value in totals.items()},
+                "revenue": revenue,
+            }
+            self.refreshed_at = time.monotonic()
+            return self._data
+
+    @staticmethod
+    def _add(revenue: Dict[Tuple[str, str], Dict[str, Any]], payments) -> None:
+        rows = (
+            payments.values("subscription__tariff", "currency")
+            .annotate(total=Sum("amount"), count=Count("pk"))
+            .order_by()
+        )
+        for row in rows:
+            key = (row["subscription__tariff"], row["currency"])
+            entry = revenue.setdefault(key, {"total": Decimal(0), "count": 0})
+            entry["total"] += row["total"]
+            entry["count"] += row["count"]
+
+    def get(self) -> Dict[str, Any]:
+        if time.monotonic() - self.refreshed_at > self.max_age:
+            return self.refresh()
+        return self._data
+
+
+service_stats = StatsSnapshot()
+
+USER_EXPORT_FIELDS = ("user_id", "username", "first_name", "last_name", "created_at")
+
+
+def write_users_csv(out: BinaryIO, chunk_size: int = 2000) -> int:
+    """Stream every VPNUser as CSV into ``out``; returns the row count.
+
+    Rows come from ``iterator(chunk_size=...)`` (a server-side cursor on
+    PostgreSQL) and go straight to ``out``, so memory use does not grow
+    with the number of users.
+    """
+    text = io.TextIOWrapper(out, encoding="utf-8", newline="", write_through=True)
+    writer = csv.writer(text)
+    writer.writerow(USER_EXPORT_FIELDS)
+    rows = 0
+    queryset = VPNUser.objects.order_by("pk").values_list(*USER_EXPORT_FIELDS)
+    for row in queryset.iterator(chunk_size=chunk_size):
+        writer.writerow(row)
+        rows += 1
+    text.detach()  # leave `out` open for the caller
+    return rows
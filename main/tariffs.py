@@ -0,0 +1,89 @@
+"""Tariff registry shared by the models, the web app and the bot.
+
+The built-in ``DEFAULT_TARIFFS`` define ``Subscription.TARIFF_CHOICES`` (and
+so the migrations).  Prices, durations and traffic limits can be overridden
+at runtime from the JSON file named by ``TARIFFS_FILE``, a list of objects
+with the ``Tariff`` fields, and re-read with ``tariffs.reload()`` without a
+restart.  The module does not import Django so the bot can use it cheaply.
+"""
+import json
+import logging
+import os
+import threading
+from typing import Dict, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class Tariff(NamedTuple):
+    id: str
+    name: str  # shown to users in the bot
+    label: str  # shown in the admin
+    duration: int  # days
+    price: int  # minor units (kopecks)
+    traffic_limit: int  # GB
+
+
+DEFAULT_TARIFFS: Tuple[Tariff, ...] = (
+    Tariff("1month", "1 месяц – 178 руб", "1 Month - 178 RUB", 30, 17800, 100),
+    Tariff("3months", "3 месяца - 450 руб", "3 Months - 450 RUB", 90, 45000, 300),
+    Tariff("6months", "6 месяцев - 690 руб", "6 Months - 690 RUB", 180, 69000, 600),
+    Tariff("12months", "12 месяцев - 840 руб", "12 Months - 840 RUB", 365, 84000, 1200),
+)
+
+
+class TariffRegistry:
+    def __init__(self, path: Optional[str] = None, default_id: str = "1month"):
+        self.path = path
+        self.default_id = default_id
+        self._lock = threading.Lock()
+        self._by_id: Dict[str, Tariff] = {t.id: t for t in DEFAULT_TARIFFS}
+        self.version = 0
+        self.reload()
+
+    @classmethod
+    def from_env(cls) -> "TariffRegistry":
+        return cls(os.getenv("TARIFFS_FILE") or None)
+
+    def _load(self) -> Tuple[Tariff, ...]:
+        if not self.path:
+            return DEFAULT_TARIFFS
+        with open(self.path, encoding="utf-8") as f:
+            return tuple(Tariff(**item) for item in json.load(f))
+
+    def reload(self) -> int:
+        """Re-read the tariffs; keeps the current set if loading fails.
+
+        Returns the new version, which changes on every successful reload.
+        """
+        try:
+            loaded = self._load()
+        except (OSError, ValueError, TypeError) as e:
+            logger.error("Failed to load tariffs from %s: %s", self.path, e)
+            return self.version
+        if not any(t.id == self.default_id for t in loaded):
+            logger.error("Tariffs from %s lack the default %r, ignored", self.path, self.default_id)
+            return self.version
+        with self._lock:
+            # Swap the whole mapping so readers never see a partial update.
+            self._by_id = {t.id: t for t in loaded}
+            self.version += 1
+        return self.version
+
+    def all(self) -> Tuple[Tariff, ...]:
+        return tuple(self._by_id.values())
+
+    def find(self, tariff_id: str) -> Optional[Tariff]:
+        return self._by_id.get(tariff_id)
+
+    def get(self, tariff_id: str) -> Tariff:
+        """Tariff by id, falling back to the default tariff for unknown ids."""
+        by_id = self._by_id
+        tariff = by_id.get(tariff_id) or by_id.get(str(tariff_id).lower())
+        if tariff is None:
+            logger.warning("Unknown tariff ID: %s. Using default.", tariff_id)
+            tariff = by_id[self.default_id]
+        return tariff
+
+
+tariffs = TariffRegistry.from_env()
@@ -1 +1,459 @@
-# Create your tests here.
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import mock, skipUnless
+
+from django.db import connection, connections
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import Exists, OuterRef
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase
+from django.utils import timezone
+
+from .artifacts import config_download_path, config_store, config_token
+from .cache import SNAPSHOT_FIELDS, subscription_cache
+from .middleware import REQUEST_LATENCY, ClientMatcher
+from .stats import StatsSnapshot
+from .nodes import FakeNodeBackend
+from .provisioning import get_backend
+from .models import Broadcast, NotificationLedger, Payment, ProvisioningJob, Subscription, VPNUser
+from .reminders import KINDS, _candidates
+
+
+def create_subscriptions(count, start=0):
+    """Insert ``count`` users with one subscription each, varied enough for the planner."""
+    now = timezone.now()
+    users = VPNUser.objects.bulk_create(
+        VPNUser(user_id=str(1_000_000 + i), username=f"user{i}") for i in range(start, start + count)
+    )
+    return Subscription.objects.bulk_create(
+        Subscription(
+            user=user,
+            vpn_username=f"vpnuser_{user.user_id}",
+            vpn_config=f"<VPN config for vpnuser_{user.user_id}>",
+            status=Subscription.STATUS_ACTIVE if i % 4 else Subscription.STATUS_EXPIRED,
+            tariff=Subscription.TARIFF_1MONTH,
+            expires_at=now + timedelta(days=(i % 60) - 15),
+            traffic_used=i % 100,
+        )
+        for i, user in zip(range(start, start + count), users)
+    )
+
+
+@skipUnless(connection.vendor == "sqlite", "EXPLAIN QUERY PLAN is SQLite syntax")
+class QueryPlanTests(TestCase):
+    """The subscription hot paths must be answered from an index.
+
+    A plan step that scans a table or sorts through a temporary B-tree means
+    an index is missing or a query stopped matching it.
+    """
+
+    BAD_PLAN_STEPS = ("SCAN ", "USE TEMP B-TREE")
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.sample = create_subscriptions(2000)[1001]
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def hot_queries(self):
+        """Querysets issued by the web views and the bot on every request."""
+        sample = self.sample
+
+        def reminder_chunk(kind):
+            queryset, key = _candidates(kind, timezone.now())
+            notified = NotificationLedger.objects.filter(subscription=OuterRef("pk"), kind=kind)
+            return queryset.filter(~Exists(notified)).order_by(key, "pk").values_list(
+                "pk", "user__user_id"
+            )[:500]
+
+        return {
+            # .get()/.aget() drop Meta.ordering, so these are planned unordered too.
+            "get_subscription snapshot": Subscription.objects.values(*SNAPSHOT_FIELDS).filter(
+                vpn_username=sample.vpn_username
+            ).order_by(),
+            "home_view lookup": Subscription.objects.filter(vpn_username=sample.vpn_username).order_by(),
+            "check_subscription_status user": VPNUser.objects.filter(user_id=sample.user.user_id),
+            "check_subscription_status active": Subscription.objects.filter(
+                user_id=sample.user_id,
+                status=Subscription.STATUS_ACTIVE,
+                expires_at__gt=timezone.now(),
+            ).order_by("-expires_at")[:1],
+            **{f"reminders {kind}": reminder_chunk(kind) for kind in KINDS},
+        }
+
+    def explain(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def test_hot_queries_use_indexes(self):
+        for label, queryset in self.hot_queries().items():
+            with self.subTest(label):
+                plan = self.explain(queryset)
+                bad = [step for step in plan if step.startswith(self.BAD_PLAN_STEPS)]
+                self.assertEqual(bad, [], "\n".join(plan))
+
+
+class ConfigDownloadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.subscription = create_subscriptions(1)[0]
+
+    def setUp(self):
+        root, config_store.root = config_store.root, tempfile.mkdtemp()
+        self.addCleanup(setattr, config_store, "root", root)
+        self.addCleanup(shutil.rmtree, config_store.root)
+        subscription_cache.clear()
+
+    def test_signed_url_serves_config(self):
+        response = self.client.get(config_download_path(self.subscription.vpn_username))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content.decode(), self.subscription.vpn_config)
+
+    def test_unsigned_or_foreign_token_is_rejected(self):
+        other = create_subscriptions(1, start=1)[0]
+        foreign_token = config_download_path(other.vpn_username).rstrip("/").rsplit("/", 1)[1]
+        for token in ("x", foreign_token):
+            with self.subTest(token=token):
+                response = self.client.get(f"/download-config/{self.subscription.vpn_username}/{token}/")
+                self.assertEqual(response.status_code, 404)
+        response = self.client.get(f"/download-config/{self.subscription.vpn_username}/")
+        self.assertEqual(response.status_code, 404)
+
+    def test_vpn_client_on_the_public_page_needs_the_token(self):
+        name = self.subscription.vpn_username
+        headers = {"User-Agent": "WireGuard/1.0"}
+        self.assertEqual(self.client.get(f"/{name}", headers=headers).status_code, 404)
+        self.assertEqual(self.client.get(f"/{name}?config").status_code, 404)
+        response = self.client.get(f"/{name}", {"token": config_token(name)}, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content.decode(), self.subscription.vpn_config)
+
+
+class ClientMatcherTests(TestCase):
+    def classify(self, path, **headers):
+        return ClientMatcher().classify(RequestFactory().get(path, headers=headers))
+
+    def test_query_flags(self):
+        for query in ("?config", "?vpn=1", "?vpn=true", "?config=yes"):
+            with self.subTest(query):
+                self.assertEqual(self.classify("/name" + query), "vpn")
+        for query in ("", "?vpn=0", "?vpn=false", "?config=off", "?other=1"):
+            with self.subTest(query):
+                self.assertEqual(self.classify("/name" + query), "web")
+
+    def test_headers(self):
+        self.assertEqual(self.classify("/name", user_agent="v2rayNG/1.8"), "vpn")
+        self.assertEqual(self.classify("/name", accept="application/x-wireguard-profile"), "vpn")
+        self.assertEqual(self.classify("/name", user_agent="Mozilla/5.0"), "web")
+
+
+class PaymentIdempotencyTests(TransactionTestCase):
+    """``process_payment`` under duplicate and repeated deliveries."""
+
+    def pay(self, provider_payment_id, user_id=424242):
+        from vpnbot.utils import process_payment
+
+        return process_payment(
+            user_id=user_id, amount=178, currency="RUB", tariff_id="1month",
+            provider_payment_id=provider_payment_id, payload=f"tariff_payment_{user_id}:1month",
+        )
+
+    def test_parallel_deliveries_create_one_payment(self):
+        def deliver(_):
+            try:
+                payment, created = self.pay("charge-stress-1")
+                return payment.pk, created
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=100) as pool:
+            results = list(pool.map(deliver, range(100)))
+
+        self.assertEqual(sum(created for _, created in results), 1)
+        self.assertEqual(len({pk for pk, _ in results}), 1)
+        self.assertEqual(Payment.objects.count(), 1)
+        self.assertEqual(Subscription.objects.count(), 1)
+
+    def test_purchases_on_the_same_day_get_their_own_subscription(self):
+        first, _ = self.pay("charge-1")
+        second, _ = self.pay("charge-2")
+        names = {first.subscription.vpn_username, second.subscription.vpn_username}
+        self.assertEqual(len(names), 2)
+        for name in names:
+            self.assertEqual(Subscription.objects.get(vpn_username=name).user.user_id, "424242")
+
+
+class PaymentOffloadTests(TransactionTestCase):
+    """Other updates keep being processed while a slow payment write runs."""
+
+    async def test_event_loop_stays_responsive(self):
+        from vpnbot import utils
+
+        get_or_create_user = utils.get_or_create_user
+
+        def slow_user(*args, **kwargs):
+            time.sleep(0.5)  # a write stuck behind a lock
+            return get_or_create_user(*args, **kwargs)
+
+        ticks = 0
+        done = asyncio.Event()
+
+        async def other_updates():
+            nonlocal ticks
+            while not done.is_set():
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.create_task(other_updates())
+        self.addCleanup(utils.db_executor.shutdown)
+        with mock.patch.object(utils, "get_or_create_user", slow_user):
+            payment, created = await utils.aprocess_payment(
+                user_id=500, amount=178, currency="RUB", tariff_id="1month",
+                provider_payment_id="charge-offload-1",
+            )
+        done.set()
+        await ticker
+
+        self.assertTrue(created)
+        # ~50 ticks fit in the 0.5s write; a blocked loop would manage one.
+        self.assertGreater(ticks, 20)
+        self.assertTrue(await Payment.objects.filter(pk=payment.pk).aexists())
+
+
+class WebhookSecretTests(TestCase):
+    """Webhook mode must not run, or accept updates, without a secret."""
+
+    def post(self, **headers):
+        from vpnbot.webhook import telegram_webhook
+
+        request = RequestFactory().post(
+            "/telegram/webhook", data="{}", content_type="application/json", headers=headers
+        )
+        return asyncio.run(telegram_webhook(request))
+
+    def test_view_rejects_updates_without_a_configured_secret(self):
+        with mock.patch.dict(os.environ, {"BOT_WEBHOOK_SECRET": ""}):
+            self.assertEqual(self.post().status_code, 403)
+            self.assertEqual(self.post(x_telegram_bot_api_secret_token="").status_code, 403)
+
+    def test_view_rejects_a_wrong_secret(self):
+        with mock.patch.dict(os.environ, {"BOT_WEBHOOK_SECRET": "s3cret"}):
+            self.assertEqual(self.post(x_telegram_bot_api_secret_token="guess").status_code, 403)
+
+    def test_lifespan_startup_fails_without_a_secret(self):
+        from myproject.asgi import lifespan
+
+        sent = []
+        messages = iter([{"type": "lifespan.startup"}])
+
+        async def receive():
+            return next(messages)
+
+        async def send(message):
+            sent.append(message["type"])
+
+        with mock.patch.dict(os.environ, {"BOT_MODE": "webhook", "BOT_WEBHOOK_SECRET": ""}):
+            asyncio.run(lifespan(receive, send))
+        self.assertEqual(sent, ["lifespan.startup.failed"])
+
+
+class ProvisioningBackendTests(SimpleTestCase):
+    """Production must not fall back to the in-memory node backend."""
+
+    def provisioning(self, backend):
+        return self.settings(PROVISIONING={"BACKEND": backend, "OPTIONS": {}, "BATCH_SIZE": 100})
+
+    def test_backend_is_required_without_debug(self):
+        with self.provisioning(""), self.assertRaises(ImproperlyConfigured):
+            get_backend()
+
+    def test_fake_backend_is_refused_without_debug(self):
+        with self.provisioning("main.nodes.FakeNodeBackend"), self.assertRaises(ImproperlyConfigured):
+            get_backend()
+
+    def test_fake_backend_is_allowed_with_debug(self):
+        with self.provisioning("main.nodes.FakeNodeBackend"), self.settings(DEBUG=True):
+            self.assertIsInstance(get_backend(), FakeNodeBackend)
+
+
+class BroadcastFailureTests(TransactionTestCase):
+    """A broadcast survives per-recipient errors and reports its own crash."""
+
+    class Bot:
+        async def send_message(self, chat_id, text, reply_markup=None):
+            from telegram.error import TelegramError
+
+            if chat_id == "2":
+                raise TelegramError("unexpected Telegram answer")
+            if chat_id == "3":
+                raise ValueError("bug while sending")
+
+    def setUp(self):
+        from vpnbot.utils import db_executor
+
+        self.addCleanup(db_executor.shutdown)
+        VPNUser.objects.bulk_create(VPNUser(user_id=str(n)) for n in (1, 2, 3))
+        self.broadcast = Broadcast.objects.create(text="hello")
+
+    def engine(self):
+        from vpnbot.broadcast import BroadcastEngine
+        from vpnbot.ratelimit import TelegramRateLimiter
+
+        return BroadcastEngine(self.Bot(), TelegramRateLimiter(global_rate=1e9, per_chat_rate=1e9))
+
+    def test_unexpected_recipient_errors_count_as_failures(self):
+        with self.assertLogs("vpnbot.broadcast", "ERROR"):
+            asyncio.run(self.engine().run(self.broadcast.pk))
+        self.broadcast.refresh_from_db()
+        self.assertEqual((self.broadcast.sent, self.broadcast.failed), (1, 2))
+        self.assertEqual(self.broadcast.status, Broadcast.STATUS_DONE)
+
+    def test_crashed_task_is_logged(self):
+        async def run():
+            engine = self.engine()
+            engine.start(self.broadcast.pk)
+            while engine._tasks:
+                await asyncio.sleep(0.01)
+
+        with mock.patch("vpnbot.broadcast.save_checkpoint", side_effect=RuntimeError("db down")), \
+                mock.patch("vpnbot.broadcast.notify_admin") as notify_admin, \
+                self.assertLogs("vpnbot.broadcast", "ERROR") as logs:
+            asyncio.run(run())
+        self.assertIn("broadcast-%s stopped: db down" % self.broadcast.pk, logs.output[-1])
+        notify_admin.assert_called_once()
+
+
+class StatsSnapshotTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.subscription = create_subscriptions(1)[0]
+
+    def pay(self, pk):
+        Payment.objects.create(pk=pk, subscription=self.subscription, amount=100, currency="RUB")
+
+    def revenue(self, stats):
+        return stats.refresh()["revenue"][(Subscription.TARIFF_1MONTH, "RUB")]
+
+    def test_payment_committed_out_of_pk_order_is_counted(self):
+        for settle in (300, 0):
+            with self.subTest(settle=settle):
+                Payment.objects.all().delete()
+                stats = StatsSnapshot(settle=settle)
+                self.pay(100)
+                self.assertEqual(self.revenue(stats)["count"], 1)
+                # A transaction that took pk 50 commits only now.
+                self.pay(50)
+                self.assertEqual(self.revenue(stats), {"total": 200, "count": 2})
+                # Refreshing again neither loses nor double-counts anything.
+                self.assertEqual(self.revenue(stats), {"total": 200, "count": 2})
+
+
+class AdminQueryCountTests(TestCase):
+    """Changelist pages issue a fixed number of queries, whatever they show.
+
+    The counts cover the session, the user, the page itself and the
+    changelist's bookkeeping (filters, date hierarchy); a per-row lookup
+    reintroduced through ``list_display`` adds one query per row and fails.
+    """
+
+    QUERIES = {
+        "/admin/main/vpnuser/": 4,
+        "/admin/main/subscription/": 6,
+        "/admin/main/payment/": 5,
+        "/admin/main/provisioningjob/": 4,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        subscriptions = create_subscriptions(150)
+        Payment.objects.bulk_create(
+            Payment(subscription=subscription, amount=100, currency="RUB") for subscription in subscriptions
+        )
+        ProvisioningJob.objects.bulk_create(
+            ProvisioningJob(subscription=subscription) for subscription in subscriptions
+        )
+        cls.admin = get_user_model().objects.create_superuser("admin", "admin@example.com", "admin")
+
+    def test_changelists(self):
+        self.client.force_login(self.admin)
+        for url, queries in self.QUERIES.items():
+            with self.subTest(url):
+                with self.assertNumQueries(queries):
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+
+
+class ProvisioningRetryTests(TestCase):
+    """The admin retry action leaves jobs a worker still holds alone."""
+
+    def test_retry_skips_running_jobs_with_a_live_lease(self):
+        now = timezone.now()
+        leases = {
+            "held": (ProvisioningJob.STATUS_RUNNING, now + timedelta(minutes=5)),
+            "expired": (ProvisioningJob.STATUS_RUNNING, now - timedelta(minutes=5)),
+            "failed": (ProvisioningJob.STATUS_FAILED, None),
+            "done": (ProvisioningJob.STATUS_DONE, None),
+        }
+        jobs = {
+            name: ProvisioningJob.objects.create(
+                subscription=subscription, status=status, lease_expires_at=lease_expires_at, attempts=3
+            )
+            for (name, (status, lease_expires_at)), subscription in zip(leases.items(), create_subscriptions(4))
+        }
+        self.client.force_login(get_user_model().objects.create_superuser("admin", "admin@example.com", "admin"))
+        self.client.post(
+            "/admin/main/provisioningjob/",
+            {"action": "retry", "_selected_action": [job.pk for job in jobs.values()]},
+        )
+        statuses = {name: ProvisioningJob.objects.get(pk=job.pk).status for name, job in jobs.items()}
+        self.assertEqual(statuses, {
+            "held": ProvisioningJob.STATUS_RUNNING,
+            "expired": ProvisioningJob.STATUS_PENDING,
+            "failed": ProvisioningJob.STATUS_PENDING,
+            "done": ProvisioningJob.STATUS_DONE,
+        })
+
+
+class BotShutdownTests(SimpleTestCase):
+    """The last alert digest goes out before the bot's HTTP client closes."""
+
+    class Bot:
+        def __init__(self):
+            self.sent = []
+
+        async def send_message(self, chat_id, text):
+            self.sent.append((chat_id, text))
+
+    def test_post_stop_flushes_alerts(self):
+        from vpnbot.alerts import admin_alerts
+        from vpnbot.bot import build_application
+
+        # run_polling calls post_stop before Application.shutdown() and
+        # post_shutdown only after it.
+        application = build_application(token="123:TEST", webhook=True)
+        bot = self.Bot()
+
+        async def run():
+            admin_alerts.start(bot, "42")
+            admin_alerts.alert("Provisioning failed for user 1")
+            await application.post_stop(application)
+
+        asyncio.run(run())
+        self.assertEqual(len(bot.sent), 1)
+        self.assertIn("Provisioning failed for user 1", bot.sent[0][1])
+
+
+class RequestMetricsTests(TestCase):
+    def test_unknown_methods_share_one_label(self):
+        for method in ("BREW", "XYZZY"):
+            self.client.generic(method, "/favicon.ico")
+        methods = {labels[1] for labels, _ in REQUEST_LATENCY._samples()}
+        self.assertIn("other", methods)
+        self.assertFalse(methods & {"BREW", "XYZZY"})
@@ -0,0 +1,161 @@
+"""Traffic accounting: parse node reports and flush them in batched updates.
+
+VPN nodes report per-user byte-count deltas either as JSON lines::
+
+    {"u": "vpnuser_42_20250101", "b": 1048576}
+
+or as a compact binary stream of records ``[u8 name length][name][u64 bytes]``
+(big-endian).  Deltas are summed in memory per ``vpn_username`` and written
+with one ``UPDATE ... SET traffic_used = traffic_used + CASE ...`` per chunk
+of users, so many reports collapse into a handful of writes.  Each flush
+also appends the deltas to the usage history (see ``main.usage``).
+"""
+import atexit
+import json
+import logging
+import struct
+import threading
+from typing import BinaryIO, Dict, Iterable, Iterator, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, FloatField, Value, When
+from django.utils import timezone
+
+from .cache import subscription_cache
+from .models import Subscription, UsageSample
+from .scheduler import PeriodicJob
+
+logger = logging.getLogger("main")
+
+BYTES_PER_GB = 1024 ** 3
+_NAME_LEN = struct.Struct("!B")
+_BYTES = struct.Struct("!Q")
+
+
+class TrafficFormatError(ValueError):
+    pass
+
+
+def iter_json_lines(stream: BinaryIO) -> Iterator[Tuple[str, int]]:
+    for line_no, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+            yield str(record["u"]), int(record["b"])
+        except (ValueError, KeyError, TypeError) as e:
+            raise TrafficFormatError(f"line {line_no}: {e}") from e
+
+
+def iter_binary(stream: BinaryIO) -> Iterator[Tuple[str, int]]:
+    while True:
+        head = stream.read(_NAME_LEN.size)
+        if not head:
+            return
+        (name_len,) = _NAME_LEN.unpack(head)
+        body = stream.read(name_len + _BYTES.size)
+        if len(body) != name_len + _BYTES.size:
+            raise TrafficFormatError("truncated record")
+        try:
+            name = body[:name_len].decode("utf-8")
+        except UnicodeDecodeError as e:
+            raise TrafficFormatError(str(e)) from e
+        yield name, _BYTES.unpack_from(body, name_len)[0]
+
+
+def encode_binary(records: Iterable[Tuple[str, int]]) -> bytes:
+    """Encode ``(vpn_username, bytes)`` pairs in the binary report format."""
+    out = bytearray()
+    for name, nbytes in records:
+        raw = name.encode("utf-8")
+        out += _NAME_LEN.pack(len(raw)) + raw + _BYTES.pack(nbytes)
+    return bytes(out)
+
+
+class TrafficAggregator:
+    """Thread-safe in-memory accumulator of per-user byte deltas."""
+
+    def __init__(self, flush_interval: float = 5.0, batch_size: int = 500):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.records = 0
+        self.flushes = 0
+        self._pending: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._job = None
+
+    @classmethod
+    def from_settings(cls) -> "TrafficAggregator":
+        config = getattr(settings, "TRAFFIC_INGEST", {})
+        return cls(
+            flush_interval=config.get("FLUSH_INTERVAL", 5.0),
+            batch_size=config.get("BATCH_SIZE", 500),
+        )
+
+    def add_many(self, records: Iterable[Tuple[str, int]]) -> int:
+        count = 0
+        with self._lock:
+            pending = self._pending
+            for name, nbytes in records:
+                if nbytes > 0:
+                    pending[name] = pending.get(name, 0) + nbytes
+                count += 1
+            self.records += count
+        return count
+
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def flush(self) -> int:
+        """Write accumulated deltas; returns the number of subscriptions updated."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+
+            names = list(batch)
+            updated = 0
+            recorded_at = timezone.now()
+            try:
+                for start in range(0, len(names), self.batch_size):
+                    chunk = names[start:start + self.batch_size]
+                    delta = Case(
+                        *(When(vpn_username=name, then=Value(batch[name] / BYTES_PER_GB)) for name in chunk),
+                        default=Value(0.0),
+                        output_field=FloatField(),
+                    )
+                    matched = Subscription.objects.filter(vpn_username__in=chunk)
+                    with transaction.atomic():
+                        updated += matched.update(traffic_used=F("traffic_used") + delta)
+                        UsageSample.objects.bulk_create(
+                            UsageSample(subscription_id=pk, recorded_at=recorded_at, bytes=batch[name])
+                            for pk, name in matched.values_list("pk", "vpn_username")
+                        )
+                    # Written chunks must not be re-applied if a later one fails.
+                    for name in chunk:
+                        del batch[name]
+            except Exception:
+                with self._lock:
+                    for name, nbytes in batch.items():
+                        self._pending[name] = self._pending.get(name, 0) + nbytes
+                raise
+            finally:
+                subscription_cache.invalidate(*(name for name in names if name not in batch))
+            self.flushes += 1
+            return updated
+
+    def start(self) -> None:
+        """Flush on a background thread every ``flush_interval`` seconds."""
+        with self._lock:
+            if self._job is not None:
+                return
+            self._job = PeriodicJob("traffic-flush", self.flush_interval, self.flush)
+        self._job.start()
+        atexit.register(self.flush)
+
+
+traffic_aggregator = TrafficAggregator.from_settings()
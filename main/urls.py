@@ -5,6 +5,11 @@ from . import views
 
 urlpatterns = [
     path("favicon.ico", RedirectView.as_view(url="/static/favicon.ico")),  # Add this
-    path("<str:user_id>", views.home_view, name="home"),
-    path("api/subscription/<str:user_id>", views.get_subscription, name="subscription"),
+    path("metrics", views.metrics, name="metrics"),
+    path("<str:vpn_username>", views.home_view, name="home"),
+    path("api/subscription/<str:vpn_username>", views.get_subscription, name="subscription"),
+    path("download-config/<str:vpn_username>/<str:token>/", views.download_config, name="download_config"),
+    path("api/traffic", views.ingest_traffic, name="ingest_traffic"),
+    path("api/usage/<str:vpn_username>", views.usage_history, name="usage_history"),
+    path("api/cache/stats", views.cache_stats, name="cache_stats"),
 ]
@@ -0,0 +1,164 @@
+"""Per-subscription usage history.
+
+``TrafficAggregator.flush`` appends one ``UsageSample`` per subscription and
+flush.  ``rollup_usage`` (``manage.py rollup_usage``) folds new samples into
+hourly and daily ``UsageRollup`` buckets, resuming from the sample id kept
+in ``UsageRollupState``, and ``prune_usage`` drops rows past their
+retention.  Raw samples are only deleted once rolled up, so the history
+stays complete while the raw table stays bounded.
+"""
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, NamedTuple, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Sum
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+from .models import UsageRollup, UsageRollupState, UsageSample
+
+logger = logging.getLogger("main")
+
+STATE_NAME = "usage"
+# Samples younger than this are left for the next run, so a flush still
+# committing a lower id can never be skipped by the cursor.
+SETTLE_DELAY = timedelta(seconds=60)
+# Largest series /api/usage returns; wider ranges fall back to daily buckets.
+MAX_POINTS = 2000
+TRUNC_KINDS = {
+    UsageRollup.RESOLUTION_HOUR: "hour",
+    UsageRollup.RESOLUTION_DAY: "day",
+}
+BUCKET_SIZES = {
+    UsageRollup.RESOLUTION_HOUR: timedelta(hours=1),
+    UsageRollup.RESOLUTION_DAY: timedelta(days=1),
+}
+DEFAULT_RETENTION = {"RAW": 7, "HOUR": 90, "DAY": 730}
+
+
+class RollupResult(NamedTuple):
+    samples: int
+    buckets: int
+    batches: int
+
+
+def _merge(resolution: str, totals: Iterable[dict], chunk_size: int = 500) -> int:
+    """Add ``totals`` to the stored buckets; returns the buckets written."""
+    totals = {(row["subscription_id"], row["bucket"]): row["total"] for row in totals}
+    if not totals:
+        return 0
+    buckets = [bucket for _, bucket in totals]
+    subscription_ids = sorted({pk for pk, _ in totals})
+    for start in range(0, len(subscription_ids), chunk_size):
+        existing = UsageRollup.objects.filter(
+            subscription_id__in=subscription_ids[start:start + chunk_size],
+            resolution=resolution,
+            bucket_start__gte=min(buckets),
+            bucket_start__lte=max(buckets),
+        ).values_list("subscription_id", "bucket_start", "bytes")
+        for pk, bucket, stored in existing:
+            if (pk, bucket) in totals:
+                totals[pk, bucket] += stored
+    UsageRollup.objects.bulk_create(
+        [
+            UsageRollup(subscription_id=pk, resolution=resolution, bucket_start=bucket, bytes=total)
+            for (pk, bucket), total in totals.items()
+        ],
+        update_conflicts=True,
+        unique_fields=["subscription", "resolution", "bucket_start"],
+        update_fields=["bytes"],
+        batch_size=chunk_size,
+    )
+    return len(totals)
+
+
+def rollup_usage(now: Optional[datetime] = None, batch_size: int = 10000) -> RollupResult:
+    """Fold samples newer than the cursor into hourly and daily buckets.
+
+    Each batch adds to the rollups and advances the cursor in one
+    transaction, so every sample is counted exactly once even if a run is
+    interrupted or two runs overlap.
+    """
+    settled = (now or timezone.now()) - SETTLE_DELAY
+    samples = buckets = batches = 0
+    while True:
+        with transaction.atomic():
+            state, _ = UsageRollupState.objects.select_for_update().get_or_create(name=STATE_NAME)
+            pending = UsageSample.objects.filter(
+                pk__gt=state.last_sample_pk, recorded_at__lt=settled
+            )
+            upper = list(pending.order_by("pk").values_list("pk", flat=True)[batch_size - 1:batch_size])
+            upper = upper[0] if upper else pending.aggregate(last=Max("pk"))["last"]
+            if upper is None:
+                break
+
+            window = UsageSample.objects.filter(pk__gt=state.last_sample_pk, pk__lte=upper)
+            for resolution, kind in TRUNC_KINDS.items():
+                buckets += _merge(
+                    resolution,
+                    window.annotate(bucket=Trunc("recorded_at", kind))
+                    .values("subscription_id", "bucket")
+                    .annotate(total=Sum("bytes"))
+                    .order_by(),
+                )
+            samples += window.count()
+            state.last_sample_pk = upper
+            state.save(update_fields=["last_sample_pk", "updated_at"])
+        batches += 1
+
+    if samples:
+        logger.info("Rolled up %s usage samples into %s buckets", samples, buckets)
+    return RollupResult(samples, buckets, batches)
+
+
+def prune_usage(now: Optional[datetime] = None) -> Dict[str, int]:
+    """Delete samples and rollups older than ``settings.USAGE_RETENTION`` days."""
+    now = now or timezone.now()
+    retention = {**DEFAULT_RETENTION, **getattr(settings, "USAGE_RETENTION", {})}
+    state = UsageRollupState.objects.filter(name=STATE_NAME).first()
+    rolled_up = state.last_sample_pk if state else 0
+    deleted = {
+        "raw": UsageSample.objects.filter(
+            recorded_at__lt=now - timedelta(days=retention["RAW"]), pk__lte=rolled_up
+        ).delete()[0],
+    }
+    for resolution, key in ((UsageRollup.RESOLUTION_HOUR, "HOUR"), (UsageRollup.RESOLUTION_DAY, "DAY")):
+        deleted[resolution] = UsageRollup.objects.filter(
+            resolution=resolution, bucket_start__lt=now - timedelta(days=retention[key])
+        ).delete()[0]
+    return deleted
+
+
+def pick_resolution(start: datetime, end: datetime, requested: Optional[str] = None) -> str:
+    """Finest resolution that fits ``MAX_POINTS`` (or validate ``requested``)."""
+    if requested:
+        if requested not in BUCKET_SIZES:
+            raise ValueError(f"resolution must be one of: {', '.join(BUCKET_SIZES)}")
+        if (end - start) / BUCKET_SIZES[requested] > MAX_POINTS:
+            raise ValueError(f"range too large for {requested} resolution")
+        return requested
+    for resolution, size in BUCKET_SIZES.items():
+        if (end - start) / size <= MAX_POINTS:
+            return resolution
+    raise ValueError("range too large")
+
+
+def usage_series(vpn_username: str, start: datetime, end: datetime, resolution: str):
+    """``(bucket_start, bytes)`` pairs in ``[start, end)``, one query.
+
+    Rows are found through the vpn_username index and the
+    (subscription, resolution, bucket_start) unique index.
+    """
+    return (
+        UsageRollup.objects.filter(
+            subscription__vpn_username=vpn_username,
+            resolution=resolution,
+            bucket_start__gte=start,
+            bucket_start__lt=end,
+        )
+        .values_list("bucket_start")
+        .annotate(total=Sum("bytes"))
+        .order_by("bucket_start")
+    )
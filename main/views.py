@@ -1,20 +1,44 @@
+import hashlib
+import io
 import logging
-from django.http import JsonResponse
-from django.shortcuts import get_object_or_404
+import secrets
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import HttpResponse, JsonResponse
+from django.shortcuts import aget_object_or_404, render
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+
+from myproject.log import SAMPLED
+
+from .artifacts import check_config_token, config_store
+from .cache import aload_subscription_snapshot, subscription_cache
+from .metrics import CONTENT_TYPE, REGISTRY
 from .models import Subscription
+from .traffic import TrafficFormatError, iter_binary, iter_json_lines, traffic_aggregator
+from .usage import pick_resolution, usage_series
 
 logger = logging.getLogger("main")
 
-def home_view(request, vpn_username):  # Теперь принимаем vpn_username вместо subscription_id
-    subscription = get_object_or_404(Subscription, vpn_username=vpn_username)
-
+async def home_view(request, vpn_username):  # Теперь принимаем vpn_username вместо subscription_id
     if request.client_type == "vpn":
-        logger.info(f"VPN config request for {vpn_username}")
-        # Здесь должен быть код генерации/отдачи конфига VPN
-        return JsonResponse({
-            "config": subscription.vpn_config,
-            "expires_at": subscription.expires_at.isoformat()
-        })
+        logger.info("VPN config request for %s", vpn_username, extra=SAMPLED)
+        # The page URL is guessable: VPN clients get the config only with the
+        # same signed token as download_config, passed as ?token=.
+        if not check_config_token(vpn_username, request.GET.get("token", "")):
+            return JsonResponse({"error": "VPN user not found"}, status=404)
+        return await serve_config(request, vpn_username)
+
+    # select_related: the template reads subscription.user, which would
+    # otherwise be a lazy sync query inside the event loop.
+    subscription = await aget_object_or_404(
+        Subscription.objects.select_related("user"), vpn_username=vpn_username
+    )
 
     context = {
         "user": subscription.user,  # Для совместимости с шаблоном
@@ -23,27 +47,166 @@ def home_view(request, vpn_username):  # Теперь принимаем vpn_use
     return render(request, "main/home.html", context=context)
 
 
-def get_subscription(request, vpn_username):  # Используем vpn_username как ключ
+def _subscription_payload(snapshot):
+    """Build the status API response from a cached subscription snapshot."""
+    delta = snapshot["expires_at"] - timezone.now()
+    traffic_used = snapshot["traffic_used"]
+    traffic_limit = snapshot["traffic_limit"]
+    vpn_username = snapshot["vpn_username"]
+    days_left = delta.days if delta.days > 0 else 0
+    # Changes whenever anything a client renders from this payload changes,
+    # so the bot can reuse a rendered profile message.
+    version = hashlib.blake2s(
+        repr((vpn_username, snapshot["status"], snapshot["expires_at"], days_left,
+              traffic_used, traffic_limit, snapshot["config_digest"])).encode(),
+        digest_size=8,
+    ).hexdigest()
+    return {
+        "userId": str(snapshot["user_id"]),
+        "username": vpn_username,  # Теперь точно соответствует запрошенному
+        "userStatus": snapshot["status"],
+        "expiresAt": snapshot["expires_at"].strftime("%d.%m.%Y"),
+        "daysLeft": days_left,
+        "trafficUsed": traffic_used,
+        "trafficLimit": traffic_limit,
+        "trafficPercent": round(
+            (traffic_used / traffic_limit) * 100, 1
+        ) if traffic_limit > 0 else 0,
+        "version": version,
+    }
+
+
+async def get_subscription(request, vpn_username):  # Используем vpn_username как ключ
     try:
-        subscription = Subscription.objects.get(vpn_username=vpn_username)
-
-        return JsonResponse({
-            "userId": str(subscription.user.user_id),
-            "username": vpn_username,  # Теперь точно соответствует запрошенному
-            "userStatus": subscription.status,
-            "expiresAt": subscription.expires_at.strftime("%d.%m.%Y"),
-            "daysLeft": subscription.days_left,
-            "trafficUsed": subscription.traffic_used,
-            "trafficLimit": subscription.traffic_limit,
-            "trafficPercent": round(
-                (subscription.traffic_used / subscription.traffic_limit) * 100, 1
-            ) if subscription.traffic_limit > 0 else 0,
-            "configUrl": f"/download-config/{vpn_username}/"  # Пример URL для скачивания конфига
-        })
-
-    except Subscription.DoesNotExist:
-        logger.error(f"Subscription not found for username: {vpn_username}")
-        return JsonResponse({"error": "VPN user not found"}, status=404)
+        snapshot = await subscription_cache.aget_or_load(vpn_username, aload_subscription_snapshot)
+        if snapshot is None:
+            logger.info("Subscription not found for username: %s", vpn_username, extra=SAMPLED)
+            return JsonResponse({"error": "VPN user not found"}, status=404)
+
+        return JsonResponse(_subscription_payload(snapshot))
+
     except Exception as e:
-        logger.error(f"Error in get_subscription: {str(e)}", exc_info=True)
+        logger.error("Error in get_subscription: %s", e, exc_info=True)
         return JsonResponse({"error": "Internal server error"}, status=500)
+
+
+async def download_config(request, vpn_username, token):
+    """Signed config download (see ``main.artifacts.config_download_path``)."""
+    if not check_config_token(vpn_username, token):
+        # Same answer as an unknown user, so the URL reveals nothing.
+        return JsonResponse({"error": "VPN user not found"}, status=404)
+    return await serve_config(request, vpn_username)
+
+
+async def serve_config(request, vpn_username):
+    """Serve the stored config artifact; unchanged configs answer 304."""
+    snapshot = await subscription_cache.aget_or_load(vpn_username, aload_subscription_snapshot)
+    if snapshot is None:
+        return JsonResponse({"error": "VPN user not found"}, status=404)
+
+    digest = snapshot["config_digest"]
+    if digest:
+        response = await config_store.aresponse(request, digest)
+        if response is not None:
+            return response
+
+    # No artifact yet (subscriptions activated before the artifact store) or
+    # its file is gone: rebuild it from the stored config.
+    subscriptions = Subscription.objects.filter(vpn_username=vpn_username)
+    config = await subscriptions.values_list("vpn_config", flat=True).afirst()
+    if not config:
+        return JsonResponse({"error": "VPN config not ready"}, status=404)
+    stored = await sync_to_async(config_store.put)(config)
+    if stored != digest:
+        await subscriptions.aupdate(config_digest=stored)
+        await subscription_cache.ainvalidate(vpn_username)
+
+    response = await config_store.aresponse(request, stored)
+    if response is None:
+        return JsonResponse({"error": "VPN config not ready"}, status=404)
+    return response
+
+
+@staff_member_required
+def cache_stats(request):
+    """Hit/miss/eviction counters of the subscription snapshot cache."""
+    return JsonResponse(subscription_cache.stats())
+
+
+def metrics(request):
+    """Prometheus exposition of ``main.metrics.REGISTRY``."""
+    token = settings.METRICS_TOKEN
+    provided = request.headers.get("Authorization", "").removeprefix("Bearer ")
+    if token:
+        allowed = secrets.compare_digest(provided, token)
+    else:
+        allowed = request.user.is_active and request.user.is_staff
+    if not allowed:
+        return JsonResponse({"error": "Forbidden"}, status=403)
+    return HttpResponse(REGISTRY.exposition(), content_type=CONTENT_TYPE)
+
+
+@csrf_exempt
+@require_POST
+async def ingest_traffic(request):
+    """Accept per-user byte deltas from VPN nodes (JSON lines or binary)."""
+    token = settings.TRAFFIC_INGEST["TOKEN"]
+    provided = request.headers.get("Authorization", "").removeprefix("Bearer ")
+    if not token or not secrets.compare_digest(provided, token):
+        return JsonResponse({"error": "Forbidden"}, status=403)
+
+    parse = iter_binary if request.content_type == "application/octet-stream" else iter_json_lines
+    try:
+        # Parsed up front so a malformed report is rejected as a whole.
+        records = list(parse(io.BytesIO(request.body)))
+    except TrafficFormatError as e:
+        return JsonResponse({"error": f"Malformed report: {e}"}, status=400)
+
+    accepted = traffic_aggregator.add_many(records)
+
+    traffic_aggregator.start()
+    return JsonResponse({"accepted": accepted}, status=202)
+
+
+def _parse_moment(value, default):
+    """ISO date or datetime query parameter; naive values are UTC."""
+    if not value:
+        return default
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"invalid date: {value}")
+        moment = datetime(day.year, day.month, day.day)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment, dt_timezone.utc)
+    return moment
+
+
+async def usage_history(request, vpn_username):
+    """Usage series for ``?from=&to=`` (default: last 7 days), downsampled
+    to hourly or daily buckets so that at most ``usage.MAX_POINTS`` return."""
+    try:
+        end = _parse_moment(request.GET.get("to"), timezone.now())
+        start = _parse_moment(request.GET.get("from"), end - timedelta(days=7))
+        if start >= end:
+            raise ValueError("'from' must be before 'to'")
+        resolution = pick_resolution(start, end, request.GET.get("resolution"))
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    snapshot = await subscription_cache.aget_or_load(vpn_username, aload_subscription_snapshot)
+    if snapshot is None:
+        return JsonResponse({"error": "VPN user not found"}, status=404)
+
+    points = [
+        [bucket.isoformat(), total]
+        async for bucket, total in usage_series(vpn_username, start, end, resolution)
+    ]
+    return JsonResponse({
+        "username": vpn_username,
+        "resolution": resolution,
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "points": points,
+    })
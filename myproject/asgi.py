@@ -3,6 +3,11 @@ ASGI config for myproject project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+With BOT_MODE=webhook the Telegram bot runs inside this application: it is
+started and stopped through the ASGI lifespan protocol and receives updates
+on /telegram/webhook (see vpnbot/webhook.py).  The lifespan also runs the
+subscription expiry sweeper when SUBSCRIPTION_EXPIRY_INTERVAL is set.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -13,4 +18,43 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "myproject.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+
+async def lifespan(receive, send):
+    from main.expiry import expiry_job
+
+    webhook_mode = os.getenv("BOT_MODE") == "webhook"
+    expiry = expiry_job()
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            if webhook_mode:
+                from vpnbot import webhook
+
+                try:
+                    await webhook.start()
+                except Exception as e:
+                    # Fail the startup so the server exits instead of serving
+                    # an unprotected (or dead) webhook.
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    return
+            if expiry is not None:
+                expiry.start()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            if webhook_mode:
+                from vpnbot import webhook
+
+                await webhook.stop()
+            if expiry is not None:
+                expiry.stop()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -0,0 +1,146 @@
+"""Logging configuration shared by the web app and the bot.
+
+Records are handed to a ``queue.SimpleQueue`` by ``QueueingHandler`` and
+written by a ``QueueListener`` thread, so JSON encoding and stream or file
+I/O never run on a request thread or the bot's event loop.  The calling
+thread only merges the message arguments (they may be mutable objects) and
+renders tracebacks.
+
+Hot-path call sites mark their records with ``extra=SAMPLED``; below
+WARNING those are kept with probability ``LOG_SAMPLE_RATE``.
+
+``settings.LOGGING`` comes from ``logging_config()``; the polling bot calls
+``configure_logging()`` at startup since it sets Django up lazily.
+"""
+import atexit
+import json
+import logging
+import logging.config
+import os
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, WatchedFileHandler
+from typing import Any, Dict, Optional
+
+SAMPLED = {"sampled": True}
+
+PLAIN_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# LogRecord attributes that are not user-supplied ``extra`` fields.
+_RESERVED = frozenset(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+_EXCEPTION_FORMATTER = logging.Formatter()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with the message, origin and ``extra`` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and key != "sampled":
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keep a ``rate`` fraction of sampled records below WARNING."""
+
+    def __init__(self, rate: float = 1.0):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not getattr(record, "sampled", False):
+            return True
+        return self.rate >= 1 or random.random() < self.rate
+
+
+class QueueingHandler(QueueHandler):
+    """``QueueHandler`` that owns the listener writing to ``handlers``."""
+
+    def __init__(self, handlers):
+        super().__init__(queue.SimpleQueue())
+        self.listener = QueueListener(self.queue, *handlers, respect_handler_level=True)
+        self.listener.start()
+        atexit.register(self.close)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Unlike the base class this neither copies nor formats the record:
+        # only what cannot safely cross threads is resolved here, in place,
+        # and the formatter runs on the listener thread.
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        if record.exc_info:
+            record.exc_text = _EXCEPTION_FORMATTER.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def close(self) -> None:
+        listener, self.listener = self.listener, None
+        if listener is not None:
+            listener.stop()
+            for handler in listener.handlers:
+                handler.close()
+        super().close()
+
+
+def queueing_handler(json_format: bool = True, stream: Any = None,
+                     filename: Optional[str] = None) -> QueueingHandler:
+    """``dictConfig`` factory: stderr (and optionally a file) behind a queue."""
+    formatter = JsonFormatter() if json_format else logging.Formatter(PLAIN_FORMAT)
+    targets = [logging.StreamHandler(stream or sys.stderr)]
+    if filename:
+        targets.append(WatchedFileHandler(filename, encoding="utf-8"))
+    for target in targets:
+        target.setFormatter(formatter)
+    return QueueingHandler(targets)
+
+
+def logging_config(env: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """``LOGGING`` dict from ``LOG_LEVEL``, ``LOG_FORMAT``, ``LOG_FILE`` and ``LOG_SAMPLE_RATE``."""
+    env = os.environ if env is None else env
+    level = env.get("LOG_LEVEL", "INFO").upper()
+    return {
+        "version": 1,
+        "disable_existing_loggers": False,
+        "filters": {
+            "sampling": {
+                "()": "myproject.log.SamplingFilter",
+                "rate": float(env.get("LOG_SAMPLE_RATE", "0.1")),
+            },
+        },
+        "handlers": {
+            "queue": {
+                "()": "myproject.log.queueing_handler",
+                "json_format": env.get("LOG_FORMAT", "json") == "json",
+                "filename": env.get("LOG_FILE") or None,
+                "filters": ["sampling"],
+            },
+        },
+        "root": {"handlers": ["queue"], "level": level},
+        "loggers": {
+            # Replaces Django's default console/mail handlers; records
+            # propagate to the queue like everything else.
+            "django": {"handlers": [], "level": level},
+            # httpx logs every Telegram API call at INFO.
+            "httpx": {"level": "WARNING"},
+        },
+    }
+
+
+def configure_logging(env: Optional[Dict[str, str]] = None) -> None:
+    logging.config.dictConfig(logging_config(env))
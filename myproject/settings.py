@@ -2,6 +2,9 @@ import os
 from pathlib import Path
 from typing import Optional
 
+from myproject.database import database_from_url
+from myproject.log import logging_config
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -9,6 +12,9 @@ DEBUG: bool = os.getenv("DEBUG", "True") == "True"
 SECRET_KEY: str = str(os.getenv("SECRET_KEY"))
 
 TELEGRAM_BOT_TOKEN: Optional[str] = os.getenv("TELEGRAM_BOT_TOKEN")
+# "webhook" mounts the bot's webhook view and runs the bot inside the ASGI app
+# (see vpnbot/bot.py); "polling" keeps it a separate process.
+BOT_MODE: str = os.getenv("BOT_MODE", "polling")
 
 MIMI_APP_URL = "https://vite.pythonanywhere.com"
 
@@ -28,6 +34,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "main.middleware.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
@@ -40,6 +47,10 @@ MIDDLEWARE = [
     "main.middleware.ClientTypeMiddleware",
 ]
 
+# Overrides for main.middleware.DEFAULT_CLIENT_DETECTION (USER_AGENTS,
+# ACCEPT, QUERY_FLAGS, CACHE_SIZE); rules are compiled once at startup.
+CLIENT_DETECTION = {}
+
 ROOT_URLCONF = "myproject.urls"
 
 TEMPLATES = [
@@ -63,13 +74,68 @@ WSGI_APPLICATION = "myproject.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# DATABASE_URL=postgres://... for PostgreSQL with a connection pool; unset
+# keeps SQLite (WAL mode) in BASE_DIR. See myproject/database.py.
 DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
-    }
+    "default": database_from_url(os.getenv("DATABASE_URL"), BASE_DIR / "db.sqlite3"),
+}
+
+# Subscription snapshot cache (see main/cache.py). SHARED_BACKEND is an alias
+# from CACHES. Invalidation clears the shared backend but only the local LRU
+# of the process that made the change, so other processes (e.g. web workers
+# after a payment in the bot) serve their local copy for up to TTL seconds.
+# With a shared backend the local TTL therefore defaults to one second.
+_SUBSCRIPTION_CACHE_BACKEND = os.getenv("SUBSCRIPTION_CACHE_BACKEND") or None
+SUBSCRIPTION_CACHE = {
+    "MAXSIZE": int(os.getenv("SUBSCRIPTION_CACHE_MAXSIZE", "10000")),
+    "TTL": float(os.getenv("SUBSCRIPTION_CACHE_TTL", "1" if _SUBSCRIPTION_CACHE_BACKEND else "30")),
+    "SHARED_BACKEND": _SUBSCRIPTION_CACHE_BACKEND,
+    "SHARED_TTL": float(os.getenv("SUBSCRIPTION_CACHE_SHARED_TTL", "300")),
 }
 
+# Seconds between expiry sweeps run by the ASGI server (myproject/asgi.py);
+# 0 disables them and leaves it to `manage.py expire_subscriptions` (cron or
+# --every), which is also the better choice with several ASGI workers.
+SUBSCRIPTION_EXPIRY_INTERVAL = float(os.getenv("SUBSCRIPTION_EXPIRY_INTERVAL", "0"))
+
+# Bearer token for /metrics (see main/metrics.py); when empty the endpoint
+# is staff-only.
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+# Traffic reports from VPN nodes (see main/traffic.py). The ingest endpoint
+# is disabled while TOKEN is empty.
+TRAFFIC_INGEST = {
+    "TOKEN": os.getenv("TRAFFIC_INGEST_TOKEN", ""),
+    "FLUSH_INTERVAL": float(os.getenv("TRAFFIC_FLUSH_INTERVAL", "5")),
+    "BATCH_SIZE": int(os.getenv("TRAFFIC_FLUSH_BATCH_SIZE", "500")),
+}
+
+# VPN config provisioning (see main/provisioning.py): BACKEND is a
+# main.nodes.NodeBackend subclass built with OPTIONS; the bot's worker
+# registers up to BATCH_SIZE peers per node call. Required unless DEBUG:
+# the in-memory FakeNodeBackend issues configs that connect nowhere.
+PROVISIONING = {
+    "BACKEND": os.getenv("PROVISIONING_BACKEND", "main.nodes.FakeNodeBackend" if DEBUG else ""),
+    "OPTIONS": {},
+    "BATCH_SIZE": int(os.getenv("PROVISIONING_BATCH_SIZE", "100")),
+    "MAX_ATTEMPTS": int(os.getenv("PROVISIONING_MAX_ATTEMPTS", "8")),
+    "LEASE": float(os.getenv("PROVISIONING_LEASE", "300")),
+    "RETRY_DELAY": float(os.getenv("PROVISIONING_RETRY_DELAY", "5")),
+}
+
+# Usage history (see main/usage.py): days kept for raw samples and for the
+# hourly and daily rollups pruned by `manage.py rollup_usage`.
+USAGE_RETENTION = {
+    "RAW": int(os.getenv("USAGE_RAW_RETENTION_DAYS", "7")),
+    "HOUR": int(os.getenv("USAGE_HOURLY_RETENTION_DAYS", "90")),
+    "DAY": int(os.getenv("USAGE_DAILY_RETENTION_DAYS", "730")),
+}
+
+
+# JSON lines through a background queue (see myproject/log.py); LOG_LEVEL,
+# LOG_FORMAT=json|plain, LOG_FILE and LOG_SAMPLE_RATE for hot-path records.
+LOGGING = logging_config()
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -113,3 +179,6 @@ STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
+
+# Content-addressed store of rendered VPN configs (see main/artifacts.py).
+VPN_CONFIG_ROOT = os.getenv("VPN_CONFIG_ROOT", os.path.join(MEDIA_ROOT, "vpn-configs"))
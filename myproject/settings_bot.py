@@ -0,0 +1,15 @@
+"""Settings for the standalone bot process (``python -m vpnbot.bot``).
+
+The bot only needs the ``main`` models: no admin, auth, sessions, messages,
+static files or middleware.  Loading just that app keeps ``django.setup()``
+cheap on every restart.  The web process and webhook mode (where the bot
+runs inside the ASGI app) keep using ``myproject.settings``.
+"""
+from myproject.settings import *  # noqa: F401,F403
+
+INSTALLED_APPS = ["main"]
+MIDDLEWARE = []
+TEMPLATES = []
+# vpnbot.bot configures logging before Django is set up; doing it again here
+# would replace the running queue listener mid-flight.
+LOGGING_CONFIG = None
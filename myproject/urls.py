@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.contrib import admin
 from django.urls import include, path
 
@@ -5,3 +6,8 @@ urlpatterns = [
     path("admin/", admin.site.urls),
     path("", include("main.urls")),  # Add this line
 ]
+
+if settings.BOT_MODE == "webhook":
+    from vpnbot.webhook import telegram_webhook
+
+    urlpatterns.append(path("telegram/webhook", telegram_webhook, name="telegram_webhook"))
@@ -0,0 +1,111 @@
+# vpnbot/alerts.py
+"""Batched, deduplicated alerts to the admin chat.
+
+``AdminAlerts.alert`` only records the event under its fingerprint (the
+text with numbers masked, so "failed for user 123" and "failed for user
+456" group together) and returns immediately; it is safe to call from the
+event loop and from DB worker threads.  Once per ``window`` seconds a single
+digest with the count and a sample of every group is sent, so an outage
+produces one message per window instead of one per failed update.
+"""
+import asyncio
+import logging
+import re
+import threading
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_NUMBERS = re.compile(r"\d+")
+MAX_MESSAGE_LENGTH = 4096  # Telegram's limit for one text message
+
+
+def fingerprint(text: str) -> str:
+    return _NUMBERS.sub("N", text)[:200]
+
+
+class _Group:
+    __slots__ = ("count", "sample")
+
+    def __init__(self, sample: str):
+        self.count = 0
+        self.sample = sample
+
+
+class AdminAlerts:
+    def __init__(self, window: float = 30, max_groups: int = 50):
+        self.window = window
+        self.max_groups = max_groups
+        self.dropped = 0
+        self.digests_sent = 0
+        self._groups: Dict[str, _Group] = {}
+        self._overflow = 0
+        self._lock = threading.Lock()
+        self._bot = None
+        self._chat_id: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def alert(self, text: str, key: Optional[str] = None) -> None:
+        """Record an event for the next digest; never blocks on the network."""
+        key = key or fingerprint(text)
+        with self._lock:
+            group = self._groups.get(key)
+            if group is None:
+                if len(self._groups) >= self.max_groups:
+                    self._overflow += 1
+                    return
+                group = self._groups[key] = _Group(text)
+            group.count += 1
+
+    def render(self, groups: List[_Group], overflow: int) -> str:
+        total = sum(g.count for g in groups) + overflow
+        lines = [f"🚨 {total} событий за {self.window:.0f} с:"]
+        for group in sorted(groups, key=lambda g: -g.count):
+            lines.append(f"• ×{group.count} {group.sample[:300]}")
+        if overflow:
+            lines.append(f"• ×{overflow} прочие")
+        text = "\n".join(lines)
+        if len(text) > MAX_MESSAGE_LENGTH:
+            text = text[:MAX_MESSAGE_LENGTH - 1] + "…"
+        return text
+
+    async def flush(self) -> None:
+        """Send one digest of everything recorded since the last flush."""
+        with self._lock:
+            groups, self._groups = list(self._groups.values()), {}
+            overflow, self._overflow = self._overflow, 0
+        if not groups and not overflow:
+            return
+        if self._bot is None or not self._chat_id:
+            self.dropped += sum(g.count for g in groups) + overflow
+            return
+        try:
+            await self._bot.send_message(self._chat_id, self.render(groups, overflow))
+            self.digests_sent += 1
+        except Exception as e:
+            self.dropped += sum(g.count for g in groups) + overflow
+            logger.error("Failed to send admin digest: %s", e)
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.window)
+            await self.flush()
+
+    def start(self, bot, chat_id: Optional[str]) -> None:
+        self._bot = bot
+        self._chat_id = chat_id
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+admin_alerts = AdminAlerts()
@@ -0,0 +1,141 @@
+# vpnbot/api_client.py
+"""Shared HTTP client for the bot's calls to the Django API.
+
+One ``ApiClient`` is created in the ``Application``'s ``post_init`` hook and
+closed in ``post_shutdown``; handlers reach it through
+``context.bot_data["api"]``.  Connections are kept alive and pooled, DNS
+answers are cached, and idempotent requests are retried with jittered
+exponential backoff.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+from time import perf_counter
+from typing import Any, Dict, Optional
+
+import aiohttp
+
+from main.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = frozenset({502, 503, 504})
+
+REQUEST_LATENCY = REGISTRY.histogram(
+    "vpnbot_api_request_duration_seconds", "Calls to VPN_API_URL, retries included",
+    ("method", "route", "status"),
+)
+REQUEST_RETRIES = REGISTRY.counter("vpnbot_api_retries_total", "Retried API attempts", ("method", "route"))
+
+
+def _route(path: str) -> str:
+    # First path segment only: "/subscription/42" -> "subscription", so ids
+    # do not end up in metric labels.
+    return path.lstrip("/").split("/", 1)[0].split("?", 1)[0] or "/"
+
+
+class ApiResponse:
+    """Status and fully read body of an API response."""
+
+    __slots__ = ("status", "body")
+
+    def __init__(self, status: int, body: bytes):
+        self.status = status
+        self.body = body
+
+    def json(self) -> Any:
+        return json.loads(self.body)
+
+
+class ApiClient:
+    def __init__(self, base_url: str, timeout: float = 5, limit: int = 100,
+                 limit_per_host: int = 30, dns_ttl: int = 300,
+                 keepalive_timeout: float = 30, retries: int = 2,
+                 backoff_base: float = 0.1, backoff_max: float = 2.0):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_ttl = dns_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @classmethod
+    def from_env(cls) -> "ApiClient":
+        return cls(
+            base_url=os.getenv("VPN_API_URL", ""),
+            timeout=float(os.getenv("VPN_API_TIMEOUT", "5")),
+            limit=int(os.getenv("VPN_API_POOL_SIZE", "100")),
+            limit_per_host=int(os.getenv("VPN_API_POOL_PER_HOST", "30")),
+            retries=int(os.getenv("VPN_API_RETRIES", "2")),
+        )
+
+    async def start(self) -> None:
+        if self._session is not None:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            use_dns_cache=True,
+            ttl_dns_cache=self.dns_ttl,
+            keepalive_timeout=self.keepalive_timeout,
+        )
+        self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _backoff(self, attempt: int) -> float:
+        # "Full jitter": spreads retries from many updates over the window
+        # instead of having them hit a recovering API in lockstep.
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def request(self, method: str, path: str, *, params: Optional[Dict[str, Any]] = None,
+                      retry: Optional[bool] = None, **kwargs) -> ApiResponse:
+        """Send a request and return its status and body.
+
+        GET requests are retried on connection errors, timeouts and 502/503/504
+        by default; pass ``retry=True`` for other idempotent methods.
+        """
+        if self._session is None:
+            await self.start()
+        if retry is None:
+            retry = method.upper() == "GET"
+        attempts = self.retries + 1 if retry else 1
+        url = f"{self.base_url}{path}"
+        route = _route(path)
+        status = "error"
+        started = perf_counter()
+
+        try:
+            for attempt in range(attempts):
+                last_attempt = attempt == attempts - 1
+                try:
+                    async with self._session.request(method, url, params=params, **kwargs) as response:
+                        body = await response.read()
+                        if response.status not in RETRY_STATUSES or last_attempt:
+                            status = response.status
+                            return ApiResponse(response.status, body)
+                        logger.warning("%s %s returned %s, retrying", method, path, response.status)
+                except asyncio.TimeoutError:
+                    if last_attempt:
+                        raise aiohttp.ClientError(f"{method} {path} timed out after {self.timeout.total} seconds")
+                    logger.warning("%s %s timed out, retrying", method, path)
+                except aiohttp.ClientConnectionError as e:
+                    if last_attempt:
+                        raise
+                    logger.warning("%s %s failed: %s, retrying", method, path, e)
+                REQUEST_RETRIES.labels(method, route).inc()
+                await asyncio.sleep(self._backoff(attempt))
+        finally:
+            REQUEST_LATENCY.labels(method, route, status).observe(perf_counter() - started)
+
+    async def get(self, path: str, params: Optional[Dict[str, Any]] = None, **kwargs) -> ApiResponse:
+        return await self.request("GET", path, params=params, **kwargs)
@@ -1,10 +1,77 @@
+# vpnbot/bot.py
+"""Single entry point for the Telegram bot.
+
+    python -m vpnbot.bot                  # long polling (default)
+    python -m vpnbot.bot --mode webhook   # webhook, served by myproject.asgi
+
+In webhook mode Telegram posts updates to ``/telegram/webhook`` on the same
+ASGI application that serves the Django views, so the bot and the web app
+share one process and event loop.  Run a single worker in that mode: the
+per-user ordering guarantee of ``PerUserUpdateProcessor`` holds within one
+process only.
+"""
+import argparse
 import os
+from typing import Optional
+
+from telegram import Update
+from telegram.ext import Application
+
+from myproject.log import configure_logging
+from vpnbot.dispatch import PerUserUpdateProcessor
+from vpnbot.handlers import handlers, post_init, post_shutdown, post_stop, register_handlers
+
+
+def build_application(token: Optional[str] = None, webhook: bool = False,
+                      base_url: Optional[str] = None,
+                      concurrent_updates: Optional[int] = None) -> Application:
+    """Build the bot ``Application`` with handlers and lifecycle hooks."""
+    token = token or os.getenv("BOT_TOKEN")
+    if concurrent_updates is None:
+        concurrent_updates = int(os.getenv("BOT_CONCURRENT_UPDATES", "64"))
+    if not token:
+        raise ValueError("BOT_TOKEN environment variable not set")
+
+    builder = (
+        Application.builder()
+        .token(token)
+        .post_init(post_init)
+        .post_stop(post_stop)
+        .post_shutdown(post_shutdown)
+        .concurrent_updates(PerUserUpdateProcessor(concurrent_updates))
+    )
+    if base_url:
+        builder = builder.base_url(base_url)
+    if webhook:
+        # Updates are pushed by the webhook view instead of fetched.
+        builder = builder.updater(None)
+
+    application = builder.build()
+    register_handlers(application, handlers)
+    return application
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the VPN shop Telegram bot.")
+    parser.add_argument(
+        "--mode", choices=("polling", "webhook"), default=os.getenv("BOT_MODE", "polling"),
+    )
+    parser.add_argument("--host", default=os.getenv("BOT_WEBHOOK_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("BOT_WEBHOOK_PORT", "8000")))
+    args = parser.parse_args()
+
+    if args.mode == "webhook":
+        import uvicorn
+
+        os.environ["BOT_MODE"] = "webhook"
+        os.environ.setdefault("DJANGO_SETTINGS_MODULE", "myproject.settings")
+        uvicorn.run("myproject.asgi:application", host=args.host, port=args.port, workers=1)
+        return
 
-from aiogram import Bot, Dispatcher, executor
-from handlers import register_handlers
+    configure_logging()
+    application = build_application()
+    application.run_polling(allowed_updates=Update.ALL_TYPES)
 
-bot = Bot(token=os.getenv("BOT_TOKEN"))
 
-dp = Dispatcher(bot)
-register_handlers(dp)
-executor.start_pulling(dp)
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+# vpnbot/broadcast.py
+"""Resumable, rate-limited announcements to every VPNUser.
+
+Recipients are read in keyset-paginated chunks (``pk > checkpoint``) so a
+500k-user broadcast never holds the table in memory, and the checkpoint is
+written to the ``Broadcast`` row after every chunk: after a restart the
+broadcast resumes from the last finished chunk, re-sending at most one
+chunk.  Messages go out through ``MessageSender``, paced by
+``TelegramRateLimiter`` with 429s honoured through ``retry_after``.
+"""
+import asyncio
+import logging
+from typing import List, Tuple
+
+from vpnbot.ratelimit import TelegramRateLimiter
+from vpnbot.sender import MessageSender
+from vpnbot.utils import db_executor, notify_admin
+
+logger = logging.getLogger(__name__)
+
+# The helpers below run on ``db_executor``, which sets Django up first, so
+# models are imported inside them rather than when the bot starts.
+
+
+def create_broadcast(text: str):
+    from main.models import Broadcast
+
+    return Broadcast.objects.create(text=text)
+
+
+def load_broadcast(broadcast_id: int) -> Tuple[str, int, int, int]:
+    """Text and checkpoint (last user pk, sent, failed) of a broadcast."""
+    from main.models import Broadcast
+
+    return tuple(
+        Broadcast.objects.filter(pk=broadcast_id)
+        .values_list("text", "last_user_pk", "sent", "failed")
+        .get()
+    )
+
+
+def pending_broadcast_ids() -> List[int]:
+    from main.models import Broadcast
+
+    return list(
+        Broadcast.objects.exclude(status=Broadcast.STATUS_DONE)
+        .order_by("pk")
+        .values_list("pk", flat=True)
+    )
+
+
+def fetch_recipients(after_pk: int, limit: int) -> List[Tuple[int, str]]:
+    from main.models import VPNUser
+
+    return list(
+        VPNUser.objects.filter(pk__gt=after_pk)
+        .order_by("pk")
+        .values_list("pk", "user_id")[:limit]
+    )
+
+
+def save_checkpoint(broadcast_id: int, last_user_pk: int, sent: int, failed: int,
+                    done: bool = False) -> None:
+    from main.models import Broadcast
+
+    Broadcast.objects.filter(pk=broadcast_id).update(
+        last_user_pk=last_user_pk, sent=sent, failed=failed,
+        status=Broadcast.STATUS_DONE if done else Broadcast.STATUS_RUNNING,
+    )
+
+
+class BroadcastEngine:
+    def __init__(self, bot, limiter: TelegramRateLimiter, chunk_size: int = 200,
+                 concurrency: int = 30, max_attempts: int = 5):
+        self.sender = MessageSender(bot, limiter, concurrency=concurrency, max_attempts=max_attempts)
+        self.chunk_size = chunk_size
+        self._running = set()
+        self._tasks = set()
+
+    async def run(self, broadcast_id: int) -> None:
+        if broadcast_id in self._running:
+            return
+        self._running.add(broadcast_id)
+        try:
+            text, last_pk, sent, failed = await db_executor.run(load_broadcast, broadcast_id)
+            logger.info("Broadcast %s starting after user pk %s", broadcast_id, last_pk)
+
+            while True:
+                chunk = await db_executor.run(fetch_recipients, last_pk, self.chunk_size)
+                if not chunk:
+                    break
+                results = await asyncio.gather(
+                    *(self.sender.send(chat_id, text) for _, chat_id in chunk),
+                    return_exceptions=True,
+                )
+                for (_, chat_id), result in zip(chunk, results):
+                    if isinstance(result, Exception):
+                        logger.error("Broadcast %s to %s failed: %s", broadcast_id, chat_id, result,
+                                     exc_info=result)
+                delivered = sum(result is True for result in results)
+                sent += delivered
+                failed += len(results) - delivered
+                last_pk = chunk[-1][0]
+                await db_executor.run(save_checkpoint, broadcast_id, last_pk, sent, failed)
+
+            await db_executor.run(
+                save_checkpoint, broadcast_id, last_pk, sent, failed, done=True
+            )
+            logger.info("Broadcast %s done: sent=%s failed=%s", broadcast_id, sent, failed)
+        finally:
+            self._running.discard(broadcast_id)
+
+    def start(self, broadcast_id: int) -> None:
+        """Run a broadcast in the background."""
+        task = asyncio.create_task(self.run(broadcast_id), name=f"broadcast-{broadcast_id}")
+        self._tasks.add(task)
+        task.add_done_callback(self._finished)
+
+    def _finished(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        if task.cancelled() or task.exception() is None:
+            return
+        # Nothing awaits the task, so this is the only place its error shows.
+        # The row stays "running" and the broadcast resumes from its last
+        # checkpoint on the next start.
+        logger.error("%s stopped: %s", task.get_name(), task.exception(), exc_info=task.exception())
+        notify_admin(f"Рассылка остановлена ({task.get_name()}): {task.exception()!r}")
+
+    async def resume_pending(self) -> List[int]:
+        """Restart broadcasts interrupted by a shutdown; returns their ids."""
+        broadcast_ids = await db_executor.run(pending_broadcast_ids)
+        for broadcast_id in broadcast_ids:
+            self.start(broadcast_id)
+        return broadcast_ids
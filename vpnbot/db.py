@@ -0,0 +1,97 @@
+# vpnbot/db.py
+"""Run blocking Django ORM calls off the bot's event loop.
+
+The bot's DB helpers are synchronous; awaiting them through ``DBExecutor``
+keeps python-telegram-bot's loop free for other users' updates while a slow
+write is in progress.  The pool is bounded so a burst of payments queues
+instead of opening an unbounded number of DB connections.  ``shutdown``
+closes the current pool; the next ``run`` starts a fresh one, so the
+module-level executor survives an Application being stopped and rebuilt in
+the same process.
+"""
+import asyncio
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from django.db import close_old_connections
+
+
+class DBExecutor:
+    def __init__(self, max_workers: int = 4, setup: Optional[Callable[[], None]] = None):
+        self.max_workers = max_workers
+        # Called in the worker before every job, e.g. to set Django up on
+        # first use; must be cheap once done.
+        self.setup = setup
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.started = 0
+        self.completed = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+        self._lock = threading.Lock()
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        submitted = time.perf_counter()
+        with self._lock:
+            self.queue_depth += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+
+        def call():
+            waited = time.perf_counter() - submitted
+            with self._lock:
+                self.queue_depth -= 1
+                self.started += 1
+                self.wait_time_total += waited
+                self.wait_time_max = max(self.wait_time_max, waited)
+            try:
+                if self.setup is not None:
+                    self.setup()
+                return fn(*args, **kwargs)
+            finally:
+                # Drop connections past CONN_MAX_AGE or broken by the call;
+                # healthy ones stay bound to this worker thread.
+                close_old_connections()
+                with self._lock:
+                    self.completed += 1
+
+        return await asyncio.get_running_loop().run_in_executor(self._executor(), call)
+
+    def _executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="vpnbot-db"
+                )
+            return self._pool
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "queue_depth": self.queue_depth,
+                "max_queue_depth": self.max_queue_depth,
+                "in_flight": self.started - self.completed,
+                "completed": self.completed,
+                "wait_time_avg": self.wait_time_total / self.started if self.started else 0.0,
+                "wait_time_max": self.wait_time_max,
+            }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+
+def offload(executor: DBExecutor, fn: Callable[..., Any]) -> Callable[..., Any]:
+    """Wrap a blocking helper into a coroutine function running on ``executor``."""
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        return await executor.run(fn, *args, **kwargs)
+
+    wrapper.__name__ = wrapper.__qualname__ = f"a{fn.__name__}"
+    return wrapper
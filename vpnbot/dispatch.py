@@ -0,0 +1,59 @@
+# vpnbot/dispatch.py
+"""Concurrent update processing with per-user ordering.
+
+``PerUserUpdateProcessor`` lets many updates run at once while updates
+from the same user (or chat) are handled strictly one after another, in
+arrival order, so one user's slow payment never blocks anybody else.
+"""
+import asyncio
+from typing import Awaitable, Dict, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    def __init__(self, max_concurrent_updates: int = 64, max_pending_updates: Optional[int] = None):
+        # The base semaphore bounds updates admitted (running or waiting on
+        # their user's lock); ours bounds the ones actually running, so a
+        # user with a long backlog cannot occupy every execution slot.
+        super().__init__(max_pending_updates or max_concurrent_updates * 16)
+        self._running = asyncio.BoundedSemaphore(max_concurrent_updates)
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._waiters: Dict[int, int] = {}
+
+    @staticmethod
+    def _key(update: object) -> Optional[int]:
+        if isinstance(update, Update):
+            if update.effective_user:
+                return update.effective_user.id
+            if update.effective_chat:
+                return update.effective_chat.id
+        return None
+
+    async def do_process_update(self, update: object, coroutine: Awaitable) -> None:
+        key = self._key(update)
+        if key is None:
+            async with self._running:
+                await coroutine
+            return
+
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            # asyncio.Lock wakes waiters FIFO, which preserves arrival order.
+            async with lock, self._running:
+                await coroutine
+        finally:
+            self._waiters[key] -= 1
+            if not self._waiters[key]:
+                del self._waiters[key]
+                del self._locks[key]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
@@ -1,16 +1,14 @@
-import asyncio
+import gzip
 import logging
 import os
-from typing import Optional, Dict, Any
+import tempfile
+from typing import Optional, Dict, Any, Tuple
 
 import aiohttp
 import telegram
 from telegram import (
-    InlineKeyboardButton,
     InlineKeyboardMarkup,
-    LabeledPrice,
     Update,
-    WebAppInfo,
 )
 from telegram.ext import (
     Application,
@@ -25,19 +23,45 @@ from telegram.ext import (
 
 from dotenv import load_dotenv
 
-from vpnbot.utils import save_payment_to_db, activate_subscription, notify_admin, get_tariff_by_id
+from main.metrics import REGISTRY
+from vpnbot.alerts import admin_alerts
+from vpnbot.api_client import ApiClient
+from vpnbot.broadcast import BroadcastEngine, create_broadcast
+from vpnbot.metrics import MetricsServer, timed
+from vpnbot.provisioning import ProvisioningWorker
+from vpnbot.ratelimit import TelegramRateLimiter
+from vpnbot.reminders import ReminderScheduler
+from vpnbot.rendering import (
+    ADMIN_KEYBOARD,
+    ADD_SUBSCRIPTION_KEYBOARD,
+    SUPPORT_KEYBOARD,
+    edit_if_changed,
+    forget_rendered,
+    profile_keyboard,
+    profile_renderer,
+    status_keyboard,
+)
+from vpnbot.singleflight import SingleFlight
+from vpnbot.tariffs import tariff_menu
+from vpnbot.utils import aprocess_payment, db_executor, notify_admin, get_tariff_by_id
 
 load_dotenv('.env')
 
-# Configure logging
-logging.basicConfig(
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
-)
 logger = logging.getLogger(__name__)
 
-MINI_APP_URL = os.getenv("MINI_APP_URL", "")
 VPN_API_URL = os.getenv("VPN_API_URL", "")
 ADMIN_CHAT_ID = os.getenv("ADMIN_CHAT_ID", "")
+ADMIN_USER_IDS = {uid.strip() for uid in os.getenv("ADMIN_USER_IDS", "").split(",") if uid.strip()}
+
+
+def _is_admin(update: Update) -> bool:
+    """Admin commands are accepted from the admin chat or listed admin users."""
+    chat = update.effective_chat
+    user = update.effective_user
+    return bool(
+        (chat and ADMIN_CHAT_ID and str(chat.id) == ADMIN_CHAT_ID)
+        or (user and str(user.id) in ADMIN_USER_IDS)
+    )
 
 
 async def _handle_edit_failure(update: Update, context: CallbackContext) -> None:
@@ -49,49 +73,17 @@ async def _handle_edit_failure(update: Update, context: CallbackContext) -> None
             "⚠️ Failed to update message. Please try again."
         )
     except Exception as e:
-        logger.error(f"Error in _handle_edit_failure: {e}")
+        logger.error("Error in _handle_edit_failure: %s", e)
 
 
-async def get_user(user_id: int, timeout: int = 5) -> Optional[Dict[str, Any]]:
+async def get_user(api: ApiClient, user_id: int) -> Optional[Dict[str, Any]]:
     """Retrieve user data from Django API server."""
-    url = f"{VPN_API_URL}/subscription/{user_id}"
-    params = {"user_id": user_id}
-
-    try:
-        timeout_obj = aiohttp.ClientTimeout(total=timeout)
-        async with aiohttp.ClientSession(timeout=timeout_obj) as session:
-            async with session.get(url, params=params) as response:
-                if response.status == 200:
-                    return await response.json()
-                elif response.status == 404:
-                    return None
-                response.raise_for_status()
-                return None
-    except asyncio.TimeoutError:
-        raise aiohttp.ClientError(f"Request timed out after {timeout} seconds")
-    except aiohttp.ClientError as e:
-        raise aiohttp.ClientError(f"Failed to fetch user: {str(e)}")
-
-
-def format_user_data(data: Dict[str, Any]) -> str:
-    """Format user data for display."""
-    traffic_used = float(data.get("trafficUsed", 0)) or 0
-    traffic_limit = float(data.get("trafficLimit", 1)) or 1  # avoid division by zero
-    traffic_percent = (
-        min(100, (traffic_used / traffic_limit) * 100) if traffic_limit else 0
-    )
-
-    progress_blocks = int(traffic_percent / 10)
-    progress_bar = "[" + "■" * progress_blocks + "□" * (10 - progress_blocks) + "]"
-
-    return (
-        f"👤 <b>Имя пользователя:</b> {data.get('username', 'не указано')}\n"
-        f"🔄 <b>Статус:</b> {data.get('userStatus', 'неизвестен')}\n"
-        f"📅 <b>Осталось дней:</b> {data.get('daysLeft', 0)}\n\n"
-        f"📊 <b>Использовано трафика:</b>\n"
-        f"{progress_bar} {traffic_percent:.1f}%\n"
-        f"▸ {traffic_used:.2f} GiB из {traffic_limit:.2f} GiB"
-    )
+    response = await api.get(f"/subscription/{user_id}", params={"user_id": user_id})
+    if response.status == 200:
+        return response.json()
+    elif response.status == 404:
+        return None
+    raise aiohttp.ClientError(f"Failed to fetch user: HTTP {response.status}")
 
 
 async def start(update: Update, context: CallbackContext) -> None:
@@ -104,37 +96,26 @@ async def start(update: Update, context: CallbackContext) -> None:
     user_config = None
 
     try:
-        user_config = await get_user(telegram_user.id)
+        # Double taps and bursts of /start for one user share a single fetch.
+        user_config = await context.bot_data["profiles"].do(
+            telegram_user.id,
+            lambda: get_user(context.bot_data["api"], telegram_user.id),
+        )
     except Exception as e:
-        logger.error(f"Error getting user: {e}")
-
-    return_message = f"👤 Профиль: {telegram_user.full_name}\n\n"
-    buttons = []
-
-    open_config_button = InlineKeyboardButton(
-        "Управлять подпиской",
-        web_app=WebAppInfo(url=f"{MINI_APP_URL}/{telegram_user.id}"),
-    )
-    add_subscription_button = InlineKeyboardButton(
-        " + Добавить подписку", callback_data="replace_msg"
-    )
+        logger.error("Error getting user: %s", e)
 
-    if user_config:
-        buttons.append([open_config_button])
-        return_message += format_user_data(user_config)
-
-    buttons.append([add_subscription_button])
-
-    keyboard = InlineKeyboardMarkup(buttons)
+    return_message = profile_renderer.render(telegram_user.full_name, user_config)
+    keyboard = profile_keyboard(telegram_user.id) if user_config else ADD_SUBSCRIPTION_KEYBOARD
 
     if update.callback_query:
         try:
-            await update.callback_query.edit_message_text(
-                text=return_message, reply_markup=keyboard, parse_mode="HTML"
+            await edit_if_changed(
+                update.callback_query, context.user_data, return_message,
+                reply_markup=keyboard, parse_mode="HTML",
             )
             await update.callback_query.answer()
         except Exception as e:
-            logger.error(f"Error editing message: {e}")
+            logger.error("Error editing message: %s", e)
             await _handle_edit_failure(update, context)
     elif update.message:
         await update.message.reply_text(
@@ -154,33 +135,19 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     context.user_data["last_message_id"] = query.message.message_id
 
     try:
-        await query.edit_message_text(
-            text="💳 Выберите тарифный план для создания нового ключа:",
+        await edit_if_changed(
+            query, context.user_data,
+            "💳 Выберите тарифный план для создания нового ключа:",
             reply_markup=build_keyboard("updated"),
         )
     except telegram.error.BadRequest as e:
-        logger.error(f"BadRequest in button_callback: {e}")
+        logger.error("BadRequest in button_callback: %s", e)
         await _handle_edit_failure(update, context)
 
 
 def build_keyboard(state: Optional[str] = None) -> InlineKeyboardMarkup:
-    """Build dynamic keyboard."""
-    tariffs = [
-        "1 месяц – 178 руб",
-        "3 месяца - 450 руб",
-        "6 месяцев - 690 руб",
-        "12 месяцев - 840 руб",
-    ]
-    buttons = []
-    for tariff in tariffs:
-        buttons.append([InlineKeyboardButton(tariff, callback_data=f"pay:{tariff}")])
-
-    lk_button = InlineKeyboardButton(
-        "Личный кабинет",
-        callback_data="lk",
-    )
-    buttons.append([lk_button])
-    return InlineKeyboardMarkup(buttons)
+    """Tariff keyboard, prebuilt from the tariff registry."""
+    return tariff_menu.keyboard
 
 
 async def handle_new_buttons(
@@ -211,19 +178,14 @@ async def pay_tariff(update: Update, context: CallbackContext) -> None:
         if not query.data:
             return
 
-        selected_tariff = query.data.replace("pay:", "")
-        context.user_data["selected_tariff"] = selected_tariff
+        tariff = tariff_menu.resolve(query.data)
+        if tariff is None:
+            raise ValueError(f"Unknown tariff callback: {query.data}")
+        context.user_data["selected_tariff"] = tariff.id
 
-        price = {
-            "1 месяц – 178 руб": 17800,
-            "3 месяца - 450 руб": 45000,
-            "6 месяцев - 690 руб": 69000,
-            "12 месяцев - 840 руб": 84000,
-        }.get(selected_tariff, 17800)
-
-        title = f"Оплата тарифа: {selected_tariff}"
+        title = f"Оплата тарифа: {tariff.name}"
         description = "Доступ к премиум функциям бота"
-        payload = f"tariff_payment_{update.effective_user.id}"
+        payload = f"tariff_payment_{update.effective_user.id}:{tariff.id}"
         provider_token = os.getenv("PAYMENT_PROVIDER_TOKEN", "")
 
         if not provider_token:
@@ -238,17 +200,18 @@ async def pay_tariff(update: Update, context: CallbackContext) -> None:
             payload=payload,
             provider_token=provider_token,
             currency="RUB",
-            prices=[LabeledPrice(selected_tariff, price)],
+            prices=tariff_menu.prices(tariff),
             start_parameter="tariff_payment",
             need_email=True,
             need_phone_number=False,
         )
 
     except Exception as e:
-        logger.error(f"Error in pay_tariff: {e}", exc_info=True)
+        logger.error("Error in pay_tariff: %s", e, exc_info=True)
         if query.message:
-            await query.edit_message_text(
-                text="⚠️ Произошла ошибка при создании платежа",
+            await edit_if_changed(
+                query, context.user_data,
+                "⚠️ Произошла ошибка при создании платежа",
                 reply_markup=build_keyboard(context.user_data.get("state")),
             )
 
@@ -264,45 +227,60 @@ async def successful_payment(update: Update, context: CallbackContext) -> None:
     user = update.effective_user
 
     try:
-        selected_tariff = context.user_data.get("selected_tariff")
-        # Сохраняем информацию об оплате в БД
-        payment_data = {
-            "user_id": user.id,
-            "username": user.username,
-            "first_name": user.first_name,
-            "amount": payment.total_amount / 100,
-            "tariff": selected_tariff,
-            "payment_date": datetime.now(),
-            "payload": payment.invoice_payload
-        }
-
-        save_payment_to_db(payment_data)
+        # Тариф передаётся в payload инвойса: "tariff_payment_<user_id>:<tariff_id>"
+        _, _, tariff_id = payment.invoice_payload.rpartition(":")
+        selected_tariff = get_tariff_by_id(tariff_id).name
+
+        # Telegram may redeliver the same update; the charge id makes the
+        # payment idempotent.
+        saved_payment, created = await aprocess_payment(
+            user_id=user.id,
+            amount=payment.total_amount / 100,
+            currency=payment.currency,
+            tariff_id=tariff_id,
+            provider_payment_id=(
+                payment.provider_payment_charge_id or payment.telegram_payment_charge_id
+            ),
+            payload=payment.invoice_payload,
+            username=user.username,
+            first_name=user.first_name,
+            last_name=user.last_name,
+        )
+        if not created:
+            logger.info("Duplicate delivery of payment %s", saved_payment.provider_payment_id)
+            return
+        context.bot_data["profiles"].forget(user.id)
+
+        end_date_str = saved_payment.subscription.expires_at.strftime("%d.%m.%Y")
+        text = (
+            f"🎉 Оплата прошла успешно!\n\n"
+            f"Тариф: {selected_tariff}\n"
+            f"Подписка активна до: {end_date_str}\n\n"
+            f"Конфигурация VPN придёт следующим сообщением.\n"
+            f"Спасибо за покупку!"
+        )
         original_message_id = context.user_data.get("last_message_id")
         if original_message_id:
+            forget_rendered(context.user_data, original_message_id)
             await context.bot.edit_message_text(
                 chat_id=user.id,
                 message_id=original_message_id,
-                text=f"🎉 Оплата прошла успешно!\n\n"
-                     f"Тариф: {selected_tariff}\n"
-                     f"Спасибо за покупку!",
+                text=text,
                 reply_markup=build_keyboard("premium_active")
             )
         else:
             await update.message.reply_text(
-                text=f"🎉 Оплата прошла успешно!\n\n"
-                     f"Тариф: {selected_tariff}\n"
-                     f"Подписка активна до: {end_date_str}\n\n"
-                     f"Спасибо за покупку!",
+                text=text,
                 reply_markup=build_keyboard("premium_active")
             )
-
-        await context.bot.send_message(
-            chat_id=user.id,
-            text="Доступна новая подписка!"
-        )
+        # The config job was queued with the payment; woken only now so the
+        # file normally arrives after this reply.
+        provisioning = context.bot_data.get("provisioning")
+        if provisioning is not None:
+            provisioning.wake()
 
     except Exception as e:
-        logger.error(f"Error processing payment: {e}", exc_info=True)
+        logger.error("Error processing payment: %s", e, exc_info=True)
         await context.bot.send_message(
             chat_id=user.id,
             text="⚠️ Произошла ошибка при активации подписки. Пожалуйста, свяжитесь с поддержкой."
@@ -312,76 +290,35 @@ async def successful_payment(update: Update, context: CallbackContext) -> None:
         notify_admin(f"Ошибка активации подписки для пользователя {user.id}: {str(e)}")
 
 
-async def successful_payment(update: Update, context: CallbackContext) -> None:
-    """Обработка успешного платежа"""
-    payment = update.message.successful_payment
-    user_id = update.effective_user.id
-
-    # Сохраняем информацию об оплате в БД
-    save_payment_to_db(
-        user_id=user_id,
-        amount=payment.total_amount/100,
-        currency=payment.currency,
-        payload=payment.invoice_payload
-    )
-
-    # Активируем подписку для пользователя
-    activate_subscription(user_id) # также нужно передать данные платежа
-
-    await update.message.reply_text(
-        "🎉 Оплата прошла успешно! Подписка активирована.\n\n"
-        "Спасибо за покупку!",
-        reply_markup=build_keyboard(context.user_data.get('state', None))
-    )
-
-
 async def show_subscription(update: Update, context: CallbackContext) -> None:
     """Handler for checking VPN status."""
     if not update.message or not update.message.from_user:
         return
 
     try:
-        timeout_obj = aiohttp.ClientTimeout(total=5)
-        async with aiohttp.ClientSession(timeout=timeout_obj) as session:
-            async with session.get(
-                f"{VPN_API_URL}/status",
-                params={"user_id": update.message.from_user.id},
-            ) as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    keyboard = InlineKeyboardMarkup(
-                        [
-                            [
-                                InlineKeyboardButton(
-                                    "Open Management Panel",
-                                    web_app=WebAppInfo(
-                                        url=f"https://your-mini-app.com?user={update.message.from_user.id}"
-                                    ),
-                                )
-                            ]
-                        ]
-                    )
-                    await update.message.reply_text(
-                        f"📊 Your VPN Status:\n\n"
-                        f"👤 User: {data.get('username', 'N/A')}\n"
-                        f"🔒 Status: {data.get('status', 'unknown')}\n"
-                        f"📅 Expires: {data.get('expires_at', 'N/A')}\n"
-                        f"📊 Traffic: {data.get('traffic_used', 0)}/{data.get('traffic_limit', 0)} GB",
-                        reply_markup=keyboard,
-                    )
-                else:
-                    await update.message.reply_text(
-                        "⚠️ Failed to fetch your VPN status. Please try later."
-                    )
+        resp = await context.bot_data["api"].get(
+            "/status", params={"user_id": update.message.from_user.id}
+        )
+        if resp.status == 200:
+            data = resp.json()
+            keyboard = status_keyboard(update.message.from_user.id)
+            await update.message.reply_text(
+                f"📊 Your VPN Status:\n\n"
+                f"👤 User: {data.get('username', 'N/A')}\n"
+                f"🔒 Status: {data.get('status', 'unknown')}\n"
+                f"📅 Expires: {data.get('expires_at', 'N/A')}\n"
+                f"📊 Traffic: {data.get('traffic_used', 0)}/{data.get('traffic_limit', 0)} GB",
+                reply_markup=keyboard,
+            )
+        else:
+            await update.message.reply_text(
+                "⚠️ Failed to fetch your VPN status. Please try later."
+            )
     except Exception as e:
-        logger.error(f"Status check error: {e}")
+        logger.error("Status check error: %s", e)
         if update.message:
             await update.message.reply_text("🔴 Service temporarily unavailable")
-        if ADMIN_CHAT_ID:
-            await context.bot.send_message(
-                ADMIN_CHAT_ID,
-                f"🚨 Status check failed for user {update.message.from_user.id}: {e}",
-            )
+        notify_admin(f"Status check failed for user {update.message.from_user.id}: {e}")
 
 
 async def get_vpn_config(update: Update, context: CallbackContext) -> None:
@@ -390,35 +327,28 @@ async def get_vpn_config(update: Update, context: CallbackContext) -> None:
         return
 
     try:
-        timeout_obj = aiohttp.ClientTimeout(total=5)
-        async with aiohttp.ClientSession(timeout=timeout_obj) as session:
-            async with session.get(
-                f"{VPN_API_URL}/config",
-                params={
-                    "user_id": update.message.from_user.id,
-                    "token": "SECURE_API_TOKEN",
-                },
-            ) as resp:
-                if resp.status == 200:
-                    config = await resp.read()
-                    await update.message.reply_document(
-                        document=config,
-                        filename="yourvpn_config.ovpn",
-                        caption="🔐 Your VPN configuration file",
-                    )
-                else:
-                    await update.message.reply_text(
-                        "⚠️ Failed to generate config. Please try later."
-                    )
+        resp = await context.bot_data["api"].get(
+            "/config",
+            params={
+                "user_id": update.message.from_user.id,
+                "token": "SECURE_API_TOKEN",
+            },
+        )
+        if resp.status == 200:
+            await update.message.reply_document(
+                document=resp.body,
+                filename="yourvpn_config.ovpn",
+                caption="🔐 Your VPN configuration file",
+            )
+        else:
+            await update.message.reply_text(
+                "⚠️ Failed to generate config. Please try later."
+            )
     except Exception as e:
-        logger.error(f"Config generation error: {e}")
+        logger.error("Config generation error: %s", e)
         if update.message:
             await update.message.reply_text("🔴 Configuration service unavailable")
-        if ADMIN_CHAT_ID:
-            await context.bot.send_message(
-                ADMIN_CHAT_ID,
-                f"🚨 Config failed for user {update.message.from_user.id}: {e}",
-            )
+        notify_admin(f"Config failed for user {update.message.from_user.id}: {e}")
 
 
 async def contact_support(update: Update, context: CallbackContext) -> None:
@@ -426,21 +356,12 @@ async def contact_support(update: Update, context: CallbackContext) -> None:
     if not update.message:
         return
 
-    keyboard = InlineKeyboardMarkup(
-        [
-            [
-                InlineKeyboardButton(
-                    "Open Support Chat", url="https://t.me/yourvpn_support"
-                )
-            ]
-        ]
-    )
     await update.message.reply_text(
         "🛠 Need help? Contact our support team:\n\n"
         "📧 Email: support@yourvpn.com\n"
         "🌐 Website: https://yourvpn.com/support\n\n"
         "For urgent issues, reply to this message:",
-        reply_markup=keyboard,
+        reply_markup=SUPPORT_KEYBOARD,
     )
 
 
@@ -449,54 +370,133 @@ async def admin_panel(update: Update, context: CallbackContext) -> None:
     if not update.message:
         return
 
-    keyboard = InlineKeyboardMarkup(
-        [
-            [
-                InlineKeyboardButton(
-                    "Open Admin Dashboard",
-                    web_app=WebAppInfo(url="https://your-mini-app.com/admin"),
-                )
-            ]
-        ]
-    )
     await update.message.reply_text(
         "🛠 Admin Panel:\n\n"
         "/users - List all users\n"
         "/stats - Service statistics\n"
-        "/broadcast - Send announcement",
-        reply_markup=keyboard,
+        "/broadcast - Send announcement\n"
+        "/reload_tariffs - Reload tariffs",
+        reply_markup=ADMIN_KEYBOARD,
+    )
+
+
+async def broadcast_command(update: Update, context: CallbackContext) -> None:
+    """/broadcast <text> - send an announcement to every user."""
+    if not update.message or not _is_admin(update):
+        return
+
+    text = update.message.text.partition(" ")[2].strip()
+    if not text:
+        await update.message.reply_text("Usage: /broadcast <text>")
+        return
+
+    broadcast = await db_executor.run(create_broadcast, text)
+    context.bot_data["broadcasts"].start(broadcast.id)
+    await update.message.reply_text(
+        f"📣 Broadcast #{broadcast.id} started. Progress is checkpointed and "
+        f"resumes automatically after a restart."
+    )
+
+
+def _format_stats(stats: Dict[str, Any]) -> str:
+    revenue = "\n".join(
+        f"  {get_tariff_by_id(tariff).name}: {row['total']} {currency} ({row['count']})"
+        for (tariff, currency), row in sorted(stats["revenue"].items())
+    ) or "  —"
+    return (
+        f"📊 Статистика\n\n"
+        f"👥 Пользователей: {stats['users']}\n"
+        f"✅ Активных подписок: {stats['active']}\n"
+        f"⌛ Истекших: {stats['expired']}\n"
+        f"🕓 Ожидающих: {stats['pending']}\n"
+        f"📶 Трафик: {stats['traffic_used']:.1f} / {stats['traffic_limit']:.1f} GB\n\n"
+        f"💰 Выручка по тарифам:\n{revenue}"
     )
 
 
+async def stats_command(update: Update, context: CallbackContext) -> None:
+    """/stats - service statistics from the incrementally refreshed snapshot."""
+    if not update.message or not _is_admin(update):
+        return
+
+    stats = await db_executor.run(_service_stats)
+    await update.message.reply_text(_format_stats(stats))
+
+
+def _service_stats() -> Dict[str, Any]:
+    from main.stats import service_stats
+
+    return service_stats.get()
+
+
+def _export_users() -> Tuple[Any, int]:
+    from main.stats import write_users_csv
+
+    # Gzipped into a temp file that spills to disk, so neither the query nor
+    # the buffer grows with the user count.
+    out = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    with gzip.GzipFile(fileobj=out, mode="wb") as gz:
+        rows = write_users_csv(gz)
+    out.seek(0)
+    return out, rows
+
+
+async def users_command(update: Update, context: CallbackContext) -> None:
+    """/users - CSV export of all users."""
+    if not update.message or not _is_admin(update):
+        return
+
+    out, rows = await db_executor.run(_export_users)
+    with out:
+        await update.message.reply_document(
+            document=out, filename="users.csv.gz", caption=f"👥 {rows} users"
+        )
+
+
+async def reload_tariffs_command(update: Update, context: CallbackContext) -> None:
+    """/reload_tariffs - re-read the tariff registry without a restart."""
+    if not update.message or not _is_admin(update):
+        return
+
+    version = tariff_menu.reload()
+    lines = "\n".join(
+        f"  {t.id}: {t.name} ({t.duration} дн., {t.traffic_limit} GB)"
+        for t in tariff_menu.registry.all()
+    )
+    await update.message.reply_text(f"🔁 Тарифы обновлены (версия {version}):\n{lines}")
+
+
 async def error_handler(update: object, context: CallbackContext) -> None:
-    """Log errors and send them to admin chat."""
+    """Log errors and report them in the admin digest."""
     logger.error(msg="Exception while handling an update:", exc_info=context.error)
 
     user_info = ""
     if isinstance(update, Update) and update.effective_user:
         user_info = f" for user {update.effective_user.id}"
 
-    if ADMIN_CHAT_ID:
-        await context.bot.send_message(
-            ADMIN_CHAT_ID,
-            f"🚨 Error occurred{user_info}: {context.error}",
-        )
+    notify_admin(f"Error occurred{user_info}: {context.error!r}")
 
 
+# Callbacks are wrapped here, once per process, rather than in
+# register_handlers: the list is shared by every Application built from it.
 handlers = [
-    CommandHandler("start", start),
-    CommandHandler("status", show_subscription),
-    CommandHandler("config", get_vpn_config),
-    CommandHandler("support", contact_support),
-    CommandHandler("admin", admin_panel),
+    CommandHandler("start", timed(start)),
+    CommandHandler("status", timed(show_subscription)),
+    CommandHandler("config", timed(get_vpn_config)),
+    CommandHandler("support", timed(contact_support)),
+    CommandHandler("admin", timed(admin_panel)),
+    CommandHandler("broadcast", timed(broadcast_command)),
+    CommandHandler("stats", timed(stats_command)),
+    CommandHandler("users", timed(users_command)),
+    CommandHandler("reload_tariffs", timed(reload_tariffs_command)),
     MessageHandler(
         filters.TEXT & filters.Regex(r"^Моя подписка$"),
-        show_subscription,
+        timed(show_subscription),
     ),
-    CallbackQueryHandler(button_callback, pattern="^replace_msg$"),
-    CallbackQueryHandler(handle_new_buttons),
-    MessageHandler(filters.SUCCESSFUL_PAYMENT, successful_payment),
-    PreCheckoutQueryHandler(precheckout_callback),
+    CallbackQueryHandler(timed(button_callback), pattern="^replace_msg$"),
+    CallbackQueryHandler(timed(handle_new_buttons)),
+    MessageHandler(filters.SUCCESSFUL_PAYMENT, timed(successful_payment)),
+    PreCheckoutQueryHandler(timed(precheckout_callback)),
 ]
 
 
@@ -508,16 +508,64 @@ def register_handlers(application, handlers):
 
     application.add_error_handler(error_handler)
 
-def main() -> None:
-    """Start the bot."""
-    bot_token = os.getenv("BOT_TOKEN")
-    if not bot_token:
-        raise ValueError("BOT_TOKEN environment variable not set")
-
-    application = Application.builder().token(bot_token).build()
-    register_handlers(application, handlers)
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
-
-
-if __name__ == "__main__":
-    main()
+async def post_init(application: Application) -> None:
+    """Create resources shared by all updates for the lifetime of the bot."""
+    api = ApiClient.from_env()
+    await api.start()
+    application.bot_data["api"] = api
+    admin_alerts.window = float(os.getenv("BOT_ALERT_WINDOW", "30"))
+    admin_alerts.start(application.bot, ADMIN_CHAT_ID)
+    application.bot_data["profiles"] = SingleFlight(
+        ttl=float(os.getenv("PROFILE_CACHE_TTL", "3"))
+    )
+    REGISTRY.stats("vpnbot_profile_singleflight", "Profile API lookups", application.bot_data["profiles"].stats)
+    application.bot_data["rate_limiter"] = TelegramRateLimiter(
+        global_rate=float(os.getenv("BOT_GLOBAL_RATE", "30"))
+    )
+    broadcasts = BroadcastEngine(application.bot, application.bot_data["rate_limiter"])
+    application.bot_data["broadcasts"] = broadcasts
+    await broadcasts.resume_pending()
+
+    provisioning = ProvisioningWorker(application.bot, application.bot_data["rate_limiter"])
+    application.bot_data["provisioning"] = provisioning
+    await provisioning.start()
+
+    reminder_interval = float(os.getenv("BOT_REMINDER_INTERVAL", "600"))
+    if reminder_interval:
+        reminders = ReminderScheduler(
+            application.bot, application.bot_data["rate_limiter"], interval=reminder_interval
+        )
+        application.bot_data["reminders"] = reminders
+        reminders.start()
+
+    # In webhook mode the Django /metrics endpoint already covers the bot.
+    metrics_port = int(os.getenv("BOT_METRICS_PORT", "0"))
+    if metrics_port and os.getenv("BOT_MODE", "polling") != "webhook":
+        server = MetricsServer(os.getenv("BOT_METRICS_HOST", "127.0.0.1"), metrics_port)
+        await server.start()
+        application.bot_data["metrics_server"] = server
+
+
+async def post_stop(application: Application) -> None:
+    """Stop everything that sends through the bot while it can still send.
+
+    ``run_polling`` closes the bot's HTTP client in ``Application.shutdown``,
+    before ``post_shutdown`` runs; the last alert digest goes out here.
+    """
+    reminders = application.bot_data.pop("reminders", None)
+    if reminders is not None:
+        await reminders.stop()
+    provisioning = application.bot_data.pop("provisioning", None)
+    if provisioning is not None:
+        await provisioning.stop()
+    await admin_alerts.stop()
+
+
+async def post_shutdown(application: Application) -> None:
+    metrics_server = application.bot_data.pop("metrics_server", None)
+    if metrics_server is not None:
+        await metrics_server.stop()
+    api = application.bot_data.pop("api", None)
+    if api is not None:
+        await api.close()
+    db_executor.shutdown()
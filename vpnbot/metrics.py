@@ -0,0 +1,67 @@
+# vpnbot/metrics.py
+"""Bot-side instrumentation on top of ``main.metrics``.
+
+Every registered handler callback is timed by ``timed``.  In webhook mode
+the bot shares the Django process, so its metrics appear on the web app's
+``/metrics``; in polling mode ``MetricsServer`` serves the same registry on
+``BOT_METRICS_PORT``.
+"""
+import functools
+import logging
+from time import perf_counter
+from typing import Optional
+
+from aiohttp import web
+
+from main.metrics import CONTENT_TYPE, REGISTRY
+
+logger = logging.getLogger(__name__)
+
+HANDLER_LATENCY = REGISTRY.histogram(
+    "vpnbot_handler_duration_seconds", "Time spent in a handler callback", ("handler", "outcome")
+)
+
+
+def timed(callback):
+    """Wrap an async handler callback to record its latency."""
+    name = getattr(callback, "__name__", type(callback).__name__)
+    ok = HANDLER_LATENCY.labels(name, "ok")
+    error = HANDLER_LATENCY.labels(name, "error")
+
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        started = perf_counter()
+        try:
+            result = await callback(update, context)
+        except BaseException:
+            error.observe(perf_counter() - started)
+            raise
+        ok.observe(perf_counter() - started)
+        return result
+
+    return wrapper
+
+
+class MetricsServer:
+    """Minimal ``GET /metrics`` endpoint for the polling bot."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 9105):
+        self.host = host
+        self.port = port
+        self._runner: Optional[web.AppRunner] = None
+
+    async def _metrics(self, request: web.Request) -> web.Response:
+        return web.Response(body=REGISTRY.exposition().encode(), headers={"Content-Type": CONTENT_TYPE})
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_get("/metrics", self._metrics)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info("Metrics served on http://%s:%s/metrics", self.host, self.port)
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
@@ -0,0 +1,149 @@
+# vpnbot/provisioning.py
+"""Background worker that provisions queued VPN configs and sends them.
+
+Payments only queue a ``ProvisioningJob`` (see ``main.provisioning``).  The
+worker claims due jobs in batches, registers each batch with the node
+backend in a single call, stores the configs and sends every user their
+file through ``MessageSender``.  ``wake()`` lets the payment handler skip
+the idle poll, so a fresh config usually arrives within a second.
+"""
+import asyncio
+import logging
+from time import perf_counter
+from typing import List, Optional
+
+from main.metrics import REGISTRY
+from vpnbot.ratelimit import TelegramRateLimiter
+from vpnbot.sender import MessageSender
+from vpnbot.utils import db_executor, notify_admin
+
+logger = logging.getLogger(__name__)
+
+PROVISIONED = REGISTRY.counter("vpnbot_provisioned_total", "Configs provisioned and attached")
+FAILED = REGISTRY.counter("vpnbot_provisioning_failures_total", "Failed provisioning attempts")
+BATCH_LATENCY = REGISTRY.histogram(
+    "vpnbot_provisioning_batch_duration_seconds", "Node registration call per batch"
+)
+
+CAPTION = "🔐 Ваша VPN-конфигурация готова"
+
+
+def _settings():
+    from main.provisioning import provisioning_settings
+
+    return provisioning_settings()
+
+
+def _backend():
+    from main.provisioning import get_backend
+
+    return get_backend()
+
+
+def _claim(limit, lease):
+    from main.provisioning import claim_jobs
+
+    return claim_jobs(limit, lease)
+
+
+def _complete(jobs, configs):
+    from main.provisioning import complete_jobs
+
+    return complete_jobs(jobs, configs)
+
+
+def _fail(jobs, error):
+    from main.provisioning import fail_jobs
+
+    return fail_jobs(jobs, error)
+
+
+class ProvisioningWorker:
+    def __init__(self, bot, limiter: TelegramRateLimiter, idle_interval: float = 5,
+                 concurrency: int = 30):
+        self.sender = MessageSender(bot, limiter, concurrency=concurrency)
+        self.idle_interval = idle_interval
+        self.backend = None
+        self.batch_size = 100
+        self.lease = 300.0
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def wake(self) -> None:
+        """Look for new jobs now instead of at the next idle poll."""
+        self._wake.set()
+
+    async def run_once(self) -> int:
+        """Claim and process one batch of due jobs; returns how many were claimed."""
+        jobs = await db_executor.run(_claim, self.batch_size, self.lease)
+        step = max(1, self.backend.max_batch)
+        for start in range(0, len(jobs), step):
+            await self._process(jobs[start:start + step])
+        return len(jobs)
+
+    async def _process(self, jobs: List) -> None:
+        started = perf_counter()
+        try:
+            configs = await self.backend.register([job.peer for job in jobs])
+        except Exception as e:
+            logger.error("Registering %s peers failed: %s", len(jobs), e, exc_info=True)
+            await self._fail(jobs, str(e) or type(e).__name__)
+            return
+        finally:
+            BATCH_LATENCY.observe(perf_counter() - started)
+
+        deliveries = await db_executor.run(_complete, jobs, configs)
+        PROVISIONED.inc(len(deliveries))
+        missing = [job for job in jobs if job.peer.subscription_id not in configs]
+        if missing:
+            await self._fail(missing, "not registered by the node")
+        await asyncio.gather(
+            *(
+                self.sender.send_document(
+                    delivery.chat_id, delivery.config.encode(),
+                    filename=f"{delivery.vpn_username}.conf", caption=CAPTION,
+                )
+                for delivery in deliveries
+            )
+        )
+
+    async def _fail(self, jobs: List, error: str) -> None:
+        FAILED.inc(len(jobs))
+        exhausted = await db_executor.run(_fail, jobs, error)
+        for job in exhausted:
+            notify_admin(f"Не удалось выдать конфигурацию {job.peer.vpn_username}: {error}")
+
+    async def _loop(self) -> None:
+        while True:
+            self._wake.clear()
+            try:
+                claimed = await self.run_once()
+            except Exception as e:
+                logger.error("Provisioning run failed: %s", e, exc_info=True)
+                claimed = 0
+            if claimed < self.batch_size:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.idle_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        options = await db_executor.run(_settings)
+        self.batch_size = options["BATCH_SIZE"]
+        self.lease = options["LEASE"]
+        if self.backend is None:
+            self.backend = await db_executor.run(_backend)
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.backend is not None:
+            await self.backend.close()
@@ -0,0 +1,66 @@
+# vpnbot/ratelimit.py
+"""Token-bucket pacing for outgoing Telegram messages.
+
+Telegram allows roughly 30 messages per second across all chats and about
+one message per second to a single chat; exceeding either gets 429 errors
+with a ``retry_after``.  ``TelegramRateLimiter`` enforces both before each
+send and can be paused globally when a 429 arrives anyway.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """Wait until one token is available and take it."""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._blocked_until:
+                    await asyncio.sleep(self._blocked_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        """Hand out no tokens for ``seconds`` (e.g. after a 429)."""
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+        self._tokens = 0
+
+
+class TelegramRateLimiter:
+    def __init__(self, global_rate: float = 30, per_chat_rate: float = 1, max_chats: int = 10000):
+        self.global_bucket = TokenBucket(global_rate)
+        self.per_chat_rate = per_chat_rate
+        self.max_chats = max_chats
+        self._chats: "OrderedDict[Hashable, TokenBucket]" = OrderedDict()
+
+    async def acquire(self, chat_id: Hashable) -> None:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            bucket = self._chats[chat_id] = TokenBucket(self.per_chat_rate, capacity=1)
+            if len(self._chats) > self.max_chats:
+                # Oldest buckets belong to chats not messaged for a while,
+                # so they would be full again anyway.
+                self._chats.popitem(last=False)
+        else:
+            self._chats.move_to_end(chat_id)
+        await bucket.acquire()
+        await self.global_bucket.acquire()
+
+    def pause(self, seconds: float) -> None:
+        self.global_bucket.pause(seconds)
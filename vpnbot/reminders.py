@@ -0,0 +1,107 @@
+# vpnbot/reminders.py
+"""Expiry and traffic reminders, sent from the bot's event loop.
+
+``ReminderScheduler`` wakes up every ``interval`` seconds and walks each
+reminder kind in keyset chunks (see ``main.reminders``).  A chunk is written
+to the notification ledger before it is sent, so a restart never repeats a
+reminder; at worst the reminders of one chunk are lost.  Messages go out
+through ``MessageSender`` and so share the bot's rate limits.
+"""
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from vpnbot.ratelimit import TelegramRateLimiter
+from vpnbot.sender import MessageSender
+from vpnbot.tariffs import tariff_menu
+from vpnbot.utils import db_executor
+
+logger = logging.getLogger(__name__)
+
+# One per reminder kind, in the order they are processed.
+TEMPLATES = {
+    "expires_3d": "⏳ Подписка {vpn_username} истекает через 3 дня ({expires}). "
+                  "Продлите её, чтобы не потерять доступ.",
+    "expires_1d": "⏰ Подписка {vpn_username} истекает завтра ({expires}). "
+                  "Продлите её, чтобы не потерять доступ.",
+    "traffic_80": "📶 Использовано 80% трафика: {used:.1f} из {limit:.0f} GB.",
+    "traffic_100": "🚫 Лимит трафика исчерпан: {used:.1f} из {limit:.0f} GB. "
+                   "Выберите тариф, чтобы продолжить.",
+}
+
+
+def _due(kind, now, after, limit):
+    from main.reminders import due_reminders
+
+    return due_reminders(kind, now, after, limit)
+
+
+def _record(kind, subscription_ids):
+    from main.reminders import record_sent
+
+    record_sent(kind, subscription_ids)
+
+
+def render(kind: str, reminder) -> str:
+    return TEMPLATES[kind].format(
+        vpn_username=reminder.vpn_username,
+        expires=reminder.expires_at.strftime("%d.%m.%Y"),
+        used=reminder.traffic_used,
+        limit=reminder.traffic_limit,
+    )
+
+
+class ReminderScheduler:
+    def __init__(self, bot, limiter: TelegramRateLimiter, interval: float = 600,
+                 chunk_size: int = 500, concurrency: int = 30):
+        self.sender = MessageSender(bot, limiter, concurrency=concurrency)
+        self.interval = interval
+        self.chunk_size = chunk_size
+        self._task: Optional[asyncio.Task] = None
+
+    async def run_once(self) -> Dict[str, int]:
+        """Send every due reminder once; returns the count sent per kind."""
+        now = datetime.now(timezone.utc)
+        sent = {}
+        for kind in TEMPLATES:
+            sent[kind] = 0
+            cursor = None
+            while True:
+                chunk, cursor = await db_executor.run(_due, kind, now, cursor, self.chunk_size)
+                if not chunk:
+                    break
+                await db_executor.run(_record, kind, [r.subscription_id for r in chunk])
+                results = await asyncio.gather(
+                    *(
+                        self.sender.send(r.chat_id, render(kind, r), reply_markup=tariff_menu.keyboard)
+                        for r in chunk
+                    )
+                )
+                sent[kind] += sum(results)
+                if cursor is None:
+                    break
+        if any(sent.values()):
+            logger.info("Reminders sent: %s", sent)
+        return sent
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error("Reminder run failed: %s", e, exc_info=True)
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
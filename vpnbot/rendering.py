@@ -0,0 +1,153 @@
+# vpnbot/rendering.py
+"""Cached message texts and keyboards for the bot's handlers.
+
+Static keyboards are built once at import; Telegram objects are immutable,
+so they are shared between updates.  Per-user keyboards and rendered
+profile messages are memoized, the latter keyed by the ``version`` field of
+the subscription API payload.  ``edit_if_changed`` remembers what each
+message currently shows and skips edits that would not change it, saving
+the round-trip that Telegram answers with "message is not modified".
+"""
+import logging
+import os
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, WebAppInfo
+from telegram.error import BadRequest
+
+from main.lru import LRUCache
+from main.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+MINI_APP_URL = os.getenv("MINI_APP_URL", "")
+
+# How many recent messages per user edit_if_changed remembers.
+TRACKED_MESSAGES = 8
+
+# "[■■■□□□□□□□]" for every filled block count.
+PROGRESS_BARS = tuple("[" + "■" * n + "□" * (10 - n) + "]" for n in range(11))
+
+ADD_SUBSCRIPTION_BUTTON = InlineKeyboardButton(" + Добавить подписку", callback_data="replace_msg")
+ADD_SUBSCRIPTION_KEYBOARD = InlineKeyboardMarkup([[ADD_SUBSCRIPTION_BUTTON]])
+
+SUPPORT_KEYBOARD = InlineKeyboardMarkup(
+    [[InlineKeyboardButton("Open Support Chat", url="https://t.me/yourvpn_support")]]
+)
+ADMIN_KEYBOARD = InlineKeyboardMarkup(
+    [[
+        InlineKeyboardButton(
+            "Open Admin Dashboard",
+            web_app=WebAppInfo(url="https://your-mini-app.com/admin"),
+        )
+    ]]
+)
+
+
+@lru_cache(maxsize=10000)
+def profile_keyboard(user_id: int) -> InlineKeyboardMarkup:
+    """Keyboard under the profile of a user with a subscription."""
+    return InlineKeyboardMarkup(
+        [
+            [
+                InlineKeyboardButton(
+                    "Управлять подпиской",
+                    web_app=WebAppInfo(url=f"{MINI_APP_URL}/{user_id}"),
+                )
+            ],
+            [ADD_SUBSCRIPTION_BUTTON],
+        ]
+    )
+
+
+@lru_cache(maxsize=10000)
+def status_keyboard(user_id: int) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(
+        [[
+            InlineKeyboardButton(
+                "Open Management Panel",
+                web_app=WebAppInfo(url=f"https://your-mini-app.com?user={user_id}"),
+            )
+        ]]
+    )
+
+
+def format_user_data(data: Dict[str, Any]) -> str:
+    """Format user data for display."""
+    traffic_used = float(data.get("trafficUsed", 0)) or 0
+    traffic_limit = float(data.get("trafficLimit", 1)) or 1  # avoid division by zero
+    traffic_percent = (
+        min(100, (traffic_used / traffic_limit) * 100) if traffic_limit else 0
+    )
+    progress_bar = PROGRESS_BARS[int(traffic_percent / 10)]
+
+    return (
+        f"👤 <b>Имя пользователя:</b> {data.get('username', 'не указано')}\n"
+        f"🔄 <b>Статус:</b> {data.get('userStatus', 'неизвестен')}\n"
+        f"📅 <b>Осталось дней:</b> {data.get('daysLeft', 0)}\n\n"
+        f"📊 <b>Использовано трафика:</b>\n"
+        f"{progress_bar} {traffic_percent:.1f}%\n"
+        f"▸ {traffic_used:.2f} GiB из {traffic_limit:.2f} GiB"
+    )
+
+
+class ProfileRenderer:
+    """Memoizes profile messages by (full name, subscription version)."""
+
+    def __init__(self, maxsize: int = 10000):
+        self._messages = LRUCache(maxsize=maxsize, ttl=float("inf"))
+
+    def render(self, full_name: str, data: Optional[Dict[str, Any]]) -> str:
+        header = f"👤 Профиль: {full_name}\n\n"
+        if not data:
+            return header
+        version = data.get("version")
+        if version is None:
+            # Payloads from an older API carry no version: render every time.
+            return header + format_user_data(data)
+        key = (full_name, data.get("userId"), version)
+        text = self._messages.get(key)
+        if text is None:
+            text = header + format_user_data(data)
+            self._messages.set(key, text)
+        return text
+
+    def stats(self) -> Dict[str, int]:
+        cache = self._messages
+        return {"size": len(cache), "hits": cache.hits, "misses": cache.misses}
+
+
+profile_renderer = ProfileRenderer(maxsize=int(os.getenv("BOT_RENDER_CACHE_SIZE", "10000")))
+REGISTRY.stats("vpnbot_profile_render_cache", "Rendered profile cache", profile_renderer.stats)
+
+
+async def edit_if_changed(query, user_data: Dict[str, Any], text: str,
+                          reply_markup: Optional[InlineKeyboardMarkup] = None,
+                          parse_mode: Optional[str] = None) -> bool:
+    """Edit the callback's message unless it already shows this content.
+
+    Returns whether an edit was sent.  What each message shows is kept in
+    ``user_data``, so it is only known for messages this process rendered.
+    """
+    message = query.message
+    rendered = user_data.setdefault("rendered", {})
+    content = (text, reply_markup, parse_mode)
+    key = message.message_id if message else query.inline_message_id
+    if rendered.get(key) == content:
+        return False
+    try:
+        await query.edit_message_text(text=text, reply_markup=reply_markup, parse_mode=parse_mode)
+    except BadRequest as e:
+        if "not modified" not in str(e).lower():
+            raise
+    rendered.pop(key, None)
+    rendered[key] = content
+    while len(rendered) > TRACKED_MESSAGES:
+        del rendered[next(iter(rendered))]
+    return True
+
+
+def forget_rendered(user_data: Dict[str, Any], message_id) -> None:
+    """Drop what is known about a message edited without ``edit_if_changed``."""
+    user_data.get("rendered", {}).pop(message_id, None)
@@ -0,0 +1,76 @@
+# vpnbot/sender.py
+"""Rate-limited delivery of outgoing messages to many chats.
+
+Shared by broadcasts, reminders and config delivery: every send waits for
+the per-chat and global token buckets, a 429 pauses all senders for its
+``retry_after``, blocked or deleted chats count as failures without
+retries, and network errors are retried with backoff.  Any other Telegram
+error fails that one message.
+"""
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional
+
+from telegram import InlineKeyboardMarkup
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TelegramError
+
+from myproject.log import SAMPLED
+from vpnbot.ratelimit import TelegramRateLimiter
+
+logger = logging.getLogger(__name__)
+
+
+def _seconds(value) -> float:
+    # RetryAfter.retry_after is an int in older python-telegram-bot releases
+    # and a timedelta in newer ones.
+    return value.total_seconds() if hasattr(value, "total_seconds") else float(value)
+
+
+class MessageSender:
+    def __init__(self, bot, limiter: TelegramRateLimiter, concurrency: int = 30,
+                 max_attempts: int = 5):
+        self.bot = bot
+        self.limiter = limiter
+        self.max_attempts = max_attempts
+        self._slots = asyncio.Semaphore(concurrency)
+
+    async def send(self, chat_id, text: str,
+                   reply_markup: Optional[InlineKeyboardMarkup] = None) -> bool:
+        """Send one message; returns whether it was delivered."""
+        return await self._deliver(
+            chat_id, lambda: self.bot.send_message(chat_id=chat_id, text=text, reply_markup=reply_markup)
+        )
+
+    async def send_document(self, chat_id, document: bytes, filename: str,
+                            caption: Optional[str] = None) -> bool:
+        """Send one file; returns whether it was delivered."""
+        return await self._deliver(
+            chat_id,
+            lambda: self.bot.send_document(
+                chat_id=chat_id, document=document, filename=filename, caption=caption
+            ),
+        )
+
+    async def _deliver(self, chat_id, call: Callable[[], Awaitable]) -> bool:
+        async with self._slots:
+            for attempt in range(self.max_attempts):
+                await self.limiter.acquire(chat_id)
+                try:
+                    await call()
+                    return True
+                except RetryAfter as e:
+                    # Flood control is global for the bot: stop everyone.
+                    retry_after = _seconds(e.retry_after)
+                    logger.warning("Hit flood control, pausing %ss", retry_after)
+                    self.limiter.pause(retry_after)
+                except (Forbidden, BadRequest) as e:
+                    # Blocked the bot, deactivated, chat not found: not retryable.
+                    logger.info("Message to %s failed: %s", chat_id, e, extra=SAMPLED)
+                    return False
+                except NetworkError as e:
+                    logger.warning("Message to %s network error: %s", chat_id, e)
+                    await asyncio.sleep(min(30, 2 ** attempt))
+                except TelegramError as e:
+                    logger.warning("Message to %s failed: %s", chat_id, e)
+                    return False
+            return False
@@ -0,0 +1,62 @@
+# vpnbot/singleflight.py
+"""Request coalescing for the bot's backend fetches.
+
+Concurrent ``do()`` calls for the same key share one in-flight task, and
+its result is kept for ``ttl`` seconds, so a burst of ``/start`` and ``lk``
+updates for one user costs at most one backend call per window.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    def __init__(self, ttl: float = 3.0, maxsize: int = 10000):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.coalesced = 0
+        self.calls = 0
+        self._results: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Return ``fn()``'s result for ``key``, sharing it with concurrent callers."""
+        cached = self._results.get(key)
+        if cached is not None:
+            if cached[1] > time.monotonic():
+                self.hits += 1
+                return cached[0]
+            del self._results[key]
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.calls += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+        else:
+            self.coalesced += 1
+        # shield: one caller being cancelled must not cancel the shared fetch.
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Task) -> None:
+        # A task detached by forget() must not repopulate the cache.
+        current = self._inflight.get(key) is task
+        if current:
+            del self._inflight[key]
+        if not current or task.cancelled() or task.exception() is not None or self.ttl <= 0:
+            return
+        self._results[key] = (task.result(), time.monotonic() + self.ttl)
+        self._results.move_to_end(key)
+        while len(self._results) > self.maxsize:
+            self._results.popitem(last=False)
+
+    def forget(self, key: Hashable) -> None:
+        """Drop the cached result so the next call goes to the backend."""
+        self._results.pop(key, None)
+        self._inflight.pop(key, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {"calls": self.calls, "hits": self.hits, "coalesced": self.coalesced}
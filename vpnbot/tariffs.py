@@ -0,0 +1,75 @@
+# vpnbot/tariffs.py
+"""Telegram objects precomputed from the tariff registry.
+
+The tariff keyboard, the invoice ``LabeledPrice`` lists and the
+``callback_data`` → tariff index are built once per registry version, so a
+button press is resolved by a single dict lookup.  Telegram objects are
+immutable, which makes sharing them between updates safe.
+"""
+from typing import Dict, List, NamedTuple, Optional
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, LabeledPrice
+
+from main.tariffs import Tariff, TariffRegistry, tariffs
+
+CALLBACK_PREFIX = "pay:"
+
+
+class _Menu(NamedTuple):
+    version: int
+    keyboard: InlineKeyboardMarkup
+    prices: Dict[str, List[LabeledPrice]]
+    index: Dict[str, Tariff]
+
+
+class TariffMenu:
+    def __init__(self, registry: TariffRegistry):
+        self.registry = registry
+        self._menu = self._build()
+
+    def _build(self) -> _Menu:
+        version = self.registry.version
+        all_tariffs = self.registry.all()
+        buttons = [
+            [InlineKeyboardButton(t.name, callback_data=CALLBACK_PREFIX + t.id)]
+            for t in all_tariffs
+        ]
+        buttons.append([InlineKeyboardButton("Личный кабинет", callback_data="lk")])
+        index = {}
+        for t in all_tariffs:
+            # Buttons sent before tariff ids were used carry the display name.
+            index[CALLBACK_PREFIX + t.name] = t
+            index[CALLBACK_PREFIX + t.id] = t
+        return _Menu(
+            version=version,
+            keyboard=InlineKeyboardMarkup(buttons),
+            prices={t.id: [LabeledPrice(t.name, t.price)] for t in all_tariffs},
+            index=index,
+        )
+
+    @property
+    def _current(self) -> _Menu:
+        menu = self._menu
+        if menu.version != self.registry.version:
+            menu = self._menu = self._build()
+        return menu
+
+    @property
+    def keyboard(self) -> InlineKeyboardMarkup:
+        return self._current.keyboard
+
+    def resolve(self, callback_data: Optional[str]) -> Optional[Tariff]:
+        """Tariff for a ``pay:<id>`` callback, ``None`` if unknown."""
+        return self._current.index.get(callback_data)
+
+    def prices(self, tariff: Tariff) -> List[LabeledPrice]:
+        return self._current.prices[tariff.id]
+
+    def reload(self) -> int:
+        """Re-read the registry and rebuild; returns the registry version."""
+        version = self.registry.reload()
+        self._menu = self._build()
+        return version
+
+
+tariff_menu = TariffMenu(tariffs)
@@ -1,74 +1,61 @@
 # vpnbot/utils.py
-from datetime import datetime, timedelta
+from datetime import timedelta
+import hashlib
 import logging
-from typing import Optional, Dict, Any
+import os
+import threading
+from typing import TYPE_CHECKING, Optional, Dict, Any, Tuple
+from django.db import IntegrityError, transaction
 from django.utils import timezone
 
-import os
-import sys
-import django
-from django.conf import settings
+from vpnbot.alerts import admin_alerts
+from vpnbot.db import DBExecutor, offload
+from main.metrics import REGISTRY
+from main.tariffs import Tariff, tariffs
 
-# Добавляем корневую директорию проекта
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if TYPE_CHECKING:
+    from main.models import Payment, Subscription, VPNUser
 
-# Настраиваем Django только если он еще не настроен
-if not settings.configured:
-    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myproject.settings')
-    django.setup()
+logger = logging.getLogger(__name__)
 
-from main.models import VPNUser, Subscription, Payment
+_django_ready = False
+_django_lock = threading.Lock()
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
 
-# Tariff mapping with fallback
-TARIFFS = {
-    "1month": {
-        "name": "1 месяц – 178 руб",
-        "duration": 30,
-        "price": 17800,
-        "traffic_limit": 100  # GB
-    },
-    "3months": {
-        "name": "3 месяца - 450 руб",
-        "duration": 90,
-        "price": 45000,
-        "traffic_limit": 300
-    },
-    "6months": {
-        "name": "6 месяцев - 690 руб",
-        "duration": 180,
-        "price": 69000,
-        "traffic_limit": 600
-    },
-    "12months": {
-        "name": "12 месяцев - 840 руб",
-        "duration": 365,
-        "price": 84000,
-        "traffic_limit": 1200
-    }
-}
-
-def get_tariff_by_id(tariff_id: str) -> Dict[str, Any]:
-    """Safely returns tariff details by ID with fallback to default 1month tariff"""
-    try:
-        tariff_id = tariff_id.lower()
-        if tariff_id not in TARIFFS:
-            logger.warning(f"Unknown tariff ID: {tariff_id}. Using default.")
-            tariff_id = "1month"
-        return TARIFFS[tariff_id]
-    except Exception as e:
-        logger.error(f"Error getting tariff: {e}", exc_info=True)
-        return TARIFFS["1month"]
+def ensure_django() -> None:
+    """Set Django up on first DB access.
+
+    Importing the bot stays cheap: models, apps and settings load only when
+    the first ORM helper runs.  The bot process uses the slim
+    ``myproject.settings_bot`` unless ``DJANGO_SETTINGS_MODULE`` says
+    otherwise; inside the web process Django is already set up.
+    """
+    global _django_ready
+    if _django_ready:
+        return
+    with _django_lock:
+        if _django_ready:
+            return
+        from django.apps import apps
+
+        if not apps.ready:
+            import django
+
+            os.environ.setdefault("DJANGO_SETTINGS_MODULE", "myproject.settings_bot")
+            django.setup()
+        _django_ready = True
+
+
+def get_tariff_by_id(tariff_id: str) -> Tariff:
+    """Returns tariff details by ID with fallback to default 1month tariff"""
+    return tariffs.get(tariff_id)
 
 def get_or_create_user(user_id: int, username: str = None,
-                      first_name: str = None, last_name: str = None) -> VPNUser:
+                      first_name: str = None, last_name: str = None) -> "VPNUser":
     """Get or create VPNUser with telegram user data"""
+    ensure_django()
+    from main.models import VPNUser
+
     try:
         user, created = VPNUser.objects.get_or_create(
             user_id=str(user_id),
@@ -79,91 +66,120 @@ def get_or_create_user(user_id: int, username: str = None,
             }
         )
         if created:
-            logger.info(f"Created new VPNUser: {user}")
+            logger.info("Created new VPNUser: %s", user)
         return user
     except Exception as e:
-        logger.error(f"Error getting/creating user: {e}", exc_info=True)
+        logger.error("Error getting/creating user: %s", e, exc_info=True)
         raise
 
-def save_payment_to_db(user_id: int, amount: float, currency: str,
-                      tariff_id: str, payload: str = None) -> Payment:
-    """Save payment information to database"""
+def vpn_username_for(user_id: int, provider_payment_id: str) -> str:
+    """Unique VPN username of the subscription bought by a payment.
+
+    Derived from the payment, so every purchase gets its own name (several
+    on the same day included) and a redelivered payment collides on the
+    unique ``vpn_username`` like it does on ``provider_payment_id``.
+    """
+    digest = hashlib.sha256(provider_payment_id.encode()).hexdigest()[:12]
+    return f"vpnuser_{user_id}_{digest}"
+
+def process_payment(user_id: int, amount: float, currency: str, tariff_id: str,
+                    provider_payment_id: str, payload: str = None,
+                    username: str = None, first_name: str = None,
+                    last_name: str = None) -> Tuple["Payment", bool]:
+    """Record a successful payment and its active subscription atomically.
+
+    Idempotent on ``provider_payment_id``: a redelivered payment returns the
+    already stored ``Payment`` with ``created=False`` instead of creating a
+    second subscription.  The VPN config is not generated here: a
+    provisioning job is queued in the same transaction and the bot's
+    ``ProvisioningWorker`` delivers the config when the node has it.
+    """
+    ensure_django()
+    from main.models import Payment, Subscription
+    from main.provisioning import enqueue
+
+    existing = Payment.objects.select_related("subscription").filter(
+        provider_payment_id=provider_payment_id
+    ).first()
+    if existing:
+        return existing, False
+
+    tariff = get_tariff_by_id(tariff_id)
     try:
-        tariff = get_tariff_by_id(tariff_id)
-        user = get_or_create_user(user_id)
-
-        # Create new subscription
-        subscription = Subscription.objects.create(
-            user=user,
-            vpn_username=f"vpnuser_{user_id}_{datetime.now().strftime('%Y%m%d')}",
-            status=Subscription.STATUS_PENDING,
-            tariff=tariff_id,
-            expires_at=timezone.now() + timedelta(days=tariff['duration']),
-            traffic_limit=tariff['traffic_limit']
-        )
-
-        # Create payment record
-        payment = Payment.objects.create(
-            subscription=subscription,
-            amount=amount,
-            currency=currency,
-            payload=payload
-        )
+        with transaction.atomic():
+            user = get_or_create_user(user_id, username, first_name, last_name)
+            subscription = Subscription(
+                user=user,
+                vpn_username=vpn_username_for(user_id, provider_payment_id),
+                status=Subscription.STATUS_ACTIVE,
+                tariff=tariff.id,
+                expires_at=timezone.now() + timedelta(days=tariff.duration),
+                traffic_limit=tariff.traffic_limit
+            )
+            subscription.save()
+            enqueue(subscription)
+
+            payment = Payment.objects.create(
+                subscription=subscription,
+                amount=amount,
+                currency=currency,
+                provider_payment_id=provider_payment_id,
+                payload=payload
+            )
+    except IntegrityError:
+        # A concurrent delivery of the same payment committed first; the
+        # unique constraint rolled back our subscription with it.
+        logger.info("Payment %s already processed concurrently", provider_payment_id)
+        return Payment.objects.select_related("subscription").get(
+            provider_payment_id=provider_payment_id
+        ), False
+
+    logger.info("Payment saved: %s for user %s", payment.id, user_id)
+    return payment, True
+
+def activate_subscription(payment_id: int) -> Optional["Subscription"]:
+    """Activate subscription after successful payment and queue its config"""
+    ensure_django()
+    from main.models import Payment, Subscription
+    from main.provisioning import enqueue
 
-        logger.info(f"Payment saved: {payment.id} for user {user_id}")
-        return payment
-
-    except Exception as e:
-        logger.error(f"Error saving payment: {e}", exc_info=True)
-        raise
-
-def activate_subscription(payment_id: int) -> Optional[Subscription]:
-    """Activate subscription after successful payment"""
     try:
-        payment = Payment.objects.get(id=payment_id)
+        payment = Payment.objects.select_related("subscription").get(id=payment_id)
         subscription = payment.subscription
 
-        # Update subscription status
         subscription.status = Subscription.STATUS_ACTIVE
-        subscription.save()
+        with transaction.atomic():
+            subscription.save(update_fields=["status", "updated_at"])
+            enqueue(subscription)
 
-        # Generate VPN config (placeholder - implement your actual VPN setup)
-        subscription.vpn_config = generate_vpn_config(subscription)
-        subscription.save()
-
-        logger.info(f"Subscription activated: {subscription.id}")
+        logger.info("Subscription activated: %s", subscription.id)
         return subscription
 
     except Payment.DoesNotExist:
-        logger.error(f"Payment not found: {payment_id}")
+        logger.error("Payment not found: %s", payment_id)
     except Exception as e:
-        logger.error(f"Error activating subscription: {e}", exc_info=True)
+        logger.error("Error activating subscription: %s", e, exc_info=True)
     return None
 
-def generate_vpn_config(subscription: Subscription) -> str:
-    """Generate VPN configuration for user (placeholder implementation)"""
-    # Replace with your actual VPN config generation logic
-    return f"""<VPN config for {subscription.vpn_username}>
-# Expires: {subscription.expires_at.date()}
-# Traffic limit: {subscription.traffic_limit}GB"""
-
 def notify_admin(message: str, chat_id: str = None) -> bool:
-    """Send notification to admin"""
-    try:
-        if not message:
-            raise ValueError("Empty message")
-
-        # Implement your actual notification logic
-        # Example: send_telegram_message(chat_id or ADMIN_CHAT_ID, message)
-        logger.info(f"Admin notification: {message[:100]}...")
-        return True
-
-    except Exception as e:
-        logger.error(f"Error notifying admin: {e}", exc_info=True)
+    """Queue an alert for the next admin digest (see vpnbot.alerts).
+
+    Never blocks: identical alerts within a window are grouped into one
+    Telegram message.  ``chat_id`` is accepted for compatibility; digests go
+    to the configured admin chat.
+    """
+    if not message:
+        logger.error("Empty admin notification")
         return False
+    logger.warning("Admin notification: %s", message[:100])
+    admin_alerts.alert(message)
+    return True
 
 def check_subscription_status(user_id: int) -> Dict[str, Any]:
     """Check user's active subscription status"""
+    ensure_django()
+    from main.models import Subscription, VPNUser
+
     try:
         user = VPNUser.objects.get(user_id=str(user_id))
         active_subs = user.subscriptions.filter(
@@ -186,5 +202,16 @@ def check_subscription_status(user_id: int) -> Dict[str, Any]:
     except VPNUser.DoesNotExist:
         return {'has_active': False}
     except Exception as e:
-        logger.error(f"Error checking subscription: {e}", exc_info=True)
+        logger.error("Error checking subscription: %s", e, exc_info=True)
         return {'error': str(e)}
+
+
+# Async variants for the bot's handlers: the ORM work runs on a bounded
+# thread pool so it never blocks the event loop.
+db_executor = DBExecutor(max_workers=int(os.getenv("BOT_DB_WORKERS", "4")), setup=ensure_django)
+REGISTRY.stats("vpnbot_db_executor", "Bot database thread pool", db_executor.stats)
+
+aget_or_create_user = offload(db_executor, get_or_create_user)
+aprocess_payment = offload(db_executor, process_payment)
+aactivate_subscription = offload(db_executor, activate_subscription)
+acheck_subscription_status = offload(db_executor, check_subscription_status)
@@ -0,0 +1,98 @@
+# vpnbot/webhook.py
+"""Telegram webhook endpoint served by the Django ASGI application.
+
+The bot ``Application`` is started from the ASGI lifespan hook in
+``myproject.asgi`` and lives on the server's event loop; the view only
+validates the secret token, decodes the update and queues it, so Telegram
+gets its 200 immediately while the update is processed concurrently.
+
+``BOT_WEBHOOK_SECRET`` is required: without it anyone could post forged
+updates (a ``successful_payment`` included), so ``start`` refuses to run
+and the view rejects every request.
+"""
+import asyncio
+import json
+import logging
+import os
+import secrets
+from typing import Optional
+
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse, HttpResponseForbidden
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from telegram import Update
+from telegram.ext import Application
+
+from vpnbot.bot import build_application
+
+logger = logging.getLogger(__name__)
+
+_application: Optional[Application] = None
+_start_lock = asyncio.Lock()
+
+
+def webhook_secret() -> str:
+    secret = os.getenv("BOT_WEBHOOK_SECRET", "")
+    if not secret:
+        raise ImproperlyConfigured("BOT_WEBHOOK_SECRET must be set in webhook mode")
+    return secret
+
+
+async def start() -> Application:
+    """Initialize and start the bot application and register the webhook."""
+    global _application
+    async with _start_lock:
+        if _application is not None:
+            return _application
+
+        secret = webhook_secret()
+        application = build_application(webhook=True)
+        await application.initialize()
+        if application.post_init:
+            await application.post_init(application)
+        await application.start()
+
+        webhook_url = os.getenv("BOT_WEBHOOK_URL")
+        if webhook_url:
+            await application.bot.set_webhook(
+                webhook_url,
+                secret_token=secret,
+                allowed_updates=Update.ALL_TYPES,
+                max_connections=int(os.getenv("BOT_WEBHOOK_MAX_CONNECTIONS", "40")),
+            )
+        _application = application
+        logger.info("Webhook mode started, url=%s", webhook_url or "(not registered)")
+        return application
+
+
+async def stop() -> None:
+    global _application
+    application, _application = _application, None
+    if application is None:
+        return
+    await application.stop()
+    if application.post_stop:
+        await application.post_stop(application)
+    await application.shutdown()
+    if application.post_shutdown:
+        await application.post_shutdown(application)
+
+
+@csrf_exempt
+@require_POST
+async def telegram_webhook(request):
+    secret = os.getenv("BOT_WEBHOOK_SECRET", "")
+    provided = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+    if not secret or not secrets.compare_digest(provided, secret):
+        return HttpResponseForbidden()
+
+    application = _application or await start()
+    try:
+        update = Update.de_json(json.loads(request.body), application.bot)
+    except (ValueError, TypeError) as e:
+        logger.warning("Malformed webhook update: %s", e)
+        return HttpResponse(status=400)
+
+    await application.update_queue.put(update)
+    return HttpResponse(status=200)